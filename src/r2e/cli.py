@@ -11,6 +11,8 @@ from r2e.generators.testgen import TestGenArgs, R2ETestGenerator, GenExecArgs, R
 from r2e.execution.args import ExecutionArgs
 from r2e.execution.execute import EquivalenceTestRunner
 from r2e.evaluators.testgen import summarize
+from r2e.distributed import run_worker
+from r2e.llms.cache_object import cache_usage, migrate_cache, prune_cache
 
 from r2e.utils.data import load_functions, load_functions_under_test
 from r2e.models import *
@@ -133,6 +135,7 @@ def gen_options(f):
 def llm_options(f):
     options = [
         click.option('--multiprocess', '-m', default=8, type=int, help="The number of processes to use for multiprocessing"),
+        click.option('--max_concurrent_requests', default=0, type=int, help="If positive, send OpenAI requests with the async client, this many in flight, instead of the threaded runner (--multiprocess is then ignored)"),
         click.option('--model_name', default="gpt-4-turbo-2024-04-09", help="The model name to use for the language model"),
         click.option('--n', default=1, type=int, help="The number of completions to generate"),
         click.option('--top_p', default=0.95, type=float, help="The nucleus sampling probability"),
@@ -142,8 +145,28 @@ def llm_options(f):
         click.option('--frequency_penalty', default=0.0, type=float, help="The frequency penalty for the LLM request"),
         click.option('--stop', multiple=True, default=[], help="The stop sequence for the LLM request"),
         click.option('--openai_timeout', default=60, type=int, help="The timeout for the OpenAI API request"),
+        click.option('--stream_until_codeblock', is_flag=True, default=False, help="Whether to stream OpenAI completions and stop each once its first code block is closed"),
+        click.option('--requests_per_minute', default=None, type=int, help="Requests per minute budget. Learned from the API response headers if not set"),
+        click.option('--tokens_per_minute', default=None, type=int, help="Tokens per minute budget. Learned from the API response headers if not set"),
+        click.option('--max_retries', default=6, type=int, help="The number of times a failed API request is retried"),
+        click.option('--local_model_path', default=None, help="Local path to the model and tokenizer. Models not known to r2e are served with vLLM"),
+        click.option('--tensor_parallel_size', default=1, type=int, help="Tensor parallel size for the vLLM runner"),
+        click.option('--vllm_max_model_len', default=4096, type=int, help="The maximum model length for the vLLM runner"),
+        click.option('--enable_prefix_caching', is_flag=True, default=False, help="Whether to let vLLM reuse the KV cache of shared prompt prefixes"),
+        click.option('--base_url', 'base_urls', multiple=True, default=[], help="Base URL of an OpenAI-compatible server. Repeat to spread the requests over several replicas"),
+        click.option('--max_connections', default=64, type=int, help="The maximum number of open connections to each --base_url server"),
+        click.option('--keepalive_expiry', default=30.0, type=float, help="Seconds an idle connection to a --base_url server is kept open"),
+        click.option('--http2', is_flag=True, default=False, help="Whether to talk HTTP/2 to the --base_url servers. Needs r2e[http2]"),
+        click.option('--batch_mode', is_flag=True, default=False, help="Whether to run OpenAI requests through the cheaper, slower Batch API."),
+        click.option('--batch_poll_interval', default=30, type=int, help="Seconds between status checks of a submitted batch."),
+        click.option('--batch_completion_window', default="24h", type=click.Choice(["24h"]), help="The completion window of submitted batches."),
+        click.option('--batch_max_requests', default=50000, type=int, help="The maximum number of requests per submitted batch."),
         click.option('--use_cache', is_flag=True, default=True, help="Whether to use the cache for LLM queries. Default is True."),
-        click.option('--cache_batch_size', default=30, type=int, help="The batch size for cache writes.")
+        click.option('--cache_batch_size', default=30, type=int, help="The batch size for cache writes."),
+        click.option('--cache_keep_prompts', is_flag=True, default=False, help="Whether to also store the full prompt of each cache entry, for debugging."),
+        click.option('--cache_size_limit', default=None, type=int, help="Size limit of the model's cache in MB."),
+        click.option('--cache_eviction_policy', default=None, type=click.Choice(["lrs", "lru", "lfu", "none"]), help="Eviction policy of the model's cache."),
+        click.option('--cache_ttl_days', default=None, type=float, help="Days after which new cache entries expire.")
     ]
     for opt in reversed(options):
         f = opt(f)
@@ -179,9 +202,14 @@ def exec_options(f):
         click.option('--local', is_flag=True, default=False, help="Whether to run the execution service locally. Default is docker."),
         click.option('--image', default="r2e:temp", help="The name of the docker image in which to run the tests"),
         click.option('--execution-multiprocess', '-m', default=20, type=int, help="The number of processes to use for executing the functions and methods"),
-        click.option('--port', default=3006, type=int, help="The port to use for the execution service. Default is 3006 for sequential execution. For parallel, port is randomly picked."),
+        click.option('--port', default=3006, type=int, help="The port to use for the execution service. Default is 3006 for sequential execution. For parallel, a free port is picked for each task."),
         click.option('--timeout-per-task', default=180, type=int, help="The timeout for the execution service to complete one task in seconds"),
-        click.option('--batch-size', default=100, type=int, help="The number of functions to run before writing the output to the file")
+        click.option('--batch-size', default=100, type=int, help="The number of functions to run before writing the output to the file"),
+        click.option('--group-size', default=1, type=int, help="The maximum number of functions of a file to run in one test server session"),
+        click.option('--warm-containers/--no-warm-containers', default=True, help="Whether to reuse started docker containers across functions of a repo"),
+        click.option('--container-max-uses', default=50, type=int, help="The number of functions a warm container runs before it is replaced"),
+        click.option('--container-max-idle', default=2, type=int, help="The number of idle warm containers each worker keeps"),
+        click.option('--keep-servers/--no-keep-servers', default=False, help="Whether warm containers keep their test server, and the repo modules it imported, across functions and genexec rounds")
     ]
     for opt in reversed(options):
         f = opt(f)
@@ -235,6 +263,7 @@ def execute(**kwargs):
 @click.option('--max_rounds', '-k', default=3, type=int, help="The maximum number of rounds to run the genexec process")
 @click.option('--min-cov', default=0.8, type=float, help="The minimum branch coverage to consider a test valid")
 @click.option('--min-valid', default=0.8, type=float, help="The minimum percentage of valid problems to achieve in the dataset")
+@click.option('--time-budget', default=None, type=int, help="Minutes after which running tests are cancelled and no new round is started")
 @gen_options
 @llm_options
 @exec_options
@@ -258,6 +287,22 @@ def genexec(**kwargs):
     show_result_file(os.path.join(EXECUTION_DIR, f"{args.exp_id}_out.json"))
 
 
+################### r2e worker ###################
+
+@r2e.command()
+@click.option('--address', '-a', required=True, help="host:port of the coordinator to pull tasks from")
+@click.option('--authkey', envvar="R2E_AUTHKEY", required=True, help="Shared secret of the coordinator. Defaults to $R2E_AUTHKEY.")
+@click.option('--num_workers', '-n', default=8, type=int, help="Number of processes to use for running tasks on this machine")
+def worker(address, authkey, num_workers):
+    """Run tasks of a distributed coordinator on this machine."""
+    if not authkey:
+        raise click.BadParameter("must not be empty", param_hint="--authkey")
+    host, port = address.rsplit(":", 1)
+    click.echo(f"Connecting to coordinator at {address} with {num_workers} workers...")
+    run_worker((host, int(port)), authkey.encode(), num_workers=num_workers)
+    click.echo("Coordinator closed the connection.")
+
+
 ################### r2e list-functions ###################
 
 def extract_signature_and_docstring(code, max_width=100):
@@ -437,5 +482,38 @@ def show(exp_id, fname, code, test, result, show_all, chat, summary):
             truncated_content = '\n'.join(message['content'].split('\n')[:50])
             click.echo(truncated_content)
 
+
+################### r2e cache ###################
+
+@r2e.group()
+def cache():
+    """Inspect and prune the LLM response cache."""
+    pass
+
+@cache.command()
+def info():
+    """Show the number of entries and disk usage of each model's cache."""
+    for namespace, entries, volume in cache_usage():
+        click.echo(f"{namespace:<40} {entries:>10} entries {volume / 1024**2:>10.1f} MB")
+
+@cache.command()
+@click.option('--model', '-m', default=None, help="Model whose cache to prune. Defaults to the shared cache.")
+@click.option('--max_size', default=None, type=int, help="Evict entries until the cache fits in this many MB.")
+@click.option('--clear', is_flag=True, default=False, help="Remove all entries of the cache.")
+def prune(model, max_size, clear):
+    """Drop expired entries and shrink a model's cache."""
+    size_limit = None if max_size is None else max_size * 1024**2
+    try:
+        removed = prune_cache(model, size_limit=size_limit, clear=clear)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--model")
+    click.echo(f"Removed {removed} entries from the {model or 'shared'} cache.")
+
+@cache.command()
+def migrate():
+    """Move cache entries written by earlier versions to their current keys."""
+    migrated = migrate_cache()
+    click.echo(f"Migrated {migrated} entries.")
+
 if __name__ == '__main__':
     r2e()
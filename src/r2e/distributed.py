@@ -0,0 +1,421 @@
+""" Coordinator and workers for running parallel tasks across machines. """
+
+import pickle
+import socket
+import itertools
+import functools
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from contextlib import AbstractContextManager
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Iterable
+
+import attrs
+
+from r2e.multiprocess import (
+    TaskResult,
+    TaskRunStatus,
+    WorkerPool,
+    activate_pool,
+    _collect_task_result,
+    _settle,
+)
+
+
+class _RemoteFuture(Future):
+    """A future whose task keeps running on its worker; cancelling it while
+    it runs also stops the task there."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cancel_running: Callable[[], None] = lambda: None
+
+    def cancel(self) -> bool:
+        if super().cancel():
+            return True
+        if self.done():
+            return False
+        self.cancel_running()
+        return True
+
+
+@attrs.define(eq=False)
+class _RemoteTask:
+    task_id: int
+    func: Callable
+    task: Any
+    timeout: None | float
+    future: Future
+    attempts: int = 0
+    worker: "None | _WorkerLink" = None
+
+
+@attrs.define(eq=False)
+class _WorkerLink:
+    """Coordinator-side state of one connected worker."""
+
+    name: str
+    slots: int
+    conn: Connection
+    # number of tasks the worker asked for and has not been sent yet
+    credits: int = 0
+    alive: bool = True
+    assigned: dict[int, _RemoteTask] = attrs.field(factory=dict)
+    # tasks and heartbeats are sent from different threads
+    send_lock: threading.Lock = attrs.field(factory=threading.Lock)
+    stopped: threading.Event = attrs.field(factory=threading.Event)
+
+    def send(self, message: Any) -> None:
+        with self.send_lock:
+            self.conn.send(message)
+
+
+def _check_authkey(authkey: bytes) -> None:
+    # connections are unpickled on both ends, so whoever can connect
+    # without the key could run code on the coordinator and the workers
+    if not authkey:
+        raise ValueError("Distributed runs require a non-empty authkey")
+
+
+class Coordinator:
+    """
+    Holds a queue of tasks that workers on other machines (see `run_worker`)
+    pull over TCP. Each worker runs its tasks on a local WorkerPool, so the
+    timeout, memory-limit and crash semantics are the same as for a local
+    pool, and streams back the TaskResults.
+
+    Workers send heartbeats; a worker that disconnects or stays silent for
+    `heartbeat_timeout` seconds is dropped and its unfinished tasks are put
+    back at the front of the queue. A task that has lost `max_attempts`
+    workers is reported as PROCESS_EXPIRED. The coordinator sends heartbeats
+    too, so workers leave when it goes silent.
+
+    Cancelling a running task's future (as the runners do for a CancelHandle
+    or a deadline) resolves it as CANCELLED and stops the task on its worker.
+
+    Tasks and functions are pickled, so workers must be able to import the
+    modules the functions are defined in. Messages are only exchanged after
+    both ends proved they know `authkey`, which is therefore required; keep
+    it secret. Activate the coordinator to have
+    the parallel runners (backend="process") schedule on it:
+
+        with Coordinator(("0.0.0.0", 6000), authkey=b"secret") as coordinator:
+            # on each machine: r2e worker -a <host>:6000 --authkey secret
+            coordinator.wait_for_workers(4)
+            with coordinator.activate():
+                build_functions_and_methods(args)
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ("127.0.0.1", 0),
+        authkey: bytes = b"",
+        heartbeat_timeout: float = 30.0,
+        max_attempts: int = 3,
+    ):
+        _check_authkey(authkey)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self._authkey = authkey
+        self._listener = Listener(address, authkey=authkey)
+        self._ids = itertools.count()
+        self._tasks: deque[_RemoteTask] = deque()
+        self._workers: set[_WorkerLink] = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    @property
+    def address(self) -> tuple[str, int]:
+        address = self._listener.address
+        assert isinstance(address, tuple), "Coordinators listen on TCP"
+        return address[0], address[1]
+
+    @property
+    def num_workers(self) -> int:
+        """Total number of task slots of the connected workers."""
+        with self._cond:
+            return sum(worker.slots for worker in self._workers)
+
+    def wait_for_workers(self, count: int, timeout: None | float = None) -> bool:
+        """Blocks until at least `count` workers are connected."""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._workers) >= count, timeout)
+
+    def submit_task(self, func: Callable, task: Any, timeout: None | float) -> Future:
+        """Queues func(task); the future resolves to the task's TaskResult."""
+        future = _RemoteFuture()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Coordinator is closed")
+            remote = _RemoteTask(next(self._ids), func, task, timeout, future)
+            future.cancel_running = functools.partial(self._cancel, remote)
+            self._tasks.append(remote)
+            self._cond.notify_all()
+        return future
+
+    def activate(self) -> AbstractContextManager["Coordinator"]:
+        """Makes the parallel runners schedule their tasks on this coordinator."""
+        return activate_pool(self)
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._closed:
+                    return
+                continue
+            if self._closed:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        """Reads a worker's messages until it disconnects or misses heartbeats."""
+        try:
+            _, name, slots = conn.recv()
+            conn.send(("welcome", self.heartbeat_timeout / 3))
+        except (OSError, EOFError, ValueError):
+            conn.close()
+            return
+
+        worker = _WorkerLink(name, slots, conn)
+        with self._cond:
+            if self._closed:
+                conn.close()
+                return
+            self._workers.add(worker)
+            self._cond.notify_all()
+        threading.Thread(target=self._dispatch, args=(worker,), daemon=True).start()
+        threading.Thread(target=self._heartbeat, args=(worker,), daemon=True).start()
+
+        try:
+            while conn.poll(self.heartbeat_timeout):
+                message = conn.recv()
+                if message[0] == "pull":
+                    with self._cond:
+                        worker.credits += 1
+                        self._cond.notify_all()
+                elif message[0] == "result":
+                    _, task_id, task_result = message
+                    with self._cond:
+                        remote = worker.assigned.pop(task_id, None)
+                    if remote is not None:
+                        _settle(remote.future, task_result)
+                # heartbeats only need to arrive before the poll times out
+        except (OSError, EOFError):
+            pass
+        finally:
+            self._drop(worker)
+
+    def _heartbeat(self, worker: _WorkerLink) -> None:
+        while not worker.stopped.wait(self.heartbeat_timeout / 3):
+            try:
+                worker.send(("heartbeat",))
+            except (OSError, ValueError):
+                return
+
+    def _dispatch(self, worker: _WorkerLink) -> None:
+        """Sends queued tasks to a worker whenever it has asked for one."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: not worker.alive
+                    or self._closed
+                    or (worker.credits > 0 and bool(self._tasks))
+                )
+                if not worker.alive or self._closed:
+                    return
+                remote = self._tasks.popleft()
+                if remote.future.done():
+                    continue
+                if (
+                    remote.attempts == 0
+                    and not remote.future.set_running_or_notify_cancel()
+                ):
+                    continue
+                remote.attempts += 1
+                remote.worker = worker
+                worker.credits -= 1
+                worker.assigned[remote.task_id] = remote
+
+            try:
+                payload = pickle.dumps((remote.func, remote.task))
+            except Exception as error:
+                with self._cond:
+                    worker.assigned.pop(remote.task_id, None)
+                    worker.credits += 1
+                _settle(remote.future, error=error)
+                continue
+
+            try:
+                worker.send(("task", remote.task_id, payload, remote.timeout))
+            except (OSError, ValueError):
+                # the reader notices the broken connection and requeues the task
+                return
+
+    def _cancel(self, remote: _RemoteTask) -> None:
+        """Resolves a running task as cancelled and stops it on its worker."""
+        with self._cond:
+            worker = remote.worker
+            if worker is None or worker.assigned.pop(remote.task_id, None) is None:
+                worker = None  ## not sent yet, or lost and back in the queue
+                if remote in self._tasks:
+                    self._tasks.remove(remote)
+        _settle(remote.future, TaskResult(TaskRunStatus.CANCELLED))
+        if worker is not None:
+            try:
+                worker.send(("cancel", remote.task_id))
+            except (OSError, ValueError):
+                pass  ## the worker is gone, and the task with it
+
+    def _drop(self, worker: _WorkerLink) -> None:
+        worker.stopped.set()
+        with self._cond:
+            worker.alive = False
+            self._workers.discard(worker)
+            lost = list(worker.assigned.values())
+            worker.assigned.clear()
+            for remote in reversed(lost):
+                if remote.future.done():
+                    continue
+                if self._closed:
+                    _settle(remote.future, error=RuntimeError("Coordinator is closed"))
+                elif remote.attempts >= self.max_attempts:
+                    _settle(remote.future, TaskResult(TaskRunStatus.PROCESS_EXPIRED))
+                else:
+                    self._tasks.appendleft(remote)
+            self._cond.notify_all()
+        worker.conn.close()
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+            queued = list(self._tasks)
+            self._tasks.clear()
+            self._cond.notify_all()
+
+        for remote in queued:
+            if not remote.future.cancel():
+                _settle(remote.future, error=RuntimeError("Coordinator is closed"))
+        for worker in workers:
+            worker.stopped.set()
+            try:
+                worker.send(("shutdown",))
+            except (OSError, ValueError):
+                pass
+
+        # wake up the accept loop so that it sees the coordinator is closed
+        try:
+            Client(self.address, authkey=self._authkey).close()
+        except (OSError, EOFError, AuthenticationError):
+            pass
+        self._listener.close()
+
+    def __enter__(self) -> "Coordinator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def run_worker(
+    address: tuple[str, int],
+    authkey: bytes = b"",
+    num_workers: int = 2,
+    max_tasks_per_worker: None | int = None,
+    use_spawn: bool = True,
+    max_mem: None | int = None,
+    preload_modules: Iterable[str] = (),
+) -> None:
+    """
+    Connects to a Coordinator and runs its tasks on a local WorkerPool of
+    `num_workers` processes until the coordinator shuts down, goes away or
+    misses three heartbeats.
+    """
+    _check_authkey(authkey)
+    host, port = address
+    conn = Client((host, int(port)), authkey=authkey)
+    send_lock = threading.Lock()
+
+    def send(message: Any) -> None:
+        with send_lock:
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                pass  # the coordinator is gone; the receive loop notices
+
+    send(("hello", socket.gethostname(), num_workers))
+    _, heartbeat_interval = conn.recv()
+
+    stopped = threading.Event()
+
+    def heartbeat() -> None:
+        while not stopped.wait(heartbeat_interval):
+            send(("heartbeat",))
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    running: dict[int, Future] = {}
+
+    def report(task_id: int, future: Future) -> None:
+        running.pop(task_id, None)
+        if not future.cancelled():
+            send(("result", task_id, _collect_task_result(future)))
+            send(("pull",))
+
+    with WorkerPool(
+        num_workers=num_workers,
+        max_tasks_per_worker=max_tasks_per_worker,
+        use_spawn=use_spawn,
+        max_mem=max_mem,
+        preload_modules=preload_modules,
+    ) as pool:
+        for _ in range(num_workers):
+            send(("pull",))
+
+        try:
+            while conn.poll(3 * heartbeat_interval):
+                message = conn.recv()
+                if message[0] == "shutdown":
+                    break
+                if message[0] == "heartbeat":
+                    continue
+                if message[0] == "cancel":
+                    # stops the worker process running it; its slot is free
+                    future = running.pop(message[1], None)
+                    if future is not None and future.cancel():
+                        send(("pull",))
+                    continue
+
+                _, task_id, payload, timeout = message
+                try:
+                    func, task = pickle.loads(payload)
+                except Exception:
+                    task_result = TaskResult(
+                        status=TaskRunStatus.EXCEPTION,
+                        exception_tb=traceback.format_exc(),
+                    )
+                    send(("result", task_id, task_result))
+                    send(("pull",))
+                    continue
+
+                future = pool.submit_task(func, task, timeout)
+                running[task_id] = future
+                future.add_done_callback(functools.partial(report, task_id))
+
+        except (OSError, EOFError):
+            pass
+
+        finally:
+            stopped.set()
+            for future in list(running.values()):
+                future.cancel()
+            conn.close()
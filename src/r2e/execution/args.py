@@ -23,11 +23,36 @@ class ExecutionArgs(BaseModel):
         description="The number of functions to run before writing the output to the file",
     )
 
+    group_size: int = Field(
+        1,
+        description="The maximum number of functions of a file to run in one test server session",
+    )
+
     local: bool = Field(
         False,
         description="Whether to run the execution service locally",
     )
 
+    warm_containers: bool = Field(
+        True,
+        description="Whether to reuse started docker containers across functions of a repo",
+    )
+
+    container_max_uses: int = Field(
+        50,
+        description="The number of functions a warm container runs before it is replaced",
+    )
+
+    container_max_idle: int = Field(
+        2,
+        description="The number of idle warm containers each worker keeps",
+    )
+
+    keep_servers: bool = Field(
+        False,
+        description="Whether warm containers keep their test server, and the repo modules it imported, across functions and genexec rounds",
+    )
+
     function: str | None = Field(
         None,
         description="A specific function to generate tests for",
@@ -0,0 +1,235 @@
+""" Warm pools of test server containers, leased to execution tasks. """
+
+import os
+import json
+import uuid
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import rpyc
+import docker
+
+from r2e.execution.r2e_simulator import DockerSimulator
+from r2e.execution.ports import (
+    CONTAINER_PORT,
+    backoff,
+    connect_when_ready,
+    server_alive,
+)
+
+# worker processes started inside `warm_containers` find the pool settings here
+CONTAINER_POOL_ENV_VAR = "R2E_CONTAINER_POOL"
+
+# containers started by a pool are labelled with the id of the run owning them
+POOL_LABEL = "r2e.container_pool"
+
+
+@dataclass
+class PooledContainer:
+    simulator: DockerSimulator
+    key: tuple[str, str]  ## (image, repo_id)
+    port: int  ## published on the host
+    uses: int = 0
+
+
+class ContainerPool:
+    """
+    Started test server containers, kept per (image, repo) and leased to
+    tasks one at a time, instead of starting and removing a container for
+    every FUT.
+
+    A container is health-checked when leased: it must be running and its
+    test server must answer, otherwise it is replaced. After each use the
+    test server is restarted, so no imported modules or service state carry
+    over to the next task, and the container goes back to the pool until it
+    has served `max_uses` tasks. At most `max_idle` idle containers are kept;
+    the least recently used ones are removed first.
+
+    With `keep_servers`, the test server is kept instead: the repo modules
+    it imported while initializing earlier tasks stay loaded, so later tasks
+    of the repo (e.g. the next genexec round) only import the FUT's own file
+    and run their tests. Each `init` still re-executes that file, so FUTs
+    and references are fresh; state the tests left in other modules is not.
+    """
+
+    def __init__(
+        self,
+        owner: str,
+        max_uses: int = 50,
+        max_idle: int = 2,
+        keep_servers: bool = False,
+        server_timeout: float = 60.0,
+        client: Optional[docker.DockerClient] = None,
+    ):
+        self.owner = owner
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.keep_servers = keep_servers
+        self.server_timeout = server_timeout
+        self.client = client if client is not None else docker.from_env()
+        self._idle: list[PooledContainer] = []  ## least recently used first
+
+    @contextmanager
+    def lease(
+        self, image: str, repo_id: str, restart_server: Optional[bool] = None
+    ) -> Iterator[tuple[DockerSimulator, rpyc.Connection]]:
+        """A healthy container for the repo and a connection to its server.
+        Containers whose lease ends with an exception are removed.
+        `restart_server` overrides `keep_servers` for this lease, for tasks
+        that leave state in the service itself."""
+        if restart_server is None:
+            restart_server = not self.keep_servers
+        entry, conn = self._acquire((image, repo_id))
+        healthy = False
+        try:
+            yield entry.simulator, conn
+            healthy = True
+        finally:
+            self._release(entry, conn, healthy, restart_server)
+
+    def _acquire(self, key: tuple[str, str]) -> tuple[PooledContainer, rpyc.Connection]:
+        for entry in reversed(self._idle):
+            if entry.key != key:
+                continue
+            self._idle.remove(entry)
+            conn = self._check(entry)
+            if conn is not None:
+                return entry, conn
+            self._discard(entry)
+            break
+
+        entry = self._start(key)
+        conn = self._check(entry)
+        if conn is None:
+            self._discard(entry)
+            raise RuntimeError(f"Test server for {key[1]} did not come up")
+        return entry, conn
+
+    def _start(self, key: tuple[str, str]) -> PooledContainer:
+        image, repo_id = key
+        simulator = DockerSimulator(
+            image_name=image,
+            repo_id=repo_id,
+            port=CONTAINER_PORT,
+            client=self.client,
+            labels={POOL_LABEL: self.owner},
+        )
+        if simulator.host_port is None:
+            raise RuntimeError(f"Container for {repo_id} did not start")
+        return PooledContainer(simulator, key, simulator.host_port)
+
+    def _check(self, entry: PooledContainer) -> Optional[rpyc.Connection]:
+        if not entry.simulator.is_running():
+            return None
+        try:
+            return connect_when_ready(entry.port, self.server_timeout)
+        except TimeoutError as e:
+            print(f"Unhealthy container for {entry.key[1]}: {e}")
+            return None
+
+    def _release(
+        self,
+        entry: PooledContainer,
+        conn: rpyc.Connection,
+        healthy: bool,
+        restart_server: bool,
+    ) -> None:
+        entry.uses += 1
+        if not healthy or entry.uses >= self.max_uses:
+            conn.close()
+            self._discard(entry)
+            return
+
+        if restart_server:
+            # restart the server for a fresh interpreter
+            try:
+                service = conn.root
+                assert service is not None, "Test service is None"
+                service.stop_server()
+            except Exception:
+                pass  ## the server may drop the connection while stopping
+            conn.close()
+
+            for _ in backoff(self.server_timeout):
+                if not server_alive(entry.port):
+                    break
+            else:
+                self._discard(entry)
+                return
+            entry.simulator.start_server(entry.key[1], CONTAINER_PORT)
+        else:
+            conn.close()
+
+        self._idle.append(entry)
+        while len(self._idle) > self.max_idle:
+            self._discard(self._idle.pop(0))
+
+    def _discard(self, entry: PooledContainer) -> None:
+        entry.simulator.stop_container()
+
+    def close(self) -> None:
+        while self._idle:
+            self._discard(self._idle.pop())
+
+
+_pool: Optional[ContainerPool] = None
+
+
+def get_container_pool() -> Optional[ContainerPool]:
+    """The container pool of this process, if running inside `warm_containers`."""
+    global _pool
+    settings = os.environ.get(CONTAINER_POOL_ENV_VAR)
+    if settings is None:
+        return None
+    settings = json.loads(settings)
+    if _pool is None or _pool.owner != settings["owner"]:
+        _pool = ContainerPool(**settings)
+    return _pool
+
+
+def reap_containers(owner: str, client: Optional[docker.DockerClient] = None) -> int:
+    """Removes every container started by the pools of `owner`, including
+    those left behind by worker processes that were killed."""
+    client = client if client is not None else docker.from_env()
+    containers = client.containers.list(
+        all=True, filters={"label": f"{POOL_LABEL}={owner}"}
+    )
+    for container in containers:
+        try:
+            container.stop()
+            container.remove()
+        except Exception as e:
+            print("Container stop error", repr(e))
+    return len(containers)
+
+
+@contextmanager
+def warm_containers(
+    max_uses: int = 50,
+    max_idle: int = 2,
+    keep_servers: bool = False,
+    client: Optional[docker.DockerClient] = None,
+) -> Iterator[str]:
+    """
+    Makes this process, and worker processes started inside the block, run
+    FUTs in pooled containers (see `ContainerPool`). All pooled containers
+    are removed when the block exits.
+    """
+    global _pool
+    owner = uuid.uuid4().hex
+    settings = {
+        "owner": owner,
+        "max_uses": max_uses,
+        "max_idle": max_idle,
+        "keep_servers": keep_servers,
+    }
+    os.environ[CONTAINER_POOL_ENV_VAR] = json.dumps(settings)
+    try:
+        yield owner
+    finally:
+        os.environ.pop(CONTAINER_POOL_ENV_VAR, None)
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        reap_containers(owner, client)
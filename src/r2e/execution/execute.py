@@ -1,86 +1,235 @@
+import os
+import json
+import time
 import fire
-from tqdm import tqdm
+import hashlib
 import traceback
+from tqdm import tqdm
+from contextlib import ExitStack
 
 from r2e.paths import *
 from r2e.models import *
 from r2e.utils.data import *
-from r2e.multiprocess import run_tasks_in_parallel_iter
+from r2e.multiprocess import (
+    CancelHandle,
+    TaskJournal,
+    TaskResult,
+    TaskRunStatus,
+    WorkerPool,
+    run_tasks_as_completed_iter,
+)
 
 from r2e.execution.args import ExecutionArgs
 from r2e.execution.service import ServiceManager
-from r2e.execution.helpers import run_fut_with_port, run_fut_with_port_mp
+from r2e.execution.container_pool import CONTAINER_POOL_ENV_VAR, warm_containers
+from r2e.execution.helpers import run_futs_with_port, run_futs_with_port_mp
 
 
 class EquivalenceTestRunner:
     @staticmethod
-    def run(args):
-        """Run equivalence tests for functions"""
+    def run(args, deadline=None):
+        """Run equivalence tests for functions. Tests still running at the
+        `deadline` (a time.time()) are cancelled and their FUTs kept as is."""
         futs = load_functions_under_test(TESTGEN_DIR / args.in_file)
         print(f"Loaded {len(futs)} functions under test")
 
         if args.function:
             futs = [f for f in futs if f.name == args.function]
 
+        out_file = EXECUTION_DIR / f"{args.exp_id}_out.json"
+        EquivalenceTestRunner.run_futs(futs, args, deadline, out_file)
+
+    @staticmethod
+    def run_futs(
+        futs, args, deadline=None, out_file=None, priority=None, stop_when=None
+    ):
+        """Run equivalence tests for FUTs in memory and return the executed
+        FUTs. Progress is only persisted in the checkpoints that let a run
+        resume, and the results in `out_file` if given.
+
+        FUTs with a higher `priority(fut)` run first. `stop_when(fut)` is
+        called with each executed FUT; once it returns True, the FUTs not run
+        yet are cancelled and returned as is, like those cancelled at the
+        `deadline`."""
         new_futs = []
-        if args.execution_multiprocess == 0:
-            new_futs = EquivalenceTestRunner._run_futs_sequential(futs, args)
-        else:
-            new_futs = EquivalenceTestRunner._run_futs_parallel(futs, args)
+        with ExitStack() as stack:
+            if (
+                args.warm_containers
+                and not args.local
+                and CONTAINER_POOL_ENV_VAR not in os.environ
+            ):
+                EquivalenceTestRunner._enter_warm_containers(stack, args)
+
+            if args.execution_multiprocess == 0:
+                new_futs = EquivalenceTestRunner._run_futs_sequential(
+                    futs, args, deadline, priority, stop_when
+                )
+            else:
+                new_futs = EquivalenceTestRunner._run_futs_parallel(
+                    futs, args, deadline, priority, stop_when
+                )
 
         ServiceManager.shutdown()
-        write_functions_under_test(new_futs, EXECUTION_DIR / f"{args.exp_id}_out.json")
+        if out_file is not None:
+            write_functions_under_test(new_futs, out_file)
+        EquivalenceTestRunner._journal_path(args).unlink(missing_ok=True)
+        return new_futs
 
     @staticmethod
-    def _run_futs_sequential(futs, args):
-        new_futs = []
-        for i, fut in tqdm(enumerate(futs), desc="Running tests", total=len(futs)):
-            port = args.port
-            local = args.local
-            image = args.image
-            try:
-                output = run_fut_with_port(fut, port, local, image, reuse_port=True)
-            except Exception as e:
-                print(f"Error@{fut.repo_id}:\n{repr(e)}")
-                tb = traceback.format_exc()
-                print(tb)
-                continue
-            new_futs.append(output[2])
-
-            if (i + 1) % 20 == 0:
-                write_functions_under_test(
-                    new_futs, EXECUTION_DIR / f"{args.exp_id}_out.json"
+    def _enter_warm_containers(stack: ExitStack, args):
+        """Runs the FUTs in pooled containers until the stack exits. Worker
+        processes, which own the pools, are then kept across batches."""
+        stack.enter_context(
+            warm_containers(
+                args.container_max_uses,
+                args.container_max_idle,
+                args.keep_servers,
+            )
+        )
+        if args.execution_multiprocess > 0:
+            pool = stack.enter_context(
+                WorkerPool(
+                    num_workers=args.execution_multiprocess,
+                    preload_modules=["r2e.execution.helpers"],
                 )
+            )
+            stack.enter_context(pool.activate())
 
-        return new_futs
+    @staticmethod
+    def _group_futs(futs, group_size: int, priority=None) -> list[list[int]]:
+        """Indices of the FUTs grouped by (repo, file), in groups of at most
+        `group_size` that are run in one test server session each. Groups
+        are ordered by the highest priority of their FUTs, if given."""
+        groups: dict[tuple[str, str], list[int]] = {}
+        grouped = []
+        for i, fut in enumerate(futs):
+            key = (fut.repo_id, fut.execution_fut_data[1])
+            if key not in groups or len(groups[key]) >= group_size:
+                groups[key] = []
+                grouped.append(groups[key])
+            groups[key].append(i)
+
+        if priority is not None:
+            grouped.sort(key=lambda group: -max(priority(futs[i]) for i in group))
+        return grouped
 
     @staticmethod
-    def _run_futs_parallel(futs, args):
-        new_futs = []
+    def _run_futs_sequential(futs, args, deadline=None, priority=None, stop_when=None):
+        results: list[FunctionUnderTest | MethodUnderTest | None] = [None] * len(futs)
+        journal_path = EquivalenceTestRunner._journal_path(args)
+        if journal_path.exists():
+            print(f"Resuming execution from {journal_path}")
+
+        groups = EquivalenceTestRunner._group_futs(futs, args.group_size, priority)
+        stopped = False
+        with (
+            TaskJournal(journal_path) as journal,
+            tqdm(desc="Running tests", total=len(futs)) as pbar,
+        ):
+            for group in groups:
+                if deadline is not None and time.time() >= deadline:
+                    stopped = True
+                if stopped:
+                    for i in group:
+                        results[i] = futs[i]
+                    continue
+
+                port = args.port
+                local = args.local
+                image = args.image
+                group_futs = [futs[i] for i in group]
+                key = EquivalenceTestRunner._task_key((group_futs,))
+                journaled = journal.get(key)
+                try:
+                    if journaled is not None:
+                        outputs = journaled.result
+                    else:
+                        outputs = run_futs_with_port(
+                            group_futs, port, local, image, reuse_port=True
+                        )
+                        journal.append(key, TaskResult(TaskRunStatus.SUCCESS, outputs))
+                except Exception as e:
+                    print(f"Error@{group_futs[0].repo_id}:\n{repr(e)}")
+                    tb = traceback.format_exc()
+                    print(tb)
+                    outputs = []
+                for i, output in zip(group, outputs):  # type: ignore
+                    results[i] = output[2]
+                    if stop_when is not None and stop_when(output[2]):
+                        stopped = True
+                pbar.update(len(group))
+
+        return [r for r in results if r is not None]
+
+    @staticmethod
+    def _journal_path(args):
+        return EXECUTION_DIR / f"{args.exp_id}_out.journal"
+
+    @staticmethod
+    def _task_key(task) -> str:
+        """Journal key of an execution task: the FUTs and the tests they run."""
+        keys = []
+        for fut in task[0]:
+            tests = json.dumps(fut.tests, sort_keys=True)
+            keys.append(f"{fut.id}:{hashlib.sha256(tests.encode()).hexdigest()}")
+        return ",".join(keys)
+
+    @staticmethod
+    def _run_futs_parallel(futs, args, deadline=None, priority=None, stop_when=None):
+        results: list[FunctionUnderTest | MethodUnderTest | None] = [None] * len(futs)
+
+        journal_path = EquivalenceTestRunner._journal_path(args)
+        if journal_path.exists():
+            print(f"Resuming execution from {journal_path}")
+
+        groups = EquivalenceTestRunner._group_futs(futs, args.group_size, priority)
+        batches = [[]]
+        for group in groups:
+            if sum(map(len, batches[-1])) >= args.batch_size:
+                batches.append([])
+            batches[-1].append(group)
+
+        cancel = CancelHandle()
+        for batch_groups in batches:
+            if cancel.all_cancelled:
+                for group in batch_groups:
+                    for i in group:
+                        results[i] = futs[i]
+                continue
 
-        for i in range(0, len(futs), args.batch_size):
-            batch = [(f, args.local, args.image) for f in futs[i : i + args.batch_size]]
+            batch = [
+                ([futs[i] for i in group], args.local, args.image)
+                for group in batch_groups
+            ]
 
-            outputs = run_tasks_in_parallel_iter(
-                run_fut_with_port_mp,
+            outputs = run_tasks_as_completed_iter(
+                run_futs_with_port_mp,
                 batch,
                 num_workers=args.execution_multiprocess,
-                timeout_per_task=args.timeout_per_task,
+                timeout_per_task=args.timeout_per_task * args.group_size,
                 use_progress_bar=True,
+                journal=journal_path,
+                task_key=EquivalenceTestRunner._task_key,
+                cancel=cancel,
+                deadline=deadline,
             )
 
-            for o in outputs:
+            for index, o in outputs:
+                group = batch_groups[index]
                 if o.is_success():
-                    new_futs.append(o.result[2])  # type: ignore
+                    for i, output in zip(group, o.result):  # type: ignore
+                        results[i] = output[2]
+                        if stop_when is not None and stop_when(output[2]):
+                            cancel.cancel()
+                elif o.is_cancelled():
+                    for i in group:
+                        results[i] = futs[i]
                 else:
                     print(f"Error: {o.exception_tb}")
 
             ServiceManager.shutdown()
-            write_functions_under_test(
-                new_futs, EXECUTION_DIR / f"{args.exp_id}_out.json"
-            )
 
-        return new_futs
+        return [r for r in results if r is not None]
 
 
 if __name__ == "__main__":
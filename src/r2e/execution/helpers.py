@@ -1,44 +1,57 @@
 import json
 import rpyc
-import random
 import traceback
 
 from r2e.models import FunctionUnderTest, MethodUnderTest
 from r2e.execution.service import ServiceManager
+from r2e.execution.container_pool import get_container_pool
+from r2e.execution.ports import CONTAINER_PORT
 from r2e.execution.utils import get_fut_data
 
 from r2e.logger import exec_logger as logger
 
 
-def run_fut_with_port_mp(args) -> tuple[bool, str, FunctionUnderTest | MethodUnderTest]:
-    fut: FunctionUnderTest | MethodUnderTest = args[0]
+def run_futs_with_port_mp(
+    args,
+) -> list[tuple[bool, str, FunctionUnderTest | MethodUnderTest]]:
+    futs: list[FunctionUnderTest | MethodUnderTest] = args[0]
     local: bool = args[1]
     image: str = args[2]
-    port = random.randint(3000, 10000)
-    # note: cannot reuse_port for multiprocess
-    output = run_fut_with_port(fut, port, local, image)
-    return output
+    port = _session_port(local)
+    return run_futs_with_port(futs, port, local, image)
 
 
-def run_fut_with_port(
-    fut: FunctionUnderTest | MethodUnderTest,
+def _session_port(local: bool) -> int:
+    """The port of the test server for one session of a worker. A local
+    server is started on a port it binds itself; a container has its own
+    network, and docker publishes its port on a free host port."""
+    if local:
+        return ServiceManager.start_local_server()
+    return CONTAINER_PORT
+
+
+def run_futs_with_port(
+    futs: list[FunctionUnderTest | MethodUnderTest],
     port: int,
     local: bool = False,
     image: str = "r2e:temp",
     reuse_port: bool = False,
-) -> tuple[bool, str, FunctionUnderTest | MethodUnderTest]:
+) -> list[tuple[bool, str, FunctionUnderTest | MethodUnderTest]]:
+    """Runs the tests of futs of one file in one service session"""
+    if not local and get_container_pool() is not None:
+        return run_futs_in_pool(futs, image)
+
+    repo_id = futs[0].repo_id
     try:
-        simulator, conn = ServiceManager.get_service(fut.repo_id, port, local, image)
+        simulator, conn = ServiceManager.get_service(repo_id, port, local, image)
     except Exception as e:
-        print("Service error@", fut.repo_id, repr(e))
-        fut.test_history.update_exec_stats({"error": repr(e)})
-        return False, repr(e), fut
+        print("Service error@", repo_id, repr(e))
+        return _session_failed(futs, repr(e))
 
     try:
-        return self_equiv_futs([fut], conn, local)
-    except Exception as e:
+        return self_equiv_futs_in_session(futs, conn, local)
+    except Exception:
         tb = traceback.format_exc()
-        pass
     finally:
         if simulator:
             simulator.stop_container()
@@ -46,10 +59,35 @@ def run_fut_with_port(
         if not reuse_port:
             ServiceManager.close_connection(port)
 
-    fut.test_history.update_exec_stats({"error": tb})
-    print(f"Error@{fut.repo_id}:\n{tb}")
+    print(f"Error@{repo_id}:\n{tb}")
+    return _session_failed(futs, tb)
 
-    return False, tb, fut
+
+def run_futs_in_pool(
+    futs: list[FunctionUnderTest | MethodUnderTest],
+    image: str = "r2e:temp",
+) -> list[tuple[bool, str, FunctionUnderTest | MethodUnderTest]]:
+    """Runs the tests of futs of one file in a container leased from the warm pool"""
+    pool = get_container_pool()
+    assert pool is not None, "No container pool outside `warm_containers`"
+
+    repo_id = futs[0].repo_id
+    try:
+        with pool.lease(image, repo_id) as (_, conn):
+            return self_equiv_futs_in_session(futs, conn)
+    except Exception:
+        tb = traceback.format_exc()
+
+    print(f"Error@{repo_id}:\n{tb}")
+    return _session_failed(futs, tb)
+
+
+def _session_failed(
+    futs: list[FunctionUnderTest | MethodUnderTest], error: str
+) -> list[tuple[bool, str, FunctionUnderTest | MethodUnderTest]]:
+    for fut in futs:
+        fut.test_history.update_exec_stats({"error": error})
+    return [(False, error, fut) for fut in futs]
 
 
 def self_equiv_futs(
@@ -79,6 +117,49 @@ def self_equiv_futs(
 
     ####### Setup the service #######
     service.setup_repo(repo_data)
+    return _init_and_submit(service, futs, fut_data, test_data)
+
+
+def self_equiv_futs_in_session(
+    futs: list[FunctionUnderTest | MethodUnderTest],
+    conn: rpyc.Connection,
+    local: bool = False,
+) -> list[tuple[bool, str, FunctionUnderTest | MethodUnderTest]]:
+    """Executes equivalence tests for futs of one file in one service session
+
+    The repo is set up once and the modules imported by the file stay loaded
+    in the server between futs. Each fut is still initialized and submitted
+    on its own, so the logs and coverage stored in it are its own.
+
+    Args:
+        futs (list[FunctionUnderTest | MethodUnderTest]): functions under test of one file
+        conn (rpyc.Connection): connection to the service client
+
+    Returns:
+        list[tuple[bool, str, FunctionUnderTest | MethodUnderTest]]: success, error, fut for each fut
+    """
+    service = conn.root
+    assert service is not None, "Test service is None"
+
+    repo_data, _, _ = get_fut_data(futs, local=local)
+    service.setup_repo(repo_data)
+
+    outputs = []
+    for fut in futs:
+        _, fut_data, test_data = get_fut_data([fut], local=local)
+        try:
+            outputs.append(_init_and_submit(service, [fut], fut_data, test_data))
+        except Exception:
+            tb = traceback.format_exc()
+            fut.test_history.update_exec_stats({"error": tb})
+            print(f"Error@{fut.repo_id}:\n{tb}")
+            outputs.append((False, tb, fut))
+    return outputs
+
+
+def _init_and_submit(
+    service, futs, fut_data: str, test_data: str
+) -> tuple[bool, str, FunctionUnderTest | MethodUnderTest]:
     service.setup_function(fut_data)
     service.setup_test(test_data)
 
@@ -141,6 +222,17 @@ def check_equiv(
         reuse_port (bool, optional): reuse the port. Defaults to False.
     """
 
+    pool = get_container_pool() if not local else None
+    if pool is not None:
+        try:
+            # the codegen mode stays set in the service, so restart it after
+            with pool.lease(image, fut.repo_id, restart_server=True) as (_, conn):
+                return _check_equiv_in_session(code, fut, conn)
+        except Exception:
+            tb = traceback.format_exc()
+        print(f"Error:\n{tb}")
+        return False, tb, {"error": tb}
+
     try:
         simulator, conn = ServiceManager.get_service(fut.repo_id, port, local, image)
     except Exception as e:
@@ -149,49 +241,7 @@ def check_equiv(
         return False, repr(e), fut
 
     try:
-        fut = [fut]
-        service = conn.root
-        assert service is not None, "Test service is None"
-
-        repo_data, fut_data, test_data = get_fut_data(fut, local=local)
-        service.setup_repo(repo_data)
-        service.setup_function(fut_data)
-        service.setup_test(test_data)
-
-        init_response = service.init()
-        init_output = str(init_response["output"])
-        init_error = str(init_response["error"])
-
-        ignore_patterns = ["SyntaxWarning: invalid escape sequence", "NameError: "]
-
-        if init_error and not any(p in init_error for p in ignore_patterns):
-            logger.error(f"Init Error:\n{init_error}\n\n")
-            return False, init_error, fut
-
-        # setup codegen mode
-        service.setup_codegen_mode()
-        exec_response = service.execute(code)
-        exec_output = str(exec_response["output"])
-        exec_error = str(exec_response["error"])
-
-        # run equivalence test
-        try:
-            submit_response = service.submit()
-        except Exception as e:
-            logger.error(f"Submit Error:\n{repr(e)}\n\n")
-            return False, repr(e), fut
-
-        submit_error = str(submit_response["error"])
-
-        if "logs" not in submit_response:
-            logger.error(f"Submit Error:\n{submit_error}\n\n")
-            return False, submit_error, fut
-
-        submit_logs = json.loads(submit_response["logs"])
-        submit_logs["output"] = submit_response["output"]
-        valids = [x["valid"] for x in submit_logs["run_tests_logs"].values()]
-        return all(valids), submit_error, submit_logs["run_tests_logs"]
-
+        return _check_equiv_in_session(code, fut, conn, local)
     except Exception as e:
         tb = traceback.format_exc()
         pass
@@ -204,3 +254,53 @@ def check_equiv(
 
     print(f"Error:\n{tb}")
     return False, tb, {"error": tb}
+
+
+def _check_equiv_in_session(
+    code: str,
+    fut: FunctionUnderTest | MethodUnderTest,
+    conn: rpyc.Connection,
+    local: bool = False,
+):
+    fut = [fut]
+    service = conn.root
+    assert service is not None, "Test service is None"
+
+    repo_data, fut_data, test_data = get_fut_data(fut, local=local)
+    service.setup_repo(repo_data)
+    service.setup_function(fut_data)
+    service.setup_test(test_data)
+
+    init_response = service.init()
+    init_output = str(init_response["output"])
+    init_error = str(init_response["error"])
+
+    ignore_patterns = ["SyntaxWarning: invalid escape sequence", "NameError: "]
+
+    if init_error and not any(p in init_error for p in ignore_patterns):
+        logger.error(f"Init Error:\n{init_error}\n\n")
+        return False, init_error, fut
+
+    # setup codegen mode
+    service.setup_codegen_mode()
+    exec_response = service.execute(code)
+    exec_output = str(exec_response["output"])
+    exec_error = str(exec_response["error"])
+
+    # run equivalence test
+    try:
+        submit_response = service.submit()
+    except Exception as e:
+        logger.error(f"Submit Error:\n{repr(e)}\n\n")
+        return False, repr(e), fut
+
+    submit_error = str(submit_response["error"])
+
+    if "logs" not in submit_response:
+        logger.error(f"Submit Error:\n{submit_error}\n\n")
+        return False, submit_error, fut
+
+    submit_logs = json.loads(submit_response["logs"])
+    submit_logs["output"] = submit_response["output"]
+    valids = [x["valid"] for x in submit_logs["run_tests_logs"].values()]
+    return all(valids), submit_error, submit_logs["run_tests_logs"]
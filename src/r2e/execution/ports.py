@@ -0,0 +1,71 @@
+""" Free ports and readiness probes for test servers. """
+
+import time
+import socket
+from typing import Iterator
+
+import rpyc
+
+# the port test servers listen on inside their containers; every container
+# has its own network, and docker picks the published port on the host
+CONTAINER_PORT = 3006
+
+
+def free_port() -> int:
+    """A port no socket is bound to, as picked by the OS. The OS avoids
+    ports in use and spreads picks over its ephemeral range, so concurrent
+    callers rarely collide, unlike with `random.randint` over a few ports."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def backoff(
+    timeout: float, initial_delay: float = 0.05, max_delay: float = 1.0
+) -> Iterator[None]:
+    """Yields until `timeout` seconds have passed, sleeping exponentially
+    longer between yields; for polling something that should be quick."""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        yield
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def server_alive(port: int) -> bool:
+    """Whether a test server answers on `port`. Docker accepts connections
+    on a published port even when nothing listens in the container, so
+    this pings the server instead of just connecting."""
+    try:
+        conn = rpyc.connect("localhost", port, config={"sync_request_timeout": 5})
+    except (OSError, EOFError):
+        return False
+    try:
+        conn.ping(timeout=5)
+        return True
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def connect_when_ready(port: int, timeout: float) -> rpyc.Connection:
+    """Connects to the test server on `port` as soon as it answers."""
+    error = None
+    for _ in backoff(timeout):
+        conn = None
+        try:
+            conn = rpyc.connect(
+                "localhost", port, keepalive=True, config={"sync_request_timeout": 180}
+            )
+            conn.ping(timeout=5)
+            return conn
+        except Exception as e:
+            error = e
+            if conn is not None:
+                conn.close()
+    raise TimeoutError(f"No test server on port {port}: {error!r}") from error
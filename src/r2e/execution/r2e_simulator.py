@@ -6,11 +6,15 @@ https://stackoverflow.com/questions/46390309/how-to-copy-a-file-from-host-to-con
 import io
 import os
 import tarfile
-from time import sleep
 
 import docker
 from docker.models.containers import Container
 
+from r2e.execution.ports import backoff
+
+# seconds to wait for a started container to be running
+CONTAINER_TIMEOUT = 60
+
 
 class DockerSimulator:
     def __init__(
@@ -19,12 +23,15 @@ class DockerSimulator:
         repo_id: str = "aider",
         port: int = 3006,
         command: str = "/bin/bash",
+        client: docker.DockerClient | None = None,
         **docker_kwargs,
     ):
         self.image_name = image_name
         self.repo_id = repo_id
         self.command = command
-        self.client = docker.from_env()
+        self.client = client if client is not None else docker.from_env()
+        self.port = port
+        self.host_port: int | None = None  ## `port` as published on the host
         self.start_container(image_name, command, port, **docker_kwargs)
         self.workdir = f"/repos/{repo_id}"
         self.start_server(repo_id, port)
@@ -37,14 +44,20 @@ class DockerSimulator:
             command,
             detach=True,
             tty=True,
-            ports={f"{port}/tcp": port},
+            ports={f"{port}/tcp": None},  ## docker picks a free host port
             # network_mode="host",
             **docker_kwargs,
         )
         try:
-            while self.container.status != "running":
-                sleep(1)
+            # docker fills in the published port some time after the start
+            for _ in backoff(CONTAINER_TIMEOUT):
                 self.container.reload()
+                bindings = self.container.ports.get(f"{port}/tcp")
+                if self.container.status == "running" and bindings:
+                    self.host_port = int(bindings[0]["HostPort"])
+                    break
+            if self.host_port is None:
+                raise TimeoutError(f"Port {port} of the container not published")
         except Exception as e:
             print("Container start error", repr(e))
             self.stop_container()
@@ -77,6 +90,13 @@ class DockerSimulator:
         self.run_single_command(command)
         return
 
+    def is_running(self) -> bool:
+        try:
+            self.container.reload()
+        except Exception:
+            return False
+        return self.container.status == "running"
+
     def stop_container(self):
         try:
             self.container.stop()
@@ -1,18 +1,24 @@
 import rpyc
-import time
 from threading import Thread, Event
 from rpyc.utils.server import ThreadPoolServer
 from r2e_test_server.server import R2EService
 from r2e.execution.r2e_simulator import DockerSimulator
+from r2e.execution.ports import connect_when_ready
+
+# seconds to wait for a started test server to answer
+SERVER_TIMEOUT = 60
 
 
 server_stop_event = Event()
 
 
-def start_server_nonblocking(port: int):
+def start_server_nonblocking(port: int) -> tuple[Thread, int]:
+    """Starts a test server on `port`, or on a port the OS picks if 0, and
+    returns its thread and the port it is bound to."""
     server = ThreadPoolServer(
         R2EService(), port=port, protocol_config={"allow_reuse_address": True}
     )
+    port = server.port
 
     def run_server():
         server.start()
@@ -22,7 +28,7 @@ def start_server_nonblocking(port: int):
 
     server_thread = Thread(target=run_server)
     server_thread.start()
-    return server_thread
+    return server_thread, port
 
 
 def stop_server():
@@ -40,14 +46,11 @@ class ServiceManager:
         if local:
             # start a new local server at given port
             if not port in ServiceManager.running_ports:
-                t = start_server_nonblocking(port)
-                ServiceManager.running_ports.add(port)
-                ServiceManager.server_threads[port] = t
-                time.sleep(3)
+                ServiceManager.start_local_server(port)
 
-            # connect to the server
+            # connect to the server once it is listening
             try:
-                conn = rpyc.connect("localhost", port)
+                conn = connect_when_ready(port, SERVER_TIMEOUT)
             except Exception as e:
                 print(f"Connection error -- {repr(e)} -- {port}")
                 raise e
@@ -56,16 +59,26 @@ class ServiceManager:
 
         return ServiceManager.get_service_docker(image, repo_id, port)
 
+    @staticmethod
+    def start_local_server(port: int = 0) -> int:
+        """Starts a local test server and returns its port. With port 0 the
+        server binds a port the OS picks, so concurrent workers cannot race
+        for the same free port."""
+        t, port = start_server_nonblocking(port)
+        ServiceManager.running_ports.add(port)
+        ServiceManager.server_threads[port] = t
+        return port
+
     @staticmethod
     def get_service_docker(image: str, repo_id: str, port: int):
         # start new docker container and server inside it
         simulator = DockerSimulator(image_name=image, repo_id=repo_id, port=port)
 
-        # connect to the server
+        # connect to the server, on the port docker published, once it answers
         try:
-            conn = rpyc.connect(
-                "localhost", port, keepalive=True, config={"sync_request_timeout": 180}
-            )
+            if simulator.host_port is None:
+                raise RuntimeError("Container did not start")
+            conn = connect_when_ready(simulator.host_port, SERVER_TIMEOUT)
         except Exception as e:
             print(f"Connection error -- {repo_id} -- {repr(e)}")
             simulator.stop_container()
@@ -96,6 +109,11 @@ class ServiceManager:
 
     @staticmethod
     def close_connection(port):
+        # only local servers run on this host's ports; a port that docker
+        # published may belong to another worker's container by now
+        if port not in ServiceManager.running_ports:
+            return
+
         try:
             conn = rpyc.connect("localhost", port)
             service = conn.root
@@ -104,8 +122,7 @@ class ServiceManager:
         except Exception as e:
             print(f"Error closing connection on port {port}: {e}")
 
-        if port in ServiceManager.running_ports:
-            ServiceManager.running_ports.remove(port)
+        ServiceManager.running_ports.remove(port)
 
         if port in ServiceManager.server_threads:
             thread = ServiceManager.server_threads[port]
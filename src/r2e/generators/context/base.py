@@ -13,6 +13,7 @@ from r2e.pat.ast.transformer import (
     RemoveClassTransformer,
     MoveMethodToClassEndTransformer,
 )
+from r2e.utils.snapshot import read_source
 
 
 class ContextCreator:
@@ -223,9 +224,8 @@ class ContextCreator:
         method_name = method.name
         file_path = method.file.file_path
 
-        with open(file_path, "r") as f:
-            code = f.read()
-            tree = ast.parse(code)
+        code = read_source(file_path)
+        tree = ast.parse(code)
 
         class_node = None
         for node in ast.walk(tree):
@@ -6,6 +6,7 @@ from r2e.generators.context.format import ContextFormatter, ContextFormat
 from r2e.pat.callgraph.explorer import CallGraphExplorer
 from r2e.pat.imports.resolver import ImportResolver
 from r2e.models import Function, Method
+from r2e.utils.snapshot import read_source
 
 
 class FullContextCreator(ContextCreator):
@@ -42,11 +43,10 @@ class FullContextCreator(ContextCreator):
                 continue
 
             # add each "called" file to the context
-            with open(file_path, "r") as f:
-                rel_path = self.full_to_rel_path(file_path)
-                code = f.read()
-                self.context += ContextFormatter.format(code, rel_path, self.format)
-                self.file2code[rel_path] = code
+            rel_path = self.full_to_rel_path(file_path)
+            code = read_source(file_path)
+            self.context += ContextFormatter.format(code, rel_path, self.format)
+            self.file2code[rel_path] = code
 
         self.context += self.processed_fut_file()
 
@@ -66,8 +66,7 @@ class FullContextCreator(ContextCreator):
 
     def imported_files(self) -> set[str]:
         """Get the set of files that the func_meth's file imports"""
-        with open(self.func_meth.file_path, "r") as f:
-            tree = ast.parse(f.read())
+        tree = ast.parse(read_source(self.func_meth.file_path))
 
         imported_files = set()
         for node in ast.walk(tree):
@@ -83,8 +82,7 @@ class FullContextCreator(ContextCreator):
 
     def processed_fut_file(self) -> str:
         """Get the file containing the func_meth and returns in-file context"""
-        with open(self.func_meth.file_path, "r") as f:
-            code = f.read()
+        code = read_source(self.func_meth.file_path)
 
         assert self.func_meth.name is not None, "Function name not available"
 
@@ -51,3 +51,7 @@ class GenExecArgs(TestGenArgs, ExecutionArgs):
         0.8,
         description="The minimum percentage of valid problems to achieve in the dataset",
     )
+    time_budget: int | None = Field(
+        None,
+        description="Minutes after which running tests are cancelled and no new round is started",
+    )
@@ -12,7 +12,8 @@ from r2e.generators.context import get_context_wrapper
 from r2e.generators.testgen import TestGenTask, TestGenArgs
 from r2e.llms.completions import LLMCompletions
 from r2e.generators.testgen.utils import get_generated_tests
-from r2e.multiprocess import run_tasks_in_parallel_iter
+from r2e.multiprocess import WorkerPool, run_tasks_as_completed_iter
+from r2e.utils.snapshot import shared_snapshot
 from r2e.utils.data import (
     load_functions,
     load_functions_under_test,
@@ -21,6 +22,9 @@ from r2e.utils.data import (
 )
 from r2e.paths import EXTRACTED_DATA_DIR, TESTGEN_DIR, timestamp
 
+# modules imported once by each worker of the shared pool
+TESTGEN_PRELOAD_MODULES = ["r2e.generators.context.utils"]
+
 
 class R2ETestGenerator:
 
@@ -32,8 +36,16 @@ class R2ETestGenerator:
         if args.function:
             functions = [f for f in functions if f.name == args.function]
 
-        tasks = R2ETestGenerator.prepare_tasks(args, functions)
-        R2ETestGenerator._generate(args, tasks, write_to_file=True)
+        # workers read the repo sources from shared per-repo snapshots
+        snapshot_dir = TESTGEN_DIR / f"{args.exp_id}_sources"
+        repo_paths = {f.repo.repo_path for f in functions}
+        with (
+            shared_snapshot(repo_paths, snapshot_dir),
+            WorkerPool(num_workers=8, preload_modules=TESTGEN_PRELOAD_MODULES) as pool,
+            pool.activate(),
+        ):
+            tasks = R2ETestGenerator.prepare_tasks(args, functions)
+            R2ETestGenerator._generate(args, tasks, write_to_file=True)
 
     @staticmethod
     def _generate(args, tasks, test_id=0, write_to_file=False):
@@ -97,25 +109,27 @@ class R2ETestGenerator:
     @staticmethod
     def prepare_tasks(args, functions) -> list[TestGenTask]:
         context_gen_tasks = [(args.context_type, func, 6000) for func in functions]
-        context_iter = run_tasks_in_parallel_iter(
+        context_iter = run_tasks_as_completed_iter(
             get_context_wrapper,
             context_gen_tasks,
             num_workers=8,
             use_progress_bar=True,
             progress_bar_desc="Generating contexts",
+            max_in_flight=32,
         )
 
-        tasks = []
+        tasks = {}
 
-        for func, task_result in zip(functions, context_iter):
+        for index, task_result in context_iter:
             if task_result.is_success():
-                context = task_result.result
-                func.add_context(context)
-                tasks.append(TestGenTask(func_meth=func))
+                func = functions[index]
+                func.add_context(task_result.result)
+                tasks[index] = TestGenTask(func_meth=func)
             else:
                 print(f"Error generating context:\n{task_result.exception_tb}")
 
-        return tasks
+        # keep the input order of the functions
+        return [tasks[index] for index in sorted(tasks)]
 
     @staticmethod
     def update_tasks(tasks, results) -> list[TestGenTask]:
@@ -1,16 +1,23 @@
 """A simple agent-based test generator with execution and coverage feedback"""
 
 import os
+import time
 import fire
-from tempfile import NamedTemporaryFile
+from contextlib import ExitStack
 
 from r2e.models import *
 from r2e.utils.data import *
 from r2e.paths import *
 
+from r2e.multiprocess import WorkerPool
+from r2e.utils.snapshot import shared_snapshot
+from r2e.execution.container_pool import warm_containers
 from r2e.execution.execute import EquivalenceTestRunner
 from r2e.generators.testgen.args import GenExecArgs
-from r2e.generators.testgen.generate import R2ETestGenerator
+from r2e.generators.testgen.generate import (
+    R2ETestGenerator,
+    TESTGEN_PRELOAD_MODULES,
+)
 from r2e.generators.testgen.task import TestGenTask
 from r2e.generators.testgen.utils import annotate_coverage
 
@@ -28,6 +35,37 @@ class R2EGenExec:
 
         assert len(functions) > 0, "No functions found for the given input"
 
+        # one warm pool of --execution-multiprocess workers, reading sources
+        # from shared per-repo snapshots, serves context generation and every
+        # round's execution; its workers keep their test containers warm
+        # across rounds
+        snapshot_dir = TESTGEN_DIR / f"{args.exp_id}_sources"
+        repo_paths = {f.repo.repo_path for f in functions}
+        with ExitStack() as stack:
+            if args.warm_containers and not args.local:
+                stack.enter_context(
+                    warm_containers(
+                        args.container_max_uses,
+                        args.container_max_idle,
+                        args.keep_servers,
+                    )
+                )
+            R2EGenExec._genexec_in_pool(args, functions, snapshot_dir, repo_paths)
+
+    @staticmethod
+    def _genexec_in_pool(args, functions, snapshot_dir, repo_paths):
+        with (
+            shared_snapshot(repo_paths, snapshot_dir),
+            WorkerPool(
+                num_workers=args.execution_multiprocess,
+                preload_modules=TESTGEN_PRELOAD_MODULES + ["r2e.execution.helpers"],
+            ) as pool,
+            pool.activate(),
+        ):
+            R2EGenExec._genexec(args, functions)
+
+    @staticmethod
+    def _genexec(args, functions):
         final_output_file = EXECUTION_DIR / f"{args.exp_id}_out.json"
         worklist: list[TestGenTask] = R2ETestGenerator.prepare_tasks(args, functions)
         count = len(worklist)
@@ -35,16 +73,24 @@ class R2EGenExec:
         current_results: list[FunctionUnderTest | MethodUnderTest] = []
         futs = []
 
+        deadline = None
+        if args.time_budget is not None:
+            deadline = time.time() + 60 * args.time_budget
+
         for round in range(1, args.max_rounds + 1):
             print(f"Starting round {round}/{args.max_rounds}")
             # generate -> execute -> filter
             futs = R2EGenExec.generate(args, futs, worklist, round)
-            futs = R2EGenExec.execute(args, futs)
+            futs = R2EGenExec.execute(args, futs, deadline)
             status_map, _continue = R2EGenExec.filter(futs, worklist, args)
 
+            # out of time or good enough: this round is the last one
+            out_of_time = deadline is not None and time.time() >= deadline
+            last_round = round if out_of_time or not _continue else args.max_rounds
+
             # update current results
             current_results = R2EGenExec._update_current_results(
-                current_results, futs, status_map, round, args.max_rounds
+                current_results, futs, status_map, round, last_round
             )
 
             # update worklist=tasks for failing futs
@@ -58,6 +104,10 @@ class R2EGenExec:
                 print(f"Reached max rounds. Stopping at round {round}")
                 break
 
+            if out_of_time:
+                print(f"Time budget exhausted. Stopping at round {round}")
+                break
+
             good_ratio = (count - len(worklist)) / count
             print(f"Round {round} completed. Status: {good_ratio:.2f} good FUTs.\n")
 
@@ -79,33 +129,44 @@ class R2EGenExec:
         return futs
 
     @staticmethod
-    def execute(args, futs):
-        """Execute the tests for the functions and return updated FUTs"""
-        with NamedTemporaryFile(mode="w", delete=False, suffix=".json") as tmp_file:
-            write_functions_under_test(futs, tmp_file.name)
-            args.in_file = tmp_file.name
-            EquivalenceTestRunner.run(args)
-
-        # load the executed futs and return
-        futs = load_functions_under_test(EXECUTION_DIR / f"{args.exp_id}_out.json")
-        return futs
+    def execute(args, futs, deadline=None):
+        """Execute the tests for the functions and return updated FUTs.
+
+        FUTs whose previous tests passed, and only lack coverage, are the
+        likeliest to become good and run first. Once enough FUTs are good to
+        reach `min_valid`, the rest of the round is cancelled.
+        """
+        good = 0
+
+        def stop_when(fut):
+            nonlocal good
+            good += R2EGenExec._is_good(fut, args)
+            return good / len(futs) >= args.min_valid
+
+        return EquivalenceTestRunner.run_futs(
+            futs,
+            args,
+            deadline,
+            priority=R2EGenExec._priority,
+            stop_when=stop_when,
+        )
 
     @staticmethod
     def filter(futs, tasks, args):
         good_futs, status_map = 0, {}
 
         for i, fut in enumerate(futs):
-            fut_coverage = fut.coverage.get("branch_coverage_percentage", 0) / 100
             if fut.is_passing:
-                if fut_coverage < args.min_cov:
+                if not R2EGenExec._is_good(fut, args):
                     status_map[i] = (False, "improve_coverage", annotate_coverage(fut))
                 else:
                     good_futs += 1
                     status_map[i] = (True, None, None)
                 continue
 
-            # has no exec_stats --> a setup issue the LLM cannot fix
+            # has no exec_stats --> not run, the round was cancelled
             if fut.exec_stats is None:
+                status_map[i] = (False, "unfinished", None)
                 continue
 
             # test run errored out or failed
@@ -116,11 +177,28 @@ class R2EGenExec:
 
     ############################## helper functions ##############################
 
+    @staticmethod
+    def _is_good(fut, args) -> bool:
+        """Whether the latest tests of the FUT pass with enough coverage"""
+        fut_coverage = fut.coverage.get("branch_coverage_percentage", 0) / 100
+        return fut.is_passing and fut_coverage >= args.min_cov
+
+    @staticmethod
+    def _priority(fut) -> int:
+        """1 if the tests of the previous round passed, else 0"""
+        previous = fut.test_history.history[:-1]
+        return int(TestHistory.model_construct(history=previous).is_passing)
+
     @staticmethod
     def _update_worklist(worklist, futs, status_map, round):
+        # unfinished tasks are generated again from the same conversation
         return [
-            R2EGenExec._update_task(
-                worklist[i], futs[i].tests[f"test_{round-1}"], ut, feedback
+            (
+                worklist[i]
+                if ut == "unfinished"
+                else R2EGenExec._update_task(
+                    worklist[i], futs[i].tests[f"test_{round-1}"], ut, feedback
+                )
             )
             for i, (passing, ut, feedback) in status_map.items()
             if not passing
@@ -1,3 +1,6 @@
+from r2e.utils.snapshot import read_source
+
+
 def extract_codeblock(output) -> str:
     outputlines = output.split("\n")
     indexlines = [i for i, line in enumerate(outputlines) if "```" in line]
@@ -20,8 +23,7 @@ def get_generated_tests(outputs) -> list[str]:
 def annotate_coverage(fut) -> str:
     """Helper function to annotate the code with coverage information"""
     coverage = fut.coverage
-    with open(fut.file_path, "r") as f:
-        code = f.read()
+    code = read_source(fut.file_path)
 
     unexecuted_lines = coverage.get("unexecuted_lines", [])
     unevaluated_branches = [
@@ -0,0 +1,109 @@
+import os
+import asyncio
+import traceback
+from contextlib import AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from tqdm import tqdm
+
+from r2e.llms.rate_limiter import estimate_tokens
+from r2e.llms.streaming import collect_until_codeblock_async
+from r2e.llms.openai_runner import OpenAIRunner, RETRYABLE_ERRORS
+
+
+class AsyncOpenAIRunner(OpenAIRunner):
+    """
+    Sends the requests of a batch from a single event loop with the async
+    OpenAI client, keeping at most `args.max_concurrent_requests` in flight.
+    Unlike the threaded runner, nothing is pickled or copied per request, so
+    hundreds of concurrent requests cost one process.
+    """
+
+    async def _run_single_async(
+        self, client: AsyncOpenAI, payload: list[dict[str, str]], n: int | None = None
+    ) -> list[str]:
+        assert isinstance(payload, list)
+        kwargs = self._request_kwargs(n)
+        tokens = estimate_tokens(payload, self.args.max_tokens, kwargs.get("n", 1))
+
+        for attempt in range(self.args.max_retries + 1):
+            await self.rate_limiter.acquire_async(tokens)
+            try:
+                raw_response = await client.chat.completions.with_raw_response.create(
+                    messages=payload,  # type: ignore
+                    stream=self.args.stream_until_codeblock,
+                    **kwargs,
+                )
+                self.rate_limiter.update_from_headers(raw_response.headers)
+                if self.args.stream_until_codeblock:
+                    return await collect_until_codeblock_async(
+                        raw_response.parse(), kwargs.get("n", 1)
+                    )
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.args.max_retries:
+                    print(f"Giving up after {attempt + 1} attempts: {e!r}")
+                    raise e
+                delay = self._retry_delay(e, attempt)
+                print(f"Exception: {e!r}. Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+
+            response: ChatCompletion = raw_response.parse()
+            return [c.message.content for c in response.choices]  # type: ignore
+
+        raise AssertionError("unreachable")
+
+    def _make_clients(self) -> list[AsyncOpenAI]:
+        """Clients the requests are spread over, round-robin."""
+        return [AsyncOpenAI(api_key=os.getenv("OPENAI_KEY"), max_retries=0)]
+
+    def _max_in_flight(self) -> int:
+        return self.args.max_concurrent_requests
+
+    async def _run_batch_async(
+        self, payloads: list[list[dict[str, str]]], counts: list[int]
+    ) -> list[list[str] | None]:
+        semaphore = asyncio.Semaphore(self._max_in_flight())
+        pbar = tqdm(total=len(payloads))
+
+        async def run(client: AsyncOpenAI, payload, n: int) -> list[str] | None:
+            async with semaphore:
+                try:
+                    return await self._run_single_async(client, payload, n)
+                except Exception:
+                    print(f"Failed to run the model for {payload}!")
+                    print(traceback.format_exc())
+                    return None
+                finally:
+                    pbar.update(1)
+
+        # the clients' connection pools are bound to this event loop
+        try:
+            async with AsyncExitStack() as stack:
+                clients = [
+                    await stack.enter_async_context(client)
+                    for client in self._make_clients()
+                ]
+                return await asyncio.gather(
+                    *(
+                        run(clients[i % len(clients)], payload, n)
+                        for i, (payload, n) in enumerate(zip(payloads, counts))
+                    )
+                )
+        finally:
+            pbar.close()
+
+    def _run_uncached(
+        self, payloads: list, counts: list[int]
+    ) -> list[list[str] | None]:
+        batch = self._run_batch_async(payloads, counts)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(batch)
+        # called from a running event loop (e.g. in a notebook), which cannot
+        # run another one; the batch gets its own loop on a helper thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, batch).result()
@@ -1,4 +1,3 @@
-import json
 from abc import ABC, abstractmethod
 
 from tqdm import tqdm
@@ -16,7 +15,21 @@ class BaseRunner(ABC):
         self.client_kwargs: dict[str, str] = {}
 
         if self.args.use_cache:
-            self.cache = Cache()
+            self.cache = Cache(
+                keep_prompts=self.args.cache_keep_prompts,
+                namespace=self.args.model_name,
+                size_limit=(
+                    None
+                    if self.args.cache_size_limit is None
+                    else self.args.cache_size_limit * 1024**2
+                ),
+                eviction_policy=self.args.cache_eviction_policy,
+                ttl=(
+                    None
+                    if self.args.cache_ttl_days is None
+                    else self.args.cache_ttl_days * 24 * 3600
+                ),
+            )
         else:
             self.cache = None
 
@@ -29,7 +42,8 @@ class BaseRunner(ABC):
         pass
 
     @abstractmethod
-    def _run_single(self, payload) -> list[str]:
+    def _run_single(self, payload, n: int | None = None) -> list[str]:
+        """Samples `n` completions for `payload` (`args.n` if None)"""
         return []
 
     @staticmethod
@@ -39,37 +53,34 @@ class BaseRunner(ABC):
         Static method to be used in multiprocessing
         Calls the _run_single method with the combined arguments
         """
-        cache: Cache | None
         call_method: callable  # type: ignore
-        payload, cache, args, config, call_method = combined_args
-
-        if cache is not None:
-            cache_result = cache.get_from_cache(json.dumps([payload, config]))
-            if cache_result is not None:
-                return cache_result
-
-        result = call_method(payload)
-        return result
+        payload, n, call_method = combined_args
+        return call_method(payload, n)
 
-    def run_batch(self, payloads: list) -> list[list[str]]:
-        outputs = []
-        config = self.config()
+    def _run_uncached(
+        self, payloads: list, counts: list[int]
+    ) -> list[list[str] | None]:
+        """
+        Run the model for payloads missing from the cache, sampling `counts[i]`
+        completions for `payloads[i]`; None on failure
+        """
+        outputs: list[list[str] | None] = []
         arguments = [
             (
                 payload,
-                self.cache,  ## pass the cache as argument for cache check
-                self.args,  ## pass the args as argument for cache check
-                config,
+                n,
                 self._run_single,  ## pass the _run_single method as argument because of multiprocessing
             )
-            for payload in payloads
+            for payload, n in zip(payloads, counts)
         ]
         if self.args.multiprocess > 1:
+            # API calls are I/O-bound: threads avoid spawning and pickling
             parallel_outputs = run_tasks_in_parallel(
                 self.run_single,
                 arguments,
                 self.args.multiprocess,
                 use_progress_bar=True,
+                backend="thread",
             )
             for output in parallel_outputs:
                 if output.is_success():
@@ -78,18 +89,54 @@ class BaseRunner(ABC):
                     print("Failed to run the model for some payload")
                     print(output.status)
                     print(output.exception_tb)
-                    outputs.extend([""] * self.args.n)
+                    outputs.append(None)
         else:
             outputs = [self.run_single(argument) for argument in tqdm(arguments)]
 
+        return outputs
+
+    def run_batch(self, payloads: list) -> list[list[str]]:
+        config = self.config()
+        n = config.get("n", 1)
+        # samples are cached per payload and sampling params minus n, so
+        # raising n reuses the samples already drawn and only asks for more
+        sample_config = {key: value for key, value in config.items() if key != "n"}
+        keys = [[payload, sample_config] for payload in payloads]
+
+        ## resolve all cache hits in one lookup and only run the misses
+        new_entries = []
+        cached: list[list | None]
         if self.cache is not None:
-            for payload, output in zip(payloads, outputs):
-                self.cache.add_to_cache(
-                    json.dumps([payload, config]), output
-                )  ## save the output to cache
+            cached = self.cache.get_many(keys)
+        else:
+            cached = [None] * len(payloads)
+
+        outputs: list[list[str] | None] = [None] * len(payloads)
+        missing, counts = [], []
+        drawn = [samples or [] for samples in cached]
+        for index, samples in enumerate(drawn):
+            if len(samples) >= n:
+                outputs[index] = samples[:n]
+            else:
+                missing.append(index)
+                counts.append(n - len(samples))
+
+        if missing:
+            results = self._run_uncached([payloads[i] for i in missing], counts)
+            for index, count, result in zip(missing, counts, results):
+                if result is None:
+                    # failures are not cached, so they are retried next time
+                    outputs[index] = drawn[index] + [""] * count
+                    continue
+                samples = drawn[index] + result
+                outputs[index] = samples[:n]
+                new_entries.append((keys[index], samples))
+
+        if self.cache is not None and new_entries:
+            self.cache.set_many(new_entries)  ## save the outputs in one write
             self.save_cache()
 
-        return outputs
+        return outputs  # type: ignore
 
     def run_main(self, payloads: list) -> list[list[str]]:
         if self.cache is not None:
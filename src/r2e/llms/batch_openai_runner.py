@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+from openai import OpenAI
+
+from r2e.paths import CACHE_DIR
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.openai_runner import OpenAIRunner
+from r2e.llms.language_model import LanguageModel
+
+# input files and ids of submitted batches live in CACHE_DIR / BATCHES_DIR
+BATCHES_DIR = "batches"
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# client options that are not part of the request body
+CLIENT_ONLY_KWARGS = {"timeout"}
+
+
+class BatchOpenAIRunner(OpenAIRunner):
+    """
+    Runs the requests missing from the cache through the OpenAI Batch API:
+    they are written to a JSONL file, uploaded and submitted as a batch,
+    which is polled until done. Results are merged back into the cache by
+    `run_batch` like those of the other runners; failed requests are not
+    cached and are retried on the next run.
+
+    The id of each submitted batch is stored next to its input file, so a
+    rerun after an interruption resumes polling the same batch instead of
+    submitting (and paying for) it again.
+    """
+
+    def __init__(self, args: LLMArgs, model: LanguageModel):
+        super().__init__(args, model)
+        # reads OPENAI_BASE_URL, e.g. to point at a local stand-in server
+        self.batch_client = OpenAI(
+            api_key=os.getenv("OPENAI_KEY"),
+            max_retries=args.max_retries,
+        )
+
+    def config(self):
+        # batches return full completions, even with --stream_until_codeblock
+        return self.client_kwargs
+
+    def run_main(self, payloads: list) -> list[list[str]]:
+        # batches are only worth it with all payloads in one submission
+        return self.run_batch(payloads)
+
+    def _request_body(self, payload: list[dict[str, str]], n: int) -> dict:
+        kwargs = self._request_kwargs(n)
+        body = {k: v for k, v in kwargs.items() if k not in CLIENT_ONLY_KWARGS}
+        body["messages"] = payload
+        return body
+
+    def _run_uncached(
+        self, payloads: list, counts: list[int]
+    ) -> list[list[str] | None]:
+        outputs: list[list[str] | None] = []
+        size = self.args.batch_max_requests
+        for start in range(0, len(payloads), size):
+            requests = [
+                {
+                    "custom_id": f"request-{start + i}",
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": self._request_body(payload, n),
+                }
+                for i, (payload, n) in enumerate(
+                    zip(payloads[start : start + size], counts[start : start + size])
+                )
+            ]
+            outputs.extend(self.run_requests(requests))
+        return outputs
+
+    def run_requests(self, requests: list[dict]) -> list[list[str] | None]:
+        """Submits one batch of requests (or resumes it) and waits for it."""
+        lines = [json.dumps(request, sort_keys=True) for request in requests]
+        digest = hashlib.sha256("\n".join(lines).encode()).hexdigest()[:16]
+        batch_dir = Path(CACHE_DIR) / BATCHES_DIR
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        input_path = batch_dir / f"{digest}.jsonl"
+        id_path = batch_dir / f"{digest}.batch"
+
+        if id_path.exists():
+            batch = self.batch_client.batches.retrieve(id_path.read_text().strip())
+            print(f"Resuming batch {batch.id}")
+        else:
+            input_path.write_text("\n".join(lines) + "\n")
+            with open(input_path, "rb") as f:
+                input_file = self.batch_client.files.create(file=f, purpose="batch")
+            batch = self.batch_client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.args.batch_completion_window,
+            )
+            id_path.write_text(batch.id)
+            print(f"Submitted batch {batch.id} with {len(requests)} requests")
+
+        while batch.status not in FINAL_STATUSES:
+            time.sleep(self.args.batch_poll_interval)
+            batch = self.batch_client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            if counts is not None:
+                print(
+                    f"Batch {batch.id} {batch.status}: "
+                    f"{counts.completed}/{counts.total} done, {counts.failed} failed"
+                )
+
+        results = {}
+        if batch.output_file_id is not None:
+            content = self.batch_client.files.content(batch.output_file_id).text
+            results = self.parse_results(content)
+        if batch.status != "completed" or len(results) < len(requests):
+            print(
+                f"Batch {batch.id} ended {batch.status} with "
+                f"{len(results)}/{len(requests)} successful requests"
+            )
+
+        id_path.unlink(missing_ok=True)
+        input_path.unlink(missing_ok=True)
+        return [results.get(request["custom_id"]) for request in requests]
+
+    @staticmethod
+    def parse_results(content: str) -> dict[str, list[str]]:
+        """Completions of each successful request in a batch output file."""
+        results = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                continue
+            choices = response["body"]["choices"]
+            results[result["custom_id"]] = [
+                choice["message"]["content"] for choice in choices
+            ]
+        return results
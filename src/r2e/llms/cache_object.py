@@ -1,30 +1,260 @@
 import os
+import re
 import json
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Any, cast
 from diskcache import Cache as DiskCache
 
 from r2e.paths import CACHE_PATH, CACHE_DIR
 
+KEY_PREFIX = "sha256:"
+
+# per-model caches live in CACHE_DIR / NAMESPACES_DIR / <model>
+NAMESPACES_DIR = "models"
+
+EVICTION_POLICIES = {
+    "lrs": "least-recently-stored",
+    "lru": "least-recently-used",
+    "lfu": "least-frequently-used",
+    "none": "none",
+}
+
+
+def namespace_dir(namespace: str) -> Path:
+    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", namespace)
+    if not safe_name.strip("."):
+        raise ValueError(f"Invalid cache namespace {namespace!r}")
+    return Path(CACHE_DIR) / NAMESPACES_DIR / safe_name
+
+
+def list_namespaces() -> list[str]:
+    """Names of the per-model caches on disk."""
+    root = Path(CACHE_DIR) / NAMESPACES_DIR
+    if not root.exists():
+        return []
+    return sorted(path.name for path in root.iterdir() if path.is_dir())
+
 
 class Cache:
-    def __init__(self) -> None:
+    """
+    LLM response cache. Entries are keyed by a digest of the canonical JSON
+    of the payload (see `make_key`), so keys stay small however long the
+    prompt is. With `keep_prompts` the full payload is also stored in a side
+    table, for looking up what produced an entry.
+
+    With a `namespace` (the model name) entries go to a separate cache per
+    model, which has its own size limit and eviction policy and can be
+    inspected and pruned on its own (`r2e cache`). Entries expire after
+    `ttl` seconds if given.
+
+    Lookups only use the digest key of the cache itself. Entries written by
+    earlier versions are moved to where they are looked up by
+    `migrate_cache` (`r2e cache migrate`).
+    """
+
+    def __init__(
+        self,
+        keep_prompts: bool = False,
+        namespace: str | None = None,
+        size_limit: int | None = None,
+        eviction_policy: str | None = None,
+        ttl: float | None = None,
+    ) -> None:
         os.makedirs(CACHE_DIR, exist_ok=True)
-        self.cache_dict = DiskCache(CACHE_DIR)
+        settings: dict = {}
+        if size_limit is not None:
+            settings["size_limit"] = size_limit
+        if eviction_policy is not None:
+            settings["eviction_policy"] = EVICTION_POLICIES[eviction_policy]
+
+        self.ttl = ttl
+        if namespace is None:
+            directory = Path(CACHE_DIR)
+        else:
+            directory = namespace_dir(namespace)
+        self.cache_dict = DiskCache(directory, **settings)
+
+        self.prompts = None
+        if keep_prompts:
+            self.prompts = DiskCache(directory / "prompts")
 
     @staticmethod
     def process_payload(payload):
+        """The key used for `payload` before keys were hashed."""
         if isinstance(payload, (list, dict)):
             return json.dumps(payload)
         return payload
 
+    @staticmethod
+    def canonicalize(payload) -> str:
+        if isinstance(payload, str):
+            return payload
+        return json.dumps(
+            payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+
+    @staticmethod
+    def make_key(payload) -> str:
+        digest = hashlib.sha256(Cache.canonicalize(payload).encode()).hexdigest()
+        return KEY_PREFIX + digest
+
+    def _get(self, payload):
+        return self.cache_dict.get(self.make_key(payload)) or None
+
     def get_from_cache(self, payload):
-        payload_cache = self.process_payload(payload)
-        if self.cache_dict.get(payload_cache):
-            return self.cache_dict[payload_cache]
-        return None
+        with self.cache_dict.transact():
+            return self._get(payload)
+
+    def get_many(self, payloads: list) -> list:
+        """Looks up all payloads in one transaction; None for each miss."""
+        with self.cache_dict.transact():
+            return [self._get(payload) for payload in payloads]
+
+    def _set(self, payload, output):
+        key = self.make_key(payload)
+        self.cache_dict.set(key, output, expire=self.ttl)
+        if self.prompts is not None:
+            self.prompts.set(key, self.canonicalize(payload), expire=self.ttl)
 
     def add_to_cache(self, payload, output):
-        payload_cache = self.process_payload(payload)
-        self.cache_dict.set(payload_cache, output)
+        with self.cache_dict.transact():
+            self._set(payload, output)
+
+    def set_many(self, items: list[tuple]) -> None:
+        """Writes all (payload, output) pairs in one transaction."""
+        with self.cache_dict.transact():
+            for payload, output in items:
+                self._set(payload, output)
+
+    def get_prompt(self, key: str):
+        """The payload stored for `key` in the side table, if kept."""
+        if self.prompts is None:
+            return None
+        return self.prompts.get(key)
 
     def save_cache(self):
         pass
+
+
+def _legacy_payload(key: str):
+    """The payload stored under a key written before keys were hashed."""
+    try:
+        payload = json.loads(key)
+    except ValueError:
+        return key
+    return payload if isinstance(payload, (list, dict)) else key
+
+
+def migrate_cache() -> int:
+    """
+    Moves the entries written by earlier versions to where runners look
+    them up, since lookups do not fall back to old keys. Run it once after
+    upgrading. Entries keyed by their full JSON payload are re-keyed by
+    digest; those of the shared cache whose sampling config names a model
+    move to that model's cache; `n` is dropped from sampling configs, as
+    samples are cached independently of it. Returns the number of entries
+    moved.
+    """
+    caches: dict[str | None, Cache] = {}
+
+    def cache_of(namespace: str | None) -> Cache:
+        if namespace not in caches:
+            caches[namespace] = Cache(namespace=namespace)
+        return caches[namespace]
+
+    moved = 0
+    for namespace in [None] + list_namespaces():
+        source = cache_of(namespace)
+        for old_key in list(source.cache_dict.iterkeys()):
+            if not isinstance(old_key, str) or old_key.startswith(KEY_PREFIX):
+                continue
+
+            payload, target = _legacy_payload(old_key), source
+            if (
+                isinstance(payload, list)
+                and len(payload) == 2
+                and isinstance(payload[1], dict)
+            ):
+                prompt, config = payload
+                payload = [prompt, {k: v for k, v in config.items() if k != "n"}]
+                if namespace is None and isinstance(config.get("model"), str):
+                    target = cache_of(config["model"])
+
+            output = source.cache_dict.get(old_key)
+            if isinstance(output, list) and output:
+                existing = target.get_from_cache(payload)
+                # keep whichever entry holds more samples
+                if not isinstance(existing, list) or len(existing) < len(output):
+                    target.add_to_cache(payload, output)
+            source.cache_dict.delete(old_key)
+            moved += 1
+    return moved
+
+
+def _entries(cache: DiskCache) -> int:
+    """Count of entries in `cache`, including expired ones."""
+    return cast(int, cache.reset("count"))
+
+
+def cache_usage() -> list[tuple[str, int, int]]:
+    """(namespace, entries, bytes on disk) of the shared and per-model caches.
+    The bytes include the side table of prompts, if kept."""
+    usage = []
+    names = [None] + list_namespaces()
+    for name in names:
+        directory = (
+            Path(CACHE_DIR) if name is None else Path(CACHE_DIR) / NAMESPACES_DIR / name
+        )
+        if not directory.exists():
+            continue
+        with DiskCache(directory) as cache:
+            entries, volume = _entries(cache), cache.volume()
+        if (directory / "prompts").exists():
+            with DiskCache(directory / "prompts") as prompts:
+                volume += prompts.volume()
+        usage.append((name or "(shared)", entries, volume))
+    return usage
+
+
+def prune_cache(
+    namespace: str | None = None,
+    size_limit: int | None = None,
+    clear: bool = False,
+) -> int:
+    """
+    Prunes the cache of one model (or the shared cache if no namespace):
+    drops expired entries, then evicts entries by the cache's eviction
+    policy until it fits in `size_limit` bytes, or drops the whole cache if
+    `clear`. The size limit the cache was created with is kept for later
+    writes. Returns the number of entries removed.
+    """
+    if namespace is None:
+        directory = Path(CACHE_DIR)
+    elif namespace in list_namespaces():
+        directory = Path(CACHE_DIR) / NAMESPACES_DIR / namespace
+    else:
+        directory = namespace_dir(namespace)
+    if not directory.exists():
+        return 0
+
+    if clear and namespace is not None:
+        # never remove anything but a model's own cache directory
+        root = (Path(CACHE_DIR) / NAMESPACES_DIR).resolve()
+        if directory.resolve().parent != root:
+            raise ValueError(f"Invalid cache namespace {namespace!r}")
+        with DiskCache(directory) as cache:
+            removed = _entries(cache)
+        shutil.rmtree(directory)
+        return removed
+
+    with DiskCache(directory) as cache:
+        if clear:
+            return cache.clear()
+        removed = cache.expire()
+        if size_limit is not None:
+            # cull to `size_limit` without storing it as the cache's limit
+            cache.reset("size_limit", cast(Any, size_limit), update=False)
+            removed += cache.cull()
+        return removed
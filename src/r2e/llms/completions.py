@@ -1,5 +1,9 @@
 from r2e.llms.llm_args import LLMArgs
-from r2e.llms.language_model import LanguageModelStyle, LanguageModelList
+from r2e.llms.language_model import (
+    LanguageModel,
+    LanguageModelStyle,
+    LanguageModelList,
+)
 
 
 class LLMCompletions:
@@ -7,39 +11,45 @@ class LLMCompletions:
     @staticmethod
     def get_llm_completions(args: LLMArgs, payloads: list) -> list[list[str]]:
         model_name = args.model_name
+        if args.base_urls:
+            # any model served behind OpenAI-compatible endpoints
+            from r2e.llms.endpoint_runner import EndpointRunner
+
+            model = LanguageModel(model_name, LanguageModelStyle.OpenAI)
+            runner = EndpointRunner(args, model)
+            return runner.run_main(payloads)
+
         matched_lang_model = [
             model for model in LanguageModelList if model.model_name == model_name
         ]
+        if not matched_lang_model and args.local_model_path is not None:
+            # any local checkpoint is served with vLLM
+            matched_lang_model = [LanguageModel(model_name, LanguageModelStyle.VLLM)]
         assert len(matched_lang_model) == 1
         model = matched_lang_model[0]
 
         if model.style == LanguageModelStyle.OpenAI:
-            from r2e.llms.openai_runner import OpenAIRunner
+            if args.batch_mode:
+                from r2e.llms.batch_openai_runner import BatchOpenAIRunner
 
-            runner = OpenAIRunner(args, model)
-            return runner.run_main(payloads)
+                runner = BatchOpenAIRunner(args, model)
+                return runner.run_main(payloads)
 
-        raise ValueError(f"Unsupported model style: {model.style}")
+            if args.max_concurrent_requests > 0:
+                from r2e.llms.async_openai_runner import AsyncOpenAIRunner
 
-    # @staticmethod
-    # def get_llm_completions_async(args: LLMArgs, payloads: list) -> None:
-    #     model_name = args.model_name
-    #     matched_lang_model = [
-    #         model for model in LanguageModelList if model.model_name == model_name
-    #     ]
-    #     assert len(matched_lang_model) == 1
-    #     model = matched_lang_model[0]
+                runner = AsyncOpenAIRunner(args, model)
+                return runner.run_main(payloads)
 
-    #     assert model.style == LanguageModelStyle.OpenAI
+            from r2e.llms.openai_runner import OpenAIRunner
 
-    #     from openai import OpenAI
+            runner = OpenAIRunner(args, model)
+            return runner.run_main(payloads)
 
-    #     client = OpenAI()
+        if model.style == LanguageModelStyle.VLLM:
+            from r2e.llms.vllm_runner import VLLMRunner
 
-    #     client.files.create(file=open("mydata.jsonl", "rb"), purpose="batch completions")
+            runner = VLLMRunner(args, model)
+            return runner.run_main(payloads)
 
-    #     client.batches.create(
-    #         input_file_id="file-abc123",
-    #         endpoint="/v1/chat/completions",
-    #         completion_window="24h",
-    #     )
+        raise ValueError(f"Unsupported model style: {model.style}")
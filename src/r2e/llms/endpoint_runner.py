@@ -0,0 +1,47 @@
+import os
+
+from openai import DEFAULT_CONNECTION_LIMITS, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from r2e.llms.async_openai_runner import AsyncOpenAIRunner
+
+
+class EndpointRunner(AsyncOpenAIRunner):
+    """
+    Runs requests against OpenAI-compatible servers (e.g. vLLM or TGI
+    replicas) at `args.base_urls`, spreading them round-robin over the
+    replicas. Each replica gets one pooled HTTP client whose connections are
+    kept alive across requests, with at most `args.max_connections` open at
+    once; `args.http2` multiplexes the requests over fewer connections.
+    """
+
+    def _make_clients(self) -> list[AsyncOpenAI]:
+        # limits of the HTTP library the installed SDK is built on (httpx,
+        # or httpx2 in later releases), for the SDK's own client class
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.args.max_connections,
+            max_keepalive_connections=self.args.max_connections,
+            keepalive_expiry=self.args.keepalive_expiry,
+        )
+        clients = []
+        for base_url in self.args.base_urls:
+            http_client = DefaultAsyncHttpxClient(
+                limits=limits,
+                http2=self.args.http2,  ## needs the h2 package, see r2e[http2]
+                timeout=self.args.openai_timeout,
+            )
+            clients.append(
+                AsyncOpenAI(
+                    base_url=base_url,
+                    # local servers usually accept any key
+                    api_key=os.getenv("OPENAI_KEY", "EMPTY"),
+                    max_retries=0,
+                    http_client=http_client,
+                )
+            )
+        return clients
+
+    def _max_in_flight(self) -> int:
+        # as many requests as there are pooled connections, unless capped
+        return self.args.max_concurrent_requests or (
+            self.args.max_connections * len(self.args.base_urls)
+        )
@@ -113,4 +113,24 @@ LanguageModelList: list[LanguageModel] = [
         model_name="o4-mini",
         style=LanguageModelStyle.OpenAI,
     ),
+    LanguageModel(
+        model_name="deepseek-ai/deepseek-coder-6.7b-instruct",
+        style=LanguageModelStyle.VLLM,
+    ),
+    LanguageModel(
+        model_name="deepseek-ai/deepseek-coder-33b-instruct",
+        style=LanguageModelStyle.VLLM,
+    ),
+    LanguageModel(
+        model_name="meta-llama/Meta-Llama-3-8B-Instruct",
+        style=LanguageModelStyle.VLLM,
+    ),
+    LanguageModel(
+        model_name="Qwen/Qwen2.5-Coder-7B-Instruct",
+        style=LanguageModelStyle.VLLM,
+    ),
+    LanguageModel(
+        model_name="Qwen/Qwen2.5-Coder-32B-Instruct",
+        style=LanguageModelStyle.VLLM,
+    ),
 ]
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel, Field
 
 
@@ -44,11 +45,65 @@ class LLMArgs(BaseModel):
         1,
         description="The number of processes to use for multiprocessing",
     )
+    max_concurrent_requests: int = Field(
+        0,
+        description="If positive, OpenAI requests are sent by the async runner, with this many in flight, instead of the threaded runner (multiprocess is then ignored)",
+    )
 
     openai_timeout: int = Field(
         60,
         description="The timeout for the OpenAI API request",
     )
+    stream_until_codeblock: bool = Field(
+        False,
+        description="Whether to stream OpenAI completions and stop each once its first code block is closed",
+    )
+    requests_per_minute: int | None = Field(
+        None,
+        description="Requests per minute budget. Learned from the API response headers if not set",
+    )
+    tokens_per_minute: int | None = Field(
+        None,
+        description="Tokens per minute budget. Learned from the API response headers if not set",
+    )
+    max_retries: int = Field(
+        6,
+        description="The number of times a failed API request is retried",
+    )
+
+    base_urls: list[str] = Field(
+        [],
+        description="Base URLs of OpenAI-compatible servers to spread the requests over, round-robin",
+    )
+    max_connections: int = Field(
+        64,
+        description="The maximum number of open connections to each server in base_urls",
+    )
+    keepalive_expiry: float = Field(
+        30.0,
+        description="Seconds an idle connection to a server in base_urls is kept open",
+    )
+    http2: bool = Field(
+        False,
+        description="Whether to talk HTTP/2 to the servers in base_urls",
+    )
+
+    batch_mode: bool = Field(
+        False,
+        description="Whether to run OpenAI requests through the Batch API",
+    )
+    batch_poll_interval: int = Field(
+        30,
+        description="Seconds between status checks of a submitted batch",
+    )
+    batch_completion_window: Literal["24h"] = Field(
+        "24h",
+        description="The completion window of submitted batches; the Batch API only supports 24h",
+    )
+    batch_max_requests: int = Field(
+        50000,
+        description="The maximum number of requests per submitted batch",
+    )
 
     use_cache: bool = Field(
         True,
@@ -58,6 +113,22 @@ class LLMArgs(BaseModel):
         1,
         description="The batch size for the cache",
     )
+    cache_keep_prompts: bool = Field(
+        False,
+        description="Whether to also store the full prompt of each cache entry, for debugging",
+    )
+    cache_size_limit: int | None = Field(
+        None,
+        description="Size limit of the model's cache in MB. Keeps the current limit if not set",
+    )
+    cache_eviction_policy: Literal["lrs", "lru", "lfu", "none"] | None = Field(
+        None,
+        description="Eviction policy of the model's cache. Keeps the current policy if not set",
+    )
+    cache_ttl_days: float | None = Field(
+        None,
+        description="Days after which new cache entries expire. Never if not set",
+    )
 
     ## vllm
     tensor_parallel_size: int = Field(
@@ -9,16 +9,37 @@ from openai.types.chat import ChatCompletion
 from r2e.llms.llm_args import LLMArgs
 from r2e.llms.base_runner import BaseRunner
 from r2e.llms.language_model import LanguageModel
+from r2e.llms.streaming import collect_until_codeblock
+from r2e.llms.rate_limiter import (
+    backoff_delay,
+    estimate_tokens,
+    get_rate_limiter,
+    retry_after,
+)
+
+# transient errors worth retrying; anything else is a bad request
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
 
 
 class OpenAIRunner(BaseRunner):
+    # retries are done by the runner, paced by the shared rate limiter
     client = OpenAI(
         api_key=os.getenv("OPENAI_KEY"),
+        max_retries=0,
     )
 
     def __init__(self, args: LLMArgs, model: LanguageModel):
         super().__init__(args, model)
-        if "o1" in args.model_name or "o3" in args.model_name or "o4" in args.model_name:
+        if (
+            "o1" in args.model_name
+            or "o3" in args.model_name
+            or "o4" in args.model_name
+        ):
             self.client_kwargs: dict[str, Any] = {
                 "model": args.model_name,
                 "max_completion_tokens": args.max_tokens,
@@ -35,34 +56,69 @@ class OpenAIRunner(BaseRunner):
                 "timeout": args.openai_timeout,
             }
 
+        self.rate_limiter = get_rate_limiter(
+            args.model_name, args.requests_per_minute, args.tokens_per_minute
+        )
+
     def config(self):
+        if self.args.stream_until_codeblock:
+            # completions cut after their first code block are cached apart
+            return {**self.client_kwargs, "until_codeblock": True}
         return self.client_kwargs
 
-    def _run_single(self, payload: list[dict[str, str]]) -> list[str]:
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before retrying after `error`. Rate limit errors
+        also hold back the other requests sharing the rate limiter."""
+        response = getattr(error, "response", None)
+        delay = retry_after(response.headers if response is not None else None)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        if isinstance(error, openai.RateLimitError):
+            self.rate_limiter.pause(delay)
+        return delay
+
+    def _request_kwargs(self, n: int | None) -> dict[str, Any]:
+        """Client kwargs for a request sampling `n` completions."""
+        if n is None or "n" not in self.client_kwargs:
+            return self.client_kwargs
+        return {**self.client_kwargs, "n": n}
+
+    def _run_single(
+        self, payload: list[dict[str, str]], n: int | None = None
+    ) -> list[str]:
         assert isinstance(payload, list)
+        kwargs = self._request_kwargs(n)
+        tokens = estimate_tokens(payload, self.args.max_tokens, kwargs.get("n", 1))
+
+        for attempt in range(self.args.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                raw_response = (
+                    OpenAIRunner.client.chat.completions.with_raw_response.create(
+                        messages=payload,  # type: ignore
+                        stream=self.args.stream_until_codeblock,
+                        **kwargs,
+                    )
+                )
+                self.rate_limiter.update_from_headers(raw_response.headers)
+                if self.args.stream_until_codeblock:
+                    return collect_until_codeblock(
+                        raw_response.parse(), kwargs.get("n", 1)
+                    )
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.args.max_retries:
+                    print(f"Giving up after {attempt + 1} attempts: {e!r}")
+                    raise e
+                delay = self._retry_delay(e, attempt)
+                print(f"Exception: {e!r}. Retrying in {delay:.1f} seconds...")
+                sleep(delay)
+                continue
+            except Exception as e:
+                print(f"Failed to run the model for {payload}!")
+                print("Exception: ", repr(e))
+                raise e
+
+            response: ChatCompletion = raw_response.parse()
+            return [c.message.content for c in response.choices]  # type: ignore
 
-        try:
-            response: ChatCompletion = OpenAIRunner.client.chat.completions.create(
-                messages=payload,  # type: ignore
-                **self.client_kwargs,
-            )
-        except (
-            openai.APIError,
-            openai.RateLimitError,
-            openai.InternalServerError,
-            openai.OpenAIError,
-            openai.APIStatusError,
-            openai.APITimeoutError,
-            openai.InternalServerError,
-            openai.APIConnectionError,
-        ) as e:
-            print("Exception: ", repr(e))
-            print("Sleeping for 30 seconds...")
-            print("Consider reducing the number of parallel processes.")
-            sleep(30)
-            return self._run_single(payload)
-        except Exception as e:
-            print(f"Failed to run the model for {payload}!")
-            print("Exception: ", repr(e))
-            raise e
-        return [c.message.content for c in response.choices]  # type: ignore
+        raise AssertionError("unreachable")
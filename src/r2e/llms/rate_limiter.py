@@ -0,0 +1,158 @@
+import re
+import time
+import random
+import asyncio
+import threading
+from typing import Mapping, Optional
+
+
+class _Bucket:
+    """A token bucket refilled continuously at `per_minute` units per minute.
+
+    Reservations may overdraw the bucket; the caller then waits until the
+    debt is paid back, so concurrent callers queue up instead of all
+    retrying at the same moment.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` units and returns the seconds to wait before using them."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def update(self, limit: Optional[float], remaining: Optional[float], now: float):
+        self._refill(now)
+        if limit is not None and limit > 0:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """
+    Shared requests-per-minute and tokens-per-minute budget for the requests
+    of one model. Budgets left as None are learned from the x-ratelimit-*
+    response headers once a response arrives. Thread-safe; use `acquire`
+    from threads and `acquire_async` from coroutines.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self._lock = threading.Lock()
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserves one request of `tokens` tokens; returns the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._paused_until - now
+            if self._requests is not None:
+                delay = max(delay, self._requests.reserve(1, now))
+            if self._tokens is not None:
+                delay = max(delay, self._tokens.reserve(tokens, now))
+            return max(delay, 0.0)
+
+    def acquire(self, tokens: int = 0) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Holds back every request for `seconds`, e.g. after a 429 response."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Adopts the limits and remaining budget reported by the API."""
+        with self._lock:
+            now = time.monotonic()
+            for name, attr in (("requests", "_requests"), ("tokens", "_tokens")):
+                limit = _parse_number(headers.get(f"x-ratelimit-limit-{name}"))
+                remaining = _parse_number(headers.get(f"x-ratelimit-remaining-{name}"))
+                bucket = getattr(self, attr)
+                if bucket is None:
+                    if not limit:
+                        continue
+                    bucket = _Bucket(limit)
+                    setattr(self, attr, bucket)
+                bucket.update(limit, remaining, now)
+
+
+_rate_limiters: dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    model_name: str,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+) -> RateLimiter:
+    """The rate limiter shared by all runners of `model_name` in this process."""
+    with _rate_limiters_lock:
+        if model_name not in _rate_limiters:
+            _rate_limiters[model_name] = RateLimiter(
+                requests_per_minute, tokens_per_minute
+            )
+        return _rate_limiters[model_name]
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the `attempt`-th retry (from 0)."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds the server asked us to wait before retrying, if it said so."""
+    if headers is None:
+        return None
+    retry_after_ms = _parse_number(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    return _parse_number(headers.get("retry-after"))
+
+
+def estimate_tokens(messages: list[dict[str, str]], max_tokens: int, n: int = 1):
+    """Rough token count of a chat request, as counted against the TPM budget."""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + max_tokens * n
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_number(value: Optional[str]) -> Optional[float]:
+    """Parses header values like "60", "1.5" or durations like "6m0s", "20ms"."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _UNIT_SECONDS[unit] for number, unit in parts)
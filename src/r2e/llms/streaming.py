@@ -0,0 +1,77 @@
+from typing import AsyncIterable, Iterable
+
+FENCE = "```"
+
+
+class CodeblockStop:
+    """
+    Accumulates the streamed text of one completion and tells when the first
+    fenced code block is closed, i.e. when a second line containing ``` has
+    begun. That is all `extract_codeblock` reads, so the rest of the
+    completion need not be generated.
+    """
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self.line = ""  ## the line being streamed
+        self.fences = 0  ## complete lines containing a fence
+        self.done = False
+
+    def feed(self, text: str) -> bool:
+        """Adds a streamed piece of text; returns whether the block is closed."""
+        if self.done or not text:
+            return self.done
+        self.parts.append(text)
+        *lines, self.line = (self.line + text).split("\n")
+        self.fences += sum(FENCE in line for line in lines)
+        fences = self.fences + (FENCE in self.line)
+        self.done = fences >= 2
+        return self.done
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _feed_chunk(chunk, completions: dict[int, CodeblockStop], n: int) -> bool:
+    for choice in chunk.choices:
+        completion = completions.setdefault(choice.index, CodeblockStop())
+        completion.feed(choice.delta.content or "")
+    done = [c for c in completions.values() if c.done]
+    return len(done) == n
+
+
+def _texts(completions: dict[int, CodeblockStop]) -> list[str]:
+    return [completions[index].text for index in sorted(completions)]
+
+
+def collect_until_codeblock(stream: Iterable, n: int = 1) -> list[str]:
+    """
+    Texts of the `n` completions streamed as chat completion chunks, stopping
+    once every completion has closed its first code block. Closing the stream
+    then drops the connection, which makes the server stop generating.
+    """
+    completions: dict[int, CodeblockStop] = {}
+    try:
+        for chunk in stream:
+            if _feed_chunk(chunk, completions, n):
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return _texts(completions)
+
+
+async def collect_until_codeblock_async(stream: AsyncIterable, n: int = 1) -> list[str]:
+    """Like `collect_until_codeblock`, for async streams."""
+    completions: dict[int, CodeblockStop] = {}
+    try:
+        async for chunk in stream:
+            if _feed_chunk(chunk, completions, n):
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+    return _texts(completions)
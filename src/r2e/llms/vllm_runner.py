@@ -3,6 +3,26 @@ from vllm import LLM, SamplingParams  # type: ignore
 from r2e.llms.llm_args import LLMArgs
 from r2e.llms.base_runner import BaseRunner
 from r2e.llms.language_model import LanguageModel
+from r2e.llms.vllm_utils import (
+    render_prompt,
+    prefix_sorted_order,
+    shared_prefix_fraction,
+)
+
+# the engine of the last runner and its arguments: loading the weights again
+# for every call (e.g. every genexec round) is slow, and vLLM does not reliably
+# free the GPU memory of a dropped engine
+_engine: tuple[dict, LLM] | None = None
+
+
+def get_engine(**engine_args) -> LLM:
+    """An LLM engine with the given arguments, reused across runners of this
+    process as long as the arguments stay the same."""
+    global _engine
+    if _engine is None or _engine[0] != engine_args:
+        _engine = None
+        _engine = (engine_args, LLM(**engine_args))
+    return _engine[1]
 
 
 class VLLMRunner(BaseRunner):
@@ -11,7 +31,7 @@ class VLLMRunner(BaseRunner):
         model_tokenizer_path = (
             model.model_name if args.local_model_path is None else args.local_model_path
         )
-        self.llm = LLM(
+        self.llm = get_engine(
             model=model_tokenizer_path,
             tokenizer=model_tokenizer_path,
             tensor_parallel_size=args.tensor_parallel_size,
@@ -21,9 +41,21 @@ class VLLMRunner(BaseRunner):
             enable_prefix_caching=args.enable_prefix_caching,
             disable_custom_all_reduce=False,
         )
+        self.tokenizer = self.llm.get_tokenizer()
 
-        self.sampling_params = SamplingParams(
-            n=self.args.n,
+    def config(self) -> dict:
+        return {
+            "model": self.args.model_name,
+            "n": self.args.n,
+            "max_tokens": self.args.max_tokens,
+            "temperature": self.args.temperature,
+            "top_p": self.args.top_p,
+            "stop": self.args.stop,
+        }
+
+    def sampling_params(self, n: int | None = None) -> SamplingParams:
+        return SamplingParams(
+            n=self.args.n if n is None else n,
             max_tokens=self.args.max_tokens,
             temperature=self.args.temperature,
             top_p=self.args.top_p,
@@ -32,32 +64,30 @@ class VLLMRunner(BaseRunner):
             stop=self.args.stop,
         )
 
-    def _run_single(self, payload):  # type: ignore
-        pass
-
-    def run_batch(self, payloads: list[str]) -> list[list[str]]:
-        outputs: list[list[str]] = [None for _ in payloads]  # type: ignore
-        remaining_payloads = []
-        remaining_indices = []
-        for payload_index, payload in enumerate(payloads):
-            if self.cache is not None:
-                cache_result = self.cache.get_from_cache(payload)
-                if cache_result is not None:
-                    outputs[payload_index] = cache_result
-                    continue
-            remaining_payloads.append(payload)
-            remaining_indices.append(payload_index)
-        if remaining_payloads:
-            vllm_outputs = self.llm.generate(remaining_payloads, self.sampling_params)
-            if self.cache is not None:
-                assert len(remaining_payloads) == len(vllm_outputs)
-                for index, remaining_payload, vllm_output in zip(
-                    remaining_indices, remaining_payloads, vllm_outputs
-                ):
-                    output_texts = [o.text for o in vllm_output.outputs]
-                    self.cache.add_to_cache(remaining_payload, output_texts)
-                    outputs[index] = output_texts
-            else:
-                for index, vllm_output in zip(remaining_indices, vllm_outputs):
-                    outputs[index] = [o.text for o in vllm_output.outputs]
+    def _run_single(self, payload, n: int | None = None) -> list[str]:
+        return self._run_uncached([payload], [n or self.args.n])[0]  # type: ignore
+
+    def run_main(self, payloads: list) -> list[list[str]]:
+        # one generate call lets vLLM batch (and share prefixes) across all payloads
+        return self.run_batch(payloads)
+
+    def _run_uncached(
+        self, payloads: list, counts: list[int]
+    ) -> list[list[str] | None]:
+        prompts = [render_prompt(payload, self.tokenizer) for payload in payloads]
+        order = prefix_sorted_order(prompts)
+        sorted_prompts = [prompts[i] for i in order]
+        if self.args.enable_prefix_caching:
+            shared = shared_prefix_fraction(sorted_prompts)
+            print(f"{shared:.0%} of the prompt text is a shared prefix")
+
+        params = {n: self.sampling_params(n) for n in set(counts)}
+        vllm_outputs = self.llm.generate(
+            sorted_prompts, [params[counts[i]] for i in order]
+        )
+        assert len(vllm_outputs) == len(prompts)
+
+        outputs: list[list[str] | None] = [None] * len(prompts)
+        for index, vllm_output in zip(order, vllm_outputs):
+            outputs[index] = [o.text for o in vllm_output.outputs]
         return outputs
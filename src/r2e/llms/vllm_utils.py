@@ -0,0 +1,48 @@
+"""Prompt preparation for the vLLM runner, kept free of vllm imports."""
+
+from typing import Any
+
+
+def render_prompt(payload: str | list[dict[str, str]], tokenizer: Any) -> str:
+    """The prompt text of a payload: chat message lists are rendered with the
+    model's chat template, plain strings are used as is."""
+    if isinstance(payload, str):
+        return payload
+    return tokenizer.apply_chat_template(
+        payload, tokenize=False, add_generation_prompt=True
+    )
+
+
+def prefix_sorted_order(prompts: list[str]) -> list[int]:
+    """
+    Indices of `prompts` in lexicographic order. Prompts sharing a prefix (the
+    system message, then the repo context) end up next to each other, so with
+    `enable_prefix_caching` vLLM computes the KV cache of each shared prefix
+    once while it is still cached, instead of evicting it between requests.
+    """
+    return sorted(range(len(prompts)), key=prompts.__getitem__)
+
+
+def shared_prefix_fraction(prompts: list[str]) -> float:
+    """Fraction of prompt characters shared with the previous prompt, i.e. an
+    upper bound on the prefix cache hit rate when run in this order."""
+    total = sum(len(prompt) for prompt in prompts)
+    if total == 0:
+        return 0.0
+    shared = sum(
+        _common_prefix_length(previous, prompt)
+        for previous, prompt in zip(prompts, prompts[1:])
+    )
+    return shared / total
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    # binary search over slice comparisons, which run in C
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
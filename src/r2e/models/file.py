@@ -4,6 +4,7 @@ from typing import Optional
 from r2e.models.module import Module
 from r2e.models.repo import Repo
 from r2e.paths import REPOS_DIR
+from r2e.utils.snapshot import read_source
 
 
 class File(BaseModel):
@@ -37,8 +38,7 @@ class File(BaseModel):
     @property
     def file_content(self) -> str:
         if self._file_content is None:
-            with open(self.file_path, "r") as file:
-                self._file_content = file.read()
+            self._file_content = read_source(self.file_path)
         return self._file_content
 
     def __hash__(self) -> int:
@@ -59,6 +59,14 @@ class Repo(BaseModel):
                 all_files.append(os.path.join(root, file))
         return all_files
 
+    def source_size(self) -> int:
+        """Total size in bytes of the python files in the repo."""
+        return sum(
+            os.path.getsize(file_path)
+            for file_path in self.list_repo_files()
+            if file_path.endswith(".py") and os.path.isfile(file_path)
+        )
+
     @property
     def execution_repo_data(self) -> dict[str, str]:
         return {
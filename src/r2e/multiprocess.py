@@ -1,14 +1,32 @@
-""" Utilities for running functions in parallel processes. """
+""" Utilities for running functions in parallel processes, threads or coroutines. """
 
 import sys
+import time
 import queue
+import signal
 import resource
+import asyncio
+import inspect
+import pickle
+import importlib
+import threading
 import traceback
+import warnings
+from pathlib import Path
 from typing import Any, Optional
 from enum import Enum
+from contextlib import AbstractContextManager, ExitStack, contextmanager
 import multiprocessing as mp
-from concurrent.futures import TimeoutError
-from typing import Callable, Any, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Future,
+    InvalidStateError,
+    ThreadPoolExecutor,
+    TimeoutError,
+    wait,
+)
+from typing import BinaryIO, Callable, Any, Iterable, Iterator, Sequence, Sized
 
 import attrs
 import tqdm
@@ -32,6 +50,8 @@ def generate_queue() -> queue.Queue[Any]:
 
 QueueEmptyException = queue.Empty
 
+_NO_TASK = object()
+
 
 def run_func_in_process(
     func: Callable,
@@ -70,6 +90,8 @@ class TaskRunStatus(Enum):
     EXCEPTION = 1
     TIMEOUT = 2
     PROCESS_EXPIRED = 3
+    MEMORY_LIMIT = 4
+    CANCELLED = 5
 
 
 @attrs.define(eq=False, repr=False)
@@ -79,6 +101,11 @@ class TaskResult:
     result: None | Any = None
     exception_tb: None | str = None
 
+    # resource usage of the task as measured inside the worker
+    wall_time: None | float = None  # seconds
+    cpu_time: None | float = None  # seconds
+    peak_rss: None | int = None  # bytes
+
     def is_success(self) -> bool:
         return self.status == TaskRunStatus.SUCCESS
 
@@ -91,6 +118,50 @@ class TaskResult:
     def is_process_expired(self) -> bool:
         return self.status == TaskRunStatus.PROCESS_EXPIRED
 
+    def is_memory_limit(self) -> bool:
+        return self.status == TaskRunStatus.MEMORY_LIMIT
+
+    def is_cancelled(self) -> bool:
+        return self.status == TaskRunStatus.CANCELLED
+
+
+class CancelHandle:
+    """
+    Lets the caller of a parallel run cancel its tasks while it is running,
+    e.g. from the loop consuming the results or from another thread. Tasks
+    that have not started are never run; running process tasks are killed.
+    Running thread tasks cannot be interrupted and finish in the background.
+    Cancelled tasks are reported with status CANCELLED.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indices: set[int] = set()
+        self._all = False
+        self._wakeup: Future = Future()
+
+    def cancel(self, index: None | int = None) -> None:
+        """Cancels the task at position `index` of the tasks, or all of them."""
+        with self._lock:
+            if index is None:
+                self._all = True
+            else:
+                self._indices.add(index)
+            wakeup, self._wakeup = self._wakeup, Future()
+        wakeup.set_result(None)
+
+    def is_cancelled(self, index: int) -> bool:
+        return self._all or index in self._indices
+
+    @property
+    def all_cancelled(self) -> bool:
+        return self._all
+
+    def _waiter(self) -> Future:
+        """A future that resolves at the next call to `cancel`."""
+        with self._lock:
+            return self._wakeup
+
 
 def initializer(limit: int) -> None:
     """Set maximum amount of memory each worker process can allocate."""
@@ -98,21 +169,674 @@ def initializer(limit: int) -> None:
     resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
 
 
+def _init_worker(preload_modules: tuple[str, ...], max_mem: None | int) -> None:
+    """Worker initializer: caps memory and imports modules the tasks will need.
+
+    RLIMIT_AS is not enforced on macOS, so no limit is installed there.
+    """
+    if max_mem is not None and platform.system() != "Darwin":
+        initializer(max_mem)
+
+    for module in preload_modules:
+        importlib.import_module(module)
+
+
+def _noop() -> None:
+    pass
+
+
+class WorkerPool:
+    """
+    A long-lived pool of worker processes that can be shared by several
+    pipeline stages, so that the spawn and import cost is paid once per run.
+
+    Workers import `preload_modules` when they start. While a pool is
+    activated (see `activate`), the parallel runners in this module schedule
+    their tasks on it instead of creating a pool of their own; the pool's
+    num_workers, max_tasks_per_worker, use_spawn and max_mem then apply.
+
+    Usage:
+        with WorkerPool(num_workers=8, preload_modules=["r2e.models"]) as pool:
+            with pool.activate():
+                stage_one()
+                stage_two()
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 2,
+        max_tasks_per_worker: None | int = None,
+        use_spawn: bool = True,
+        max_mem: None | int = None,
+        preload_modules: Iterable[str] = (),
+    ):
+        mode = "spawn" if use_spawn else "fork"
+        self.num_workers = num_workers
+        self.max_mem = max_mem
+        self._pool = ProcessPool(
+            max_workers=num_workers,
+            max_tasks=0 if max_tasks_per_worker is None else max_tasks_per_worker,
+            initializer=_init_worker,
+            initargs=(tuple(preload_modules), max_mem),
+            context=mp.get_context(mode),
+        )
+
+    def schedule(
+        self, func: Callable, args: Iterable[Any] = (), timeout: None | float = None
+    ) -> Future:
+        return self._pool.schedule(func, args=args, timeout=timeout)
+
+    def submit_task(self, func: Callable, task: Any, timeout: None | float) -> Future:
+        """Schedules func(task); the future resolves to a `_TaskOutcome`."""
+        return self.schedule(_run_measured, args=(func, task), timeout=timeout)
+
+    def warmup(self) -> None:
+        """Starts all workers and waits until they have preloaded their modules."""
+        futures = [self.schedule(_noop) for _ in range(self.num_workers)]
+        wait(futures)
+
+    def close(self) -> None:
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def activate(self) -> AbstractContextManager["WorkerPool"]:
+        """Makes this pool the one used by the parallel runners in this block."""
+        return activate_pool(self)
+
+
+# a WorkerPool, or any pool with the same submit_task (e.g. a distributed
+# Coordinator), that the process-backend runners schedule their tasks on
+_active_pool: None | Any = None
+
+
+@contextmanager
+def activate_pool(pool: Any) -> Iterator[Any]:
+    global _active_pool
+    previous, _active_pool = _active_pool, pool
+    try:
+        yield pool
+    finally:
+        _active_pool = previous
+
+
+def get_active_pool() -> None | Any:
+    """Returns the shared pool activated by the caller, if any."""
+    return _active_pool
+
+
+def _reset_peak_rss() -> None:
+    """Reset the kernel's RSS high-water mark of this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss() -> int:
+    """Peak resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is the lifetime peak, in bytes on macOS and KiB elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if platform.system() == "Darwin" else maxrss * 1024
+
+
+@attrs.define(eq=False)
+class _TaskOutcome:
+    """What a worker sends back for a task: the result or the failure, plus usage."""
+
+    result: None | Any = None
+    exception_tb: None | str = None
+    out_of_memory: bool = False
+    wall_time: None | float = None
+    cpu_time: None | float = None
+    peak_rss: None | int = None
+
+
+def _run_measured(func: Callable, task: Any, own_process: bool = True) -> _TaskOutcome:
+    """
+    Runs func(task) and records its time and memory usage. Tasks that share
+    their process with others (threads) get per-thread CPU time and no RSS.
+    """
+    if own_process:
+        _reset_peak_rss()
+    clock = time.process_time if own_process else time.thread_time
+    wall_start, cpu_start = time.perf_counter(), clock()
+    outcome = _TaskOutcome()
+
+    try:
+        outcome.result = func(task)
+    except MemoryError:
+        outcome.out_of_memory = True
+        outcome.exception_tb = traceback.format_exc()
+    except Exception:
+        outcome.exception_tb = traceback.format_exc()
+
+    outcome.wall_time = time.perf_counter() - wall_start
+    outcome.cpu_time = clock() - cpu_start
+    outcome.peak_rss = _peak_rss() if own_process else None
+    return outcome
+
+
+def _settle(future: Future, result: Any = None, error: None | Exception = None):
+    """Resolves a future unless it was already resolved, e.g. by a timeout."""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class ThreadWorkerPool:
+    """
+    Runs tasks on threads of the current process, for I/O-bound work where
+    spawning and pickling would dominate. A task that exceeds its timeout is
+    reported as timed out, but its thread cannot be killed and keeps its
+    worker busy until the call returns.
+    """
+
+    def __init__(self, num_workers: int = 2):
+        self.num_workers = num_workers
+        self._executor = ThreadPoolExecutor(max_workers=num_workers)
+
+    def submit_task(self, func: Callable, task: Any, timeout: None | float) -> Future:
+        future: Future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(
+                    timeout, _settle, (future, None, TimeoutError())
+                )
+                timer.daemon = True
+                timer.start()
+            try:
+                outcome = _run_measured(func, task, own_process=False)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+            _settle(future, outcome)
+
+        self._executor.submit(run)
+        return future
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "ThreadWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AsyncioWorkerPool:
+    """
+    Runs tasks on an event loop in a background thread, with at most
+    num_workers of them in progress at once. Coroutine functions are awaited
+    on the loop; plain functions are run in the loop's default thread pool.
+    Timed-out coroutines are cancelled.
+    """
+
+    def __init__(self, num_workers: int = 2):
+        self.num_workers = num_workers
+        self._semaphore = asyncio.Semaphore(num_workers)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    async def _run(self, func: Callable, task: Any, timeout: None | float):
+        async with self._semaphore:
+            wall_start = time.perf_counter()
+            outcome = _TaskOutcome()
+            if inspect.iscoroutinefunction(func):
+                call = func(task)
+            else:
+                call = asyncio.to_thread(func, task)
+
+            time_limit = asyncio.timeout(timeout)
+            try:
+                async with time_limit:
+                    outcome.result = await call
+            except TimeoutError:
+                if time_limit.expired():
+                    raise
+                # raised by the task itself, e.g. a socket timeout
+                outcome.exception_tb = traceback.format_exc()
+            except MemoryError:
+                outcome.out_of_memory = True
+                outcome.exception_tb = traceback.format_exc()
+            except Exception:
+                outcome.exception_tb = traceback.format_exc()
+
+            outcome.wall_time = time.perf_counter() - wall_start
+            return outcome
+
+    def submit_task(self, func: Callable, task: Any, timeout: None | float) -> Future:
+        return asyncio.run_coroutine_threadsafe(
+            self._run(func, task, timeout), self._loop
+        )
+
+    async def _cancel_all(self) -> None:
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "AsyncioWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+BACKENDS = ("process", "thread", "asyncio")
+
+
+def _make_worker_pool(
+    backend: str,
+    num_workers: int,
+    max_tasks_per_worker: None | int,
+    use_spawn: bool,
+    max_mem: None | int,
+) -> WorkerPool | ThreadWorkerPool | AsyncioWorkerPool:
+    if backend == "process":
+        return WorkerPool(
+            num_workers=num_workers,
+            max_tasks_per_worker=max_tasks_per_worker,
+            use_spawn=use_spawn,
+            max_mem=max_mem,
+        )
+    if backend == "thread":
+        return ThreadWorkerPool(num_workers)
+    if backend == "asyncio":
+        return AsyncioWorkerPool(num_workers)
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+
+class _ProgressTracker:
+    """Counts task outcomes and mirrors them on an optional progress bar."""
+
+    def __init__(self, use_progress_bar: bool, desc: None | str, total: None | int):
+        self.pbar = (
+            tqdm.tqdm(desc=desc, total=total, dynamic_ncols=True)
+            if use_progress_bar
+            else None
+        )
+        self.succ = self.timeouts = self.exceptions = self.expirations = 0
+        self.mem_limits = self.cancelled = 0
+
+    def update(self, task_result: TaskResult) -> None:
+        if task_result.is_success():
+            self.succ += 1
+        elif task_result.is_timeout():
+            self.timeouts += 1
+        elif task_result.is_process_expired():
+            self.expirations += 1
+        elif task_result.is_memory_limit():
+            self.mem_limits += 1
+        elif task_result.is_cancelled():
+            self.cancelled += 1
+        else:
+            self.exceptions += 1
+
+        if self.pbar is not None:
+            self.pbar.update(1)
+            self.pbar.set_postfix(
+                succ=self.succ,
+                timeouts=self.timeouts,
+                exc=self.exceptions,
+                p_exp=self.expirations,
+                mem=self.mem_limits,
+                cancel=self.cancelled,
+            )
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+    def close(self) -> None:
+        if self.pbar is not None:
+            self.pbar.close()
+
+
+def _collect_task_result(future: Future) -> TaskResult:
+    """Waits for a scheduled `_run_measured` task and wraps it in a TaskResult.
+    Remote pools resolve their futures to a finished TaskResult directly."""
+    try:
+        outcome: _TaskOutcome | TaskResult = future.result()
+
+    except TimeoutError:
+        return TaskResult(status=TaskRunStatus.TIMEOUT)
+
+    except CancelledError:
+        return TaskResult(status=TaskRunStatus.CANCELLED)
+
+    except ProcessExpired as error:
+        # the kernel OOM killer terminates the worker with SIGKILL
+        if error.exitcode == -signal.SIGKILL:
+            return TaskResult(status=TaskRunStatus.MEMORY_LIMIT)
+        return TaskResult(status=TaskRunStatus.PROCESS_EXPIRED)
+
+    except Exception:
+        return TaskResult(
+            status=TaskRunStatus.EXCEPTION,
+            exception_tb=traceback.format_exc(),
+        )
+
+    if isinstance(outcome, TaskResult):
+        return outcome
+
+    if outcome.out_of_memory:
+        status = TaskRunStatus.MEMORY_LIMIT
+    elif outcome.exception_tb is not None:
+        status = TaskRunStatus.EXCEPTION
+    else:
+        status = TaskRunStatus.SUCCESS
+
+    return TaskResult(
+        status=status,
+        result=outcome.result,
+        exception_tb=outcome.exception_tb,
+        wall_time=outcome.wall_time,
+        cpu_time=outcome.cpu_time,
+        peak_rss=outcome.peak_rss,
+    )
+
+
+class TaskJournal:
+    """
+    Append-only on-disk log of successful tasks, keyed by a stable task key.
+    Lets an interrupted run skip the tasks it already finished; failed ones
+    (timeouts, exceptions, memory limits) may be transient and are run again.
+    Results are pickled, so they must be pickle-able (they already are for
+    processes).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.entries: dict[str, TaskResult] = {}
+        self._file: None | BinaryIO = None
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+
+        with open(self.path, "rb") as f:
+            valid_end = 0
+            while True:
+                try:
+                    key, task_result = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:
+                    # a record cut short by a crash; drop it and everything after
+                    break
+                self.entries[key] = task_result
+                valid_end = f.tell()
+
+        with open(self.path, "r+b") as f:
+            f.truncate(valid_end)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> None | TaskResult:
+        return self.entries.get(key)
+
+    def append(self, key: str, task_result: TaskResult) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+        pickle.dump((key, task_result), self._file)
+        self._file.flush()
+        self.entries[key] = task_result
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "TaskJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _per_task(
+    values: Sequence[float] | Callable[[Any], float], tasks: list[Any], name: str
+) -> Sequence[float]:
+    if callable(values):
+        values = [values(task) for task in tasks]
+    if len(values) != len(tasks):
+        raise ValueError(f"Got {len(values)} {name} for {len(tasks)} tasks")
+    return values
+
+
+def _schedule_order(
+    tasks: Iterable[Any],
+    costs: None | Sequence[float] | Callable[[Any], float],
+    priorities: None | Sequence[float] | Callable[[Any], float] = None,
+) -> Iterator[tuple[int, Any]]:
+    """(task_index, task) pairs in submission order: highest priority first,
+    then largest cost first, if given."""
+    if costs is None and priorities is None:
+        return enumerate(tasks)
+
+    tasks = list(tasks)
+    no_values = [0.0] * len(tasks)
+    costs = no_values if costs is None else _per_task(costs, tasks, "costs")
+    if priorities is None:
+        priorities = no_values
+    else:
+        priorities = _per_task(priorities, tasks, "priorities")
+
+    # longest-processing-time-first: the pool hands each next task to
+    # whichever worker frees up, so big tasks start early and small ones fill in
+    order = sorted(
+        range(len(tasks)), key=lambda index: (-priorities[index], -costs[index])
+    )
+    return ((index, tasks[index]) for index in order)
+
+
+def _run_tasks(
+    func: Callable,
+    tasks: Iterable[Any],
+    num_workers: int,
+    timeout_per_task: None | float,
+    use_progress_bar: bool,
+    progress_bar_desc: None | str,
+    max_tasks_per_worker: None | int,
+    use_spawn: bool,
+    max_mem: None | int,
+    max_in_flight: None | int,
+    costs: None | Sequence[float] | Callable[[Any], float],
+    backend: str,
+    journal: None | str | Path,
+    task_key: None | Callable[[Any], str],
+    priorities: None | Sequence[float] | Callable[[Any], float],
+    cancel: None | CancelHandle,
+    deadline: None | float,
+    ordered: bool,
+) -> Iterator[tuple[int, TaskResult]]:
+    """
+    Shared driver for the public runners. Yields (task_index, TaskResult)
+    pairs, in task order if `ordered` else as soon as each task finishes.
+    Process tasks run on the active pool if there is one, else on a
+    fresh pool of the requested backend.
+    """
+
+    if max_in_flight is not None and max_in_flight < 1:
+        raise ValueError(f"max_in_flight must be positive, got {max_in_flight}")
+
+    total = len(tasks) if isinstance(tasks, Sized) else None
+    task_iter = _schedule_order(tasks, costs, priorities)
+    # when submitting in task order, results waiting for their turn in ordered
+    # mode count against the window; when reordered they cannot, else the
+    # next task to yield might never get submitted
+    count_pending = costs is None and priorities is None
+
+    pool = get_active_pool() if backend == "process" else None
+    # the workers of a distributed Coordinator set their own max_mem
+    if isinstance(pool, WorkerPool) and max_mem is not None:
+        pool_mem = pool.max_mem
+        if pool_mem is None or pool_mem > max_mem:
+            warnings.warn(
+                f"max_mem={max_mem} is ignored while a shared pool is active; "
+                f"its workers are capped at max_mem={pool_mem}",
+                RuntimeWarning,
+                stacklevel=3,
+            )
+    with ExitStack() as stack:
+        if pool is None:
+            pool = stack.enter_context(
+                _make_worker_pool(
+                    backend, num_workers, max_tasks_per_worker, use_spawn, max_mem
+                )
+            )
+
+        task_journal = None
+        if journal is not None:
+            task_journal = stack.enter_context(TaskJournal(journal))
+        keys: dict[int, str] = {}
+
+        progress = _ProgressTracker(use_progress_bar, progress_bar_desc, total)
+        in_flight: dict[Future, int] = {}
+        # finished results held back until all earlier tasks finished (ordered)
+        pending: dict[int, TaskResult] = {}
+        # finished results to yield next (unordered)
+        ready: list[tuple[int, TaskResult]] = []
+        next_index = 0
+        exhausted = False
+
+        def finish(index: int, task_result: TaskResult) -> None:
+            progress.update(task_result)
+            if ordered:
+                pending[index] = task_result
+            else:
+                ready.append((index, task_result))
+
+        def is_cancelled(index: int) -> bool:
+            if deadline is not None and time.time() >= deadline:
+                return True
+            return cancel is not None and cancel.is_cancelled(index)
+
+        try:
+            while True:
+                waiter = cancel._waiter() if cancel is not None else None
+
+                # stop tasks the caller gave up on or that ran past the deadline
+                for future, index in list(in_flight.items()):
+                    if is_cancelled(index):
+                        future.cancel()
+                        del in_flight[future]
+                        keys.pop(index, None)
+                        finish(index, TaskResult(status=TaskRunStatus.CANCELLED))
+
+                while not exhausted and (
+                    max_in_flight is None
+                    or len(in_flight) + (len(pending) if count_pending else 0)
+                    < max_in_flight
+                ):
+                    index, task = next(task_iter, (None, _NO_TASK))
+                    if task is _NO_TASK:
+                        exhausted = True
+                        break
+
+                    if is_cancelled(index):  # type: ignore
+                        finish(index, TaskResult(status=TaskRunStatus.CANCELLED))  # type: ignore
+                        continue
+
+                    if task_journal is not None:
+                        key = task_key(task) if task_key else str(index)
+                        replayed = task_journal.get(key)
+                        if replayed is not None:
+                            finish(index, replayed)  # type: ignore
+                            continue
+                        keys[index] = key  # type: ignore
+
+                    future = pool.submit_task(func, task, timeout_per_task)
+                    in_flight[future] = index  # type: ignore
+
+                yield from ready
+                ready.clear()
+                while next_index in pending:
+                    yield next_index, pending.pop(next_index)
+                    next_index += 1
+
+                if not in_flight:
+                    if exhausted:
+                        break
+                    continue
+
+                waitables = list(in_flight) if waiter is None else [*in_flight, waiter]
+                timeout = None if deadline is None else max(0, deadline - time.time())
+                done, _ = wait(waitables, timeout=timeout, return_when=FIRST_COMPLETED)
+                done = [future for future in done if future in in_flight]
+                for future in sorted(done, key=in_flight.__getitem__):
+                    index = in_flight.pop(future)
+                    task_result = _collect_task_result(future)
+                    key = keys.pop(index, None)
+                    if task_journal is not None and task_result.is_success():
+                        task_journal.append(key, task_result)  # type: ignore
+                    finish(index, task_result)
+
+        finally:
+            # the consumer may stop early; do not wait on work nobody will read
+            for future in in_flight:
+                future.cancel()
+            progress.close()
+
+
 def run_tasks_in_parallel_iter(
     func: Callable,
-    tasks: list[Any],
+    tasks: Iterable[Any],
     num_workers: int = 2,
-    timeout_per_task: None | int = None,
+    timeout_per_task: None | float = None,
     use_progress_bar: bool = False,
     progress_bar_desc: None | str = None,
     max_tasks_per_worker: None | int = None,
     use_spawn: bool = True,
-    max_mem: int = 1024 * 1024 * 1024 * 4,
+    max_mem: None | int = None,
+    max_in_flight: None | int = None,
+    costs: None | Sequence[float] | Callable[[Any], float] = None,
+    backend: str = "process",
+    journal: None | str | Path = None,
+    task_key: None | Callable[[Any], str] = None,
+    priorities: None | Sequence[float] | Callable[[Any], float] = None,
+    cancel: None | CancelHandle = None,
+    deadline: None | float = None,
 ) -> Iterator[TaskResult]:
     """
     Args:
         func: The function to run. The function must accept a single argument.
-        tasks: A list of tasks i.e. arguments to func.
+        tasks: An iterable of tasks i.e. arguments to func. Generators are
+            consumed lazily, only as fast as results are yielded.
         num_workers: Maximum number of parallel workers.
         timeout_per_task: The timeout, in seconds, to use per task.
         use_progress_bar: Whether to use a progress bar. Default False.
@@ -121,93 +845,140 @@ def run_tasks_in_parallel_iter(
         to a single process / worker. None means infinite.
             Use 1 to force a restart.
         use_spawn: The 'spawn' multiprocess context is used. 'fork' otherwise.
+        max_mem: Maximum address space, in bytes, of each worker process.
+            Tasks exceeding it are reported as MEMORY_LIMIT. None means no cap.
+            The four pool settings above are ignored while a shared
+            WorkerPool is activated; the tasks then run on that pool. A
+            RuntimeWarning is issued if its workers are not capped at
+            max_mem.
+        max_in_flight: Maximum number of tasks submitted to the pool whose
+            results have not been yielded yet. None submits all tasks upfront.
+            Use a small multiple of num_workers to keep memory flat.
+        costs: Optional estimate of each task's cost (e.g. bytes of source),
+            either one number per task or a function of the task. Tasks are
+            then submitted largest first, which shortens the total runtime
+            when task sizes vary a lot. The tasks are materialized.
+        backend: "process" (default) runs tasks in worker processes. "thread"
+            runs them on threads and "asyncio" on an event loop, for I/O-bound
+            work; coroutine functions are awaited on the asyncio backend.
+            Results, statuses and timeouts are reported the same way.
+        journal: Optional path of a TaskJournal. Every successful task is
+            appended to it; tasks already in it are not run again and their
+            recorded result is yielded instead. Failed tasks are run again.
+            Delete it once the output of the run is safely written.
+        task_key: Function giving the stable journal key of a task. Defaults
+            to the task's position in `tasks`.
+        priorities: Optional priority of each task, either one number per
+            task or a function of the task. Higher priority tasks are
+            submitted first; ties are broken by `costs`. The tasks are
+            materialized.
+        cancel: Optional CancelHandle to cancel single tasks, or all
+            remaining ones, while the run is in progress.
+        deadline: Optional time (as returned by time.time()) after which no
+            task is started and running ones are killed. Tasks that did not
+            finish in time are reported as CANCELLED.
     Returns:
-        A list of TaskResult objects, one per task.
+        An iterator of TaskResult objects, one per task, in task order.
     """
 
-    mode = "spawn" if use_spawn else "fork"
-
-    with ProcessPool(
-        # initializer=initializer if platform.system() != "Darwin" else None,  # type: ignore
-        max_workers=num_workers,
-        max_tasks=0 if max_tasks_per_worker is None else max_tasks_per_worker,
-        context=mp.get_context(mode),
-        # initargs=None,#(max_mem,) if platform.system() != "Darwin" else None,  # type: ignore
-    ) as pool:
-        future = pool.map(func, tasks, timeout=timeout_per_task)
-
-        iterator = future.result()
-        if use_progress_bar:
-            pbar = tqdm.tqdm(
-                desc=progress_bar_desc,
-                total=len(tasks),
-                dynamic_ncols=True,
-            )
-        else:
-            pbar = None
-
-        succ = timeouts = exceptions = expirations = 0
-
-        while True:
-            try:
-                result = next(iterator)
+    for _, task_result in _run_tasks(
+        func,
+        tasks,
+        num_workers=num_workers,
+        timeout_per_task=timeout_per_task,
+        use_progress_bar=use_progress_bar,
+        progress_bar_desc=progress_bar_desc,
+        max_tasks_per_worker=max_tasks_per_worker,
+        use_spawn=use_spawn,
+        max_mem=max_mem,
+        max_in_flight=max_in_flight,
+        costs=costs,
+        backend=backend,
+        journal=journal,
+        task_key=task_key,
+        priorities=priorities,
+        cancel=cancel,
+        deadline=deadline,
+        ordered=True,
+    ):
+        yield task_result
 
-            except StopIteration:
-                break
 
-            except TimeoutError as error:
-                yield TaskResult(
-                    status=TaskRunStatus.TIMEOUT,
-                )
-
-                timeouts += 1
-
-            except ProcessExpired as error:
-                yield TaskResult(
-                    status=TaskRunStatus.PROCESS_EXPIRED,
-                )
-                expirations += 1
-
-            except Exception as error:
-                exception_tb = traceback.format_exc()
-
-                yield TaskResult(
-                    status=TaskRunStatus.EXCEPTION,
-                    exception_tb=exception_tb,
-                )
-                exceptions += 1
-
-            else:
-                yield TaskResult(
-                    status=TaskRunStatus.SUCCESS,
-                    result=result,
-                )
+def run_tasks_as_completed_iter(
+    func: Callable,
+    tasks: Iterable[Any],
+    num_workers: int = 2,
+    timeout_per_task: None | float = None,
+    use_progress_bar: bool = False,
+    progress_bar_desc: None | str = None,
+    max_tasks_per_worker: None | int = None,
+    use_spawn: bool = True,
+    max_mem: None | int = None,
+    max_in_flight: None | int = None,
+    costs: None | Sequence[float] | Callable[[Any], float] = None,
+    backend: str = "process",
+    journal: None | str | Path = None,
+    task_key: None | Callable[[Any], str] = None,
+    priorities: None | Sequence[float] | Callable[[Any], float] = None,
+    cancel: None | CancelHandle = None,
+    deadline: None | float = None,
+) -> Iterator[tuple[int, TaskResult]]:
+    """
+    Same as `run_tasks_in_parallel_iter` but results are yielded as soon as
+    each task finishes, so a slow task never holds back finished ones.
 
-                succ += 1
+    Args:
+        See `run_tasks_in_parallel_iter`.
+    Returns:
+        An iterator of (task_index, TaskResult) pairs in completion order,
+        where task_index is the position of the task in `tasks`.
+    """
 
-            if pbar is not None:
-                pbar.update(1)
-                pbar.set_postfix(
-                    succ=succ, timeouts=timeouts, exc=exceptions, p_exp=expirations
-                )
-                sys.stdout.flush()
-                sys.stderr.flush()
+    yield from _run_tasks(
+        func,
+        tasks,
+        num_workers=num_workers,
+        timeout_per_task=timeout_per_task,
+        use_progress_bar=use_progress_bar,
+        progress_bar_desc=progress_bar_desc,
+        max_tasks_per_worker=max_tasks_per_worker,
+        use_spawn=use_spawn,
+        max_mem=max_mem,
+        max_in_flight=max_in_flight,
+        costs=costs,
+        backend=backend,
+        journal=journal,
+        task_key=task_key,
+        priorities=priorities,
+        cancel=cancel,
+        deadline=deadline,
+        ordered=False,
+    )
 
 
 def run_tasks_in_parallel(
     func: Callable,
-    tasks: list[Any],
+    tasks: Iterable[Any],
     num_workers: int = 2,
-    timeout_per_task: None | int = None,
+    timeout_per_task: None | float = None,
     use_progress_bar: bool = False,
     progress_bar_desc: None | str = None,
     max_tasks_per_worker: None | int = None,
     use_spawn: bool = True,
+    max_mem: None | int = None,
+    max_in_flight: None | int = None,
+    costs: None | Sequence[float] | Callable[[Any], float] = None,
+    backend: str = "process",
+    journal: None | str | Path = None,
+    task_key: None | Callable[[Any], str] = None,
+    priorities: None | Sequence[float] | Callable[[Any], float] = None,
+    cancel: None | CancelHandle = None,
+    deadline: None | float = None,
 ) -> list[TaskResult]:
     """
     Args:
         func: The function to run. The function must accept a single argument.
-        tasks: A list of tasks i.e. arguments to func.
+        tasks: An iterable of tasks i.e. arguments to func.
         num_workers: Maximum number of parallel workers.
         timeout_per_task: The timeout, in seconds, to use per task.
         use_progress_bar: Whether to use a progress bar. Defaults False.
@@ -216,6 +987,17 @@ def run_tasks_in_parallel(
         process / worker. None means infinite.
             Use 1 to force a restart.
         use_spawn: The 'spawn' multiprocess context is used. 'fork' otherwise.
+        max_mem: Maximum address space, in bytes, of each worker process.
+        max_in_flight: Maximum number of tasks submitted but not yet collected.
+            None submits all tasks upfront.
+        costs: Optional per-task cost estimates; larger tasks are run first.
+        backend: One of "process", "thread" or "asyncio".
+        journal: Optional path of a TaskJournal used to resume interrupted runs.
+        task_key: Function giving the stable journal key of a task.
+        priorities: Optional per-task priorities; higher ones are run first.
+        cancel: Optional CancelHandle to cancel tasks while they run.
+        deadline: Optional time.time() after which unfinished tasks are
+            cancelled.
     Returns:
         A list of TaskResult objects, one per task.
     """
@@ -230,6 +1012,15 @@ def run_tasks_in_parallel(
             progress_bar_desc=progress_bar_desc,
             max_tasks_per_worker=max_tasks_per_worker,
             use_spawn=use_spawn,
+            max_mem=max_mem,
+            max_in_flight=max_in_flight,
+            costs=costs,
+            backend=backend,
+            journal=journal,
+            task_key=task_key,
+            priorities=priorities,
+            cancel=cancel,
+            deadline=deadline,
         )
     )
 
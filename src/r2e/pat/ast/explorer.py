@@ -4,6 +4,7 @@ import ast
 from typing import Optional
 
 from r2e.pat.ast.augmenter import add_parent_info
+from r2e.utils.snapshot import read_source
 
 
 def build_ast(code: str, add_parents: bool = True) -> ast.Module:
@@ -30,8 +31,7 @@ def build_ast_file(file_path: str, add_parents: bool = True) -> ast.Module:
     Returns:
         ast.AST: the AST
     """
-    with open(file_path, "r") as f:
-        code = f.read()
+    code = read_source(file_path)
     return build_ast(code, add_parents=add_parents)
 
 
@@ -4,7 +4,7 @@ from r2e.models import Repo
 from r2e.utils.data import write_functions
 from r2e.repo_builder.repo_args import RepoArgs
 from r2e.paths import REPOS_DIR, EXTRACTION_DIR
-from r2e.multiprocess import run_tasks_in_parallel_iter
+from r2e.multiprocess import run_tasks_as_completed_iter
 from r2e.repo_builder.fut_extractor.extract_repo_data import extract_repo_data
 
 
@@ -20,31 +20,46 @@ def build_functions_and_methods(repo_args: RepoArgs):
             )
             return
 
+    journal_path = EXTRACTION_DIR / f"{repo_args.exp_id}_extracted.journal"
+    if journal_path.exists():
+        print(f"Resuming extraction from {journal_path}")
+
     repo_dirs = list(REPOS_DIR.glob("*"))
     repos = [(Repo.from_file_path(str(repo_dir)), repo_args) for repo_dir in repo_dirs]
 
     functions = []
     methods = []
 
-    outputs = run_tasks_in_parallel_iter(
+    # each repo is read by a single task, so sources are read from disk
+    outputs = run_tasks_as_completed_iter(
         extract_repo_data,
         repos,
         num_workers=repo_args.extraction_multiprocess,
         use_progress_bar=True,
         progress_bar_desc="Extracting..",
+        max_in_flight=2 * repo_args.extraction_multiprocess,
+        costs=[repo.source_size() for repo, _ in repos],
+        journal=journal_path,
+        task_key=lambda task: task[0].repo_id,
     )
 
-    for output in outputs:
+    # collect per repo as they finish, then flatten in repo order
+    repo_outputs = {}
+    for index, output in outputs:
         if output.is_success():
-            new_functions, new_methods = output.result  # type: ignore
-            functions.extend(new_functions)
-            methods.extend(new_methods)
+            repo_outputs[index] = output.result
         else:
-            print(f"Error extracting repo data: {output.exception_tb}")
+            print(f"Error extracting {repo_dirs[index]}: {output.exception_tb}")
+
+    for index in sorted(repo_outputs):
+        new_functions, new_methods = repo_outputs[index]  # type: ignore
+        functions.extend(new_functions)
+        methods.extend(new_methods)
 
     print(f"Extracted {len(functions)} functions and {len(methods)} methods")
 
     write_functions(functions + methods, extraction_path)
+    journal_path.unlink(missing_ok=True)
 
 
 if __name__ == "__main__":
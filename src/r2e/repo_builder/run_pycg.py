@@ -5,7 +5,7 @@ from pathlib import Path
 from r2e.models import Repo
 from r2e.paths import REPOS_DIR, GRAPHS_DIR
 from r2e.repo_builder.repo_args import RepoArgs
-from r2e.multiprocess import run_tasks_in_parallel_iter
+from r2e.multiprocess import run_tasks_as_completed_iter
 from r2e.pat.callgraph import CallGraphGenerator, CallGraphProcessor
 
 
@@ -30,6 +30,11 @@ def construct_pycg(repo: Repo):
     return new_cgraph
 
 
+def construct_pycg_task(repo: Repo) -> None:
+    # the call graph is on disk already; only its completion is journaled
+    construct_pycg(repo)
+
+
 def run_pycg(repo_args: RepoArgs):
     """
     Runs pycg on all repos in repos_dir except where pycg has already been run
@@ -46,18 +51,28 @@ def run_pycg(repo_args: RepoArgs):
             if not Path(repo.callgraph_path).exists():
                 construct_pycg(repo)
     else:
-        outputs = run_tasks_in_parallel_iter(
-            construct_pycg,
+        journal_path = Path(GRAPHS_DIR) / f"{repo_args.exp_id}_pycg.journal"
+        outputs = run_tasks_as_completed_iter(
+            construct_pycg_task,
             all_repos,
             num_workers=repo_args.pycg_multiprocess,
             timeout_per_task=repo_args.pycg_timeout * 60,
             use_progress_bar=True,
             max_mem=8 * 1024 * 1024 * 1024,
+            costs=[repo.source_size() for repo in all_repos],
+            journal=journal_path,
+            task_key=lambda repo: repo.repo_id,
         )
 
-        for repo_id, output in zip(all_repos, outputs):
+        for index, output in outputs:
+            repo_id = all_repos[index].repo_id
             if output.is_success():
                 pass
+            elif output.is_memory_limit():
+                print(f"Memory limit exceeded running pycg on {repo_id}")
+                continue
             else:
                 print(f"Failed to run pycg on {repo_id}: {output.exception_tb}")
                 continue
+
+        journal_path.unlink(missing_ok=True)
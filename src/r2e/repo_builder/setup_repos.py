@@ -9,7 +9,7 @@ import fire
 from r2e.paths import REPOS_DIR
 from r2e.repo_builder.run_pycg import run_pycg
 from r2e.repo_builder.repo_args import RepoArgs
-from r2e.multiprocess import run_tasks_in_parallel_iter
+from r2e.multiprocess import run_tasks_as_completed_iter
 
 
 class SetupRepos:
@@ -85,14 +85,15 @@ class SetupRepos:
     @staticmethod
     def clone_repos_from_urls(repo_urls: list[str], cloning_multiprocess: int):
         if cloning_multiprocess > 0:
-            output = run_tasks_in_parallel_iter(
+            output = run_tasks_as_completed_iter(
                 SetupRepos.clone_repo_from_url,
                 repo_urls,
                 cloning_multiprocess,
+                backend="thread",
             )
-            for result in output:
+            for index, result in output:
                 if not result.is_success():
-                    print(result.exception_tb)
+                    print(f"Failed to clone {repo_urls[index]}: {result.exception_tb}")
         else:
             for repo_url in repo_urls:
                 SetupRepos.clone_repo_from_url(repo_url)
@@ -100,14 +101,17 @@ class SetupRepos:
     @staticmethod
     def copy_repos(local_repo_paths: list[str], cloning_multiprocess: int):
         if cloning_multiprocess > 0:
-            output = run_tasks_in_parallel_iter(
+            output = run_tasks_as_completed_iter(
                 SetupRepos.copy_repo,
                 local_repo_paths,
                 cloning_multiprocess,
+                backend="thread",
             )
-            for result in output:
+            for index, result in output:
                 if not result.is_success():
-                    print(result.exception_tb)
+                    print(
+                        f"Failed to copy {local_repo_paths[index]}: {result.exception_tb}"
+                    )
         else:
             for local_repo_path in local_repo_paths:
                 SetupRepos.copy_repo(local_repo_path)
@@ -0,0 +1,278 @@
+""" Shared, read-only, memory-mapped snapshots of repository sources. """
+
+import os
+import mmap
+import json
+import fcntl
+import shutil
+import struct
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+# workers started after `attach_snapshot` find the snapshots through this
+SNAPSHOT_ENV_VAR = "R2E_REPO_SNAPSHOT"
+
+# the repo directories a SnapshotStore snapshots, in its directory
+REPOS_FILE = "repos.json"
+
+# decoded files each process keeps per snapshot; the files of the repo a
+# worker is busy with are read again and again
+TEXT_CACHE_SIZE = 256
+
+# offset and size of the index, which follows the file contents
+_HEADER = struct.Struct("<QQ")
+
+
+class RepoSnapshot:
+    """
+    The source files of a set of repos concatenated into one file, with an
+    index of file path -> (offset, length, mtime_ns). The file is mapped
+    read-only, so every process that opens it shares the same page cache
+    pages instead of reading and holding its own copy of each file.
+
+    An entry is only used while the file on disk still has the size and
+    modification time recorded in the index; edited files are read from disk.
+    That is checked when a file is first read by a process, which then keeps
+    the decoded text of its most recently read files.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._texts: OrderedDict[str, Optional[str]] = OrderedDict()
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        index_offset, index_size = _HEADER.unpack_from(self._mmap, 0)
+        self.index: dict[str, list[int]] = json.loads(
+            self._mmap[index_offset : index_offset + index_size]
+        )
+
+    @classmethod
+    def build(
+        cls, file_paths: Iterable[str], path: str | Path, suffix: str = ".py"
+    ) -> "RepoSnapshot":
+        """Writes a snapshot of the given files (or of every `suffix` file
+        under the given directories) to `path` and opens it."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index: dict[str, list[int]] = {}
+
+        # readers never see a partly written snapshot
+        partial_path = path.with_name(path.name + ".partial")
+        with open(partial_path, "wb") as out:
+            out.write(_HEADER.pack(0, 0))
+            for file_path in _walk_files(file_paths, suffix):
+                try:
+                    stat = os.stat(file_path)
+                    with open(file_path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                index[file_path] = [out.tell(), len(data), stat.st_mtime_ns]
+                out.write(data)
+
+            encoded_index = json.dumps(index).encode()
+            index_offset = out.tell()
+            out.write(encoded_index)
+            out.seek(0)
+            out.write(_HEADER.pack(index_offset, len(encoded_index)))
+        os.replace(partial_path, path)
+
+        return cls(path)
+
+    def __contains__(self, file_path: str) -> bool:
+        return os.path.abspath(file_path) in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def read(self, file_path: str) -> Optional[str]:
+        """Contents of `file_path`, or None if it is not in the snapshot or
+        has changed on disk since the snapshot was taken."""
+        file_path = os.path.abspath(file_path)
+        entry = self.index.get(file_path)
+        if entry is None:
+            return None
+
+        if file_path in self._texts:
+            self._texts.move_to_end(file_path)
+            return self._texts[file_path]
+        code = self._decode(file_path, *entry)
+        self._texts[file_path] = code
+        if len(self._texts) > TEXT_CACHE_SIZE:
+            self._texts.popitem(last=False)
+        return code
+
+    def _decode(
+        self, file_path: str, offset: int, length: int, mtime_ns: int
+    ) -> Optional[str]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if stat.st_size != length or stat.st_mtime_ns != mtime_ns:
+            return None
+
+        try:
+            with memoryview(self._mmap) as view:
+                code = str(view[offset : offset + length], "utf-8")
+        except UnicodeDecodeError:
+            return None
+        # match the universal newlines of files opened in text mode
+        if "\r" in code:
+            code = code.replace("\r\n", "\n").replace("\r", "\n")
+        return code
+
+    def close(self) -> None:
+        self._texts.clear()
+        self._mmap.close()
+
+
+class SnapshotStore:
+    """
+    One RepoSnapshot per repo directory, all in `directory`, each built by
+    the first process that reads a file of its repo. Runs thus only pay for
+    the repos they read, and nothing is copied before work starts.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        with open(self.directory / REPOS_FILE) as f:
+            repo_paths = json.load(f)
+        # nested repos resolve to the innermost one
+        self.roots = sorted(repo_paths, key=len, reverse=True)
+        self.snapshots: dict[str, Optional[RepoSnapshot]] = {}
+
+    @classmethod
+    def create(
+        cls, repo_paths: Iterable[str], directory: str | Path
+    ) -> "SnapshotStore":
+        """Sets up an empty store for the given repo directories."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        roots = sorted({os.path.abspath(path) for path in repo_paths})
+        with open(directory / REPOS_FILE, "w") as f:
+            json.dump(roots, f)
+        return cls(directory)
+
+    def snapshot_of(self, file_path: str) -> Optional[RepoSnapshot]:
+        """The snapshot of the repo containing `file_path`, if any."""
+        file_path = os.path.abspath(file_path)
+        for root in self.roots:
+            if file_path.startswith(root + os.sep):
+                break
+        else:
+            return None
+
+        if root not in self.snapshots:
+            self.snapshots[root] = self._open(root)
+        return self.snapshots[root]
+
+    def _open(self, root: str) -> Optional[RepoSnapshot]:
+        name = hashlib.sha256(root.encode()).hexdigest()[:16]
+        path = self.directory / f"{name}.snapshot"
+        try:
+            # one process builds it; the others wait and then map it
+            with open(self.directory / f"{name}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if path.exists():
+                    return RepoSnapshot(path)
+                return RepoSnapshot.build([root], path)
+        except (OSError, ValueError):
+            return None
+
+    def __contains__(self, file_path: str) -> bool:
+        snapshot = self.snapshot_of(file_path)
+        return snapshot is not None and file_path in snapshot
+
+    def read(self, file_path: str) -> Optional[str]:
+        """Contents of `file_path`, or None if it is not in any repo of the
+        store or has changed on disk since its repo was snapshotted."""
+        snapshot = self.snapshot_of(file_path)
+        return None if snapshot is None else snapshot.read(file_path)
+
+    def close(self) -> None:
+        for snapshot in self.snapshots.values():
+            if snapshot is not None:
+                snapshot.close()
+        self.snapshots.clear()
+
+
+def _walk_files(paths: Iterable[str], suffix: str) -> Iterable[str]:
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in sorted(files):
+                    if file.endswith(suffix):
+                        yield os.path.join(root, file)
+        else:
+            yield path
+
+
+_snapshot: Optional[SnapshotStore] = None
+_snapshot_path: Optional[str] = None
+
+
+def attach_snapshot(path: Optional[str | Path]) -> None:
+    """Makes this process, and worker processes started after this call,
+    read sources through the SnapshotStore at `path`. None detaches."""
+    global _snapshot, _snapshot_path
+    if path is None:
+        os.environ.pop(SNAPSHOT_ENV_VAR, None)
+    else:
+        os.environ[SNAPSHOT_ENV_VAR] = str(path)
+    if _snapshot is not None:
+        _snapshot.close()
+    _snapshot, _snapshot_path = None, None
+
+
+def get_snapshot() -> Optional[SnapshotStore]:
+    """The snapshot store attached to this process, opened on first use."""
+    global _snapshot, _snapshot_path
+    path = os.environ.get(SNAPSHOT_ENV_VAR)
+    if path != _snapshot_path:
+        if _snapshot is not None:
+            _snapshot.close()
+        _snapshot, _snapshot_path = None, path
+        if path is not None:
+            try:
+                _snapshot = SnapshotStore(path)
+            except (OSError, ValueError):
+                # e.g. a remote worker that does not share the filesystem
+                _snapshot = None
+    return _snapshot
+
+
+def read_source(file_path: str) -> str:
+    """Reads a source file, through the attached snapshot if there is one."""
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        code = snapshot.read(file_path)
+        if code is not None:
+            return code
+    with open(file_path, "r") as f:
+        return f.read()
+
+
+@contextmanager
+def shared_snapshot(
+    repo_paths: Iterable[str], directory: str | Path
+) -> Iterator[SnapshotStore]:
+    """
+    Sets up a SnapshotStore of the given repo directories in `directory` and
+    attaches it for the duration of the block, so that worker pools started
+    inside it share one copy of the sources of each repo they read. The
+    snapshots are deleted after.
+    """
+    store = SnapshotStore.create(repo_paths, directory)
+    attach_snapshot(store.directory)
+    try:
+        yield store
+    finally:
+        attach_snapshot(None)
+        store.close()
+        shutil.rmtree(store.directory, ignore_errors=True)
@@ -0,0 +1,162 @@
+import re
+import threading
+import unittest
+from typing import Any
+
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+from r2e.execution.container_pool import (
+    POOL_LABEL,
+    ContainerPool,
+    warm_containers,
+)
+from r2e.execution.ports import free_port
+
+
+class FakeTestService(rpyc.Service):
+    """Stands in for r2e-test-server; `stop_server` shuts the server down."""
+
+    server: ThreadedServer | None = None
+
+    def exposed_stop_server(self):
+        if self.server is not None:
+            threading.Thread(target=self.server.close).start()
+
+
+class FakeContainer:
+    """A container whose test server runs in a thread of this process, on
+    the free host port its container port is published on. Like docker, it
+    reports the published ports only some time after it is running."""
+
+    def __init__(self, client, labels, ports):
+        self.client = client
+        self.labels = labels or {}
+        self.published = {
+            port: [{"HostIp": "0.0.0.0", "HostPort": str(free_port())}]
+            for port in ports
+        }
+        self.ports = {}
+        self.status = "created"
+        self.server = None
+        self.server_starts = 0
+
+    def reload(self):
+        if self.status == "created":
+            self.status = "running"
+        elif self.status == "running":
+            self.ports = self.published
+
+    def exec_run(self, command, workdir=None):
+        match = re.search(r"r2e-test-server start --port (\d+)", command)
+        if match and self.status == "running":
+            host_port = int(self.ports[f"{match.group(1)}/tcp"][0]["HostPort"])
+            service = FakeTestService()
+            self.server = service.server = ThreadedServer(
+                service, hostname="localhost", port=host_port
+            )
+            self.server._listen()  ## before it can be closed
+            threading.Thread(target=self.server.start, daemon=True).start()
+            self.server_starts += 1
+        return 0, b""
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def stop(self):
+        self.stop_server()
+        self.status = "exited"
+
+    def remove(self):
+        self.client.containers.removed.append(self)
+        self.client.containers.all.remove(self)
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self.all = []
+        self.removed = []
+
+    def run(self, image, command, labels=None, ports=None, **kwargs):
+        container = FakeContainer(self.client, labels, ports or {})
+        self.all.append(container)
+        return container
+
+    def list(self, filters: dict, all=False):
+        key, value = filters["label"].split("=")
+        return [c for c in self.all if c.labels.get(key) == value]
+
+
+class FakeDockerClient:
+    def __init__(self):
+        self.containers = FakeContainers(self)
+
+
+class TestContainerPool(unittest.TestCase):
+    def setUp(self):
+        self.client: Any = FakeDockerClient()
+        self.pool = ContainerPool(
+            "owner", max_uses=3, server_timeout=5, client=self.client
+        )
+        self.addCleanup(self.pool.close)
+
+    def test_reuse_reset_and_recycle(self):
+        for _ in range(3):
+            with self.pool.lease("image", "repo_a") as (simulator, conn):
+                self.assertTrue(conn.ping() is None)
+
+        # one container served three tasks, with a fresh server for each
+        first = self.client.containers.removed[0]
+        self.assertEqual(first.server_starts, 3)
+        self.assertEqual(self.client.containers.all, [])
+
+        with self.pool.lease("image", "repo_a"):
+            pass
+        with self.pool.lease("image", "repo_b"):
+            pass
+        self.assertEqual(len(self.client.containers.all), 2)
+
+    def test_unhealthy_containers_are_replaced(self):
+        with self.pool.lease("image", "repo_a") as (simulator, _):
+            pass
+        simulator.container.stop()
+
+        with self.pool.lease("image", "repo_a") as (replacement, _):
+            self.assertIsNot(replacement, simulator)
+
+        with self.assertRaises(ValueError):
+            with self.pool.lease("image", "repo_a"):
+                raise ValueError("task failed")
+        self.assertEqual(self.client.containers.all, [])
+
+    def test_keep_servers(self):
+        pool = ContainerPool(
+            "owner", keep_servers=True, server_timeout=5, client=self.client
+        )
+        self.addCleanup(pool.close)
+        for _ in range(3):
+            with pool.lease("image", "repo_a") as (_, conn):
+                self.assertTrue(conn.ping() is None)
+        container = self.client.containers.all[0]
+        self.assertEqual(container.server_starts, 1)
+
+        with pool.lease("image", "repo_a", restart_server=True):
+            pass
+        with pool.lease("image", "repo_a") as (simulator, _):
+            self.assertIs(simulator.container, container)
+        self.assertEqual(container.server_starts, 2)
+
+    def test_warm_containers_reaps_leftovers(self):
+        with warm_containers(client=self.client) as owner:
+            ContainerPool(owner, server_timeout=5, client=self.client)._start(
+                ("image", "repo_a")
+            )
+            self.assertEqual(self.client.containers.all[0].labels, {POOL_LABEL: owner})
+        self.assertEqual(self.client.containers.all, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
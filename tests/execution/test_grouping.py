@@ -0,0 +1,210 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, cast
+from unittest.mock import patch
+
+from r2e.execution.args import ExecutionArgs
+from r2e.execution.execute import EquivalenceTestRunner
+from r2e.execution.helpers import self_equiv_futs_in_session
+
+
+class FakeHistory:
+    def __init__(self):
+        self.exec_stats = None
+
+    def update_exec_stats(self, stats):
+        self.exec_stats = stats
+
+
+class FakeRepo:
+    def __init__(self, repo_id):
+        self.repo_id = repo_id
+        self.execution_repo_data = {"repo_id": repo_id, "repo_path": repo_id}
+
+
+REPOS = {repo_id: FakeRepo(repo_id) for repo_id in ("repo_a", "repo_b")}
+
+
+def make_fut(repo_id, file_path, name, tests) -> Any:
+    return SimpleNamespace(
+        id=f"{repo_id}/{file_path}:{name}",
+        repo=REPOS[repo_id],
+        repo_id=repo_id,
+        execution_fut_data=(name, file_path),
+        tests=tests,
+        test_history=FakeHistory(),
+    )
+
+
+class FakeTestService:
+    """Records the calls made to it and reports one log per function."""
+
+    def __init__(self, failing_init=()):
+        self.calls = []
+        self.failing_init = failing_init
+
+    def setup_repo(self, data):
+        self.calls.append("setup_repo")
+
+    def setup_function(self, data):
+        self.function = json.loads(data)["funclass_names"]
+        self.calls.append(f"setup_function:{','.join(self.function)}")
+
+    def setup_test(self, data):
+        self.tests = json.loads(data)["generated_tests"]
+
+    def init(self):
+        error = "Error" if self.function[0] in self.failing_init else ""
+        return {"output": "", "error": error}
+
+    def submit(self):
+        logs = {
+            "coverage_logs": [{"name": name} for name in self.function],
+            "run_tests_logs": {key: {"valid": True} for key in self.tests},
+        }
+        return {"output": "", "error": "", "logs": json.dumps(logs)}
+
+
+class TestGroupedExecution(unittest.TestCase):
+    def test_group_futs(self):
+        futs = [
+            make_fut("repo_a", "a.py", "f", {}),
+            make_fut("repo_a", "b.py", "g", {}),
+            make_fut("repo_a", "a.py", "h", {}),
+            make_fut("repo_b", "a.py", "f", {}),
+            make_fut("repo_a", "a.py", "k", {}),
+        ]
+        self.assertEqual(
+            EquivalenceTestRunner._group_futs(futs, 2), [[0, 2], [1], [3], [4]]
+        )
+        self.assertEqual(
+            EquivalenceTestRunner._group_futs(futs, 1), [[0], [1], [2], [3], [4]]
+        )
+
+    def test_session_attributes_logs_per_fut(self):
+        futs = [
+            make_fut("repo_a", "a.py", "f", {"test_0": "f tests"}),
+            make_fut("repo_a", "a.py", "g", {"test_0": "g tests"}),
+            make_fut("repo_a", "a.py", "h", {"test_0": "h tests"}),
+        ]
+        service = FakeTestService(failing_init=["g"])
+        outputs = self_equiv_futs_in_session(
+            futs, cast(Any, SimpleNamespace(root=service))
+        )
+
+        # the repo is set up once for the whole file
+        self.assertEqual(
+            service.calls,
+            ["setup_repo", "setup_function:f", "setup_function:g", "setup_function:h"],
+        )
+        self.assertEqual([ok for ok, _, _ in outputs], [True, False, True])
+        self.assertEqual([fut for _, _, fut in outputs], futs)
+        for fut in (futs[0], futs[2]):
+            stats = fut.test_history.exec_stats
+            self.assertEqual(
+                stats["coverage_logs"], [{"name": fut.execution_fut_data[0]}]
+            )
+        self.assertEqual(futs[1].test_history.exec_stats["error"], "Error")
+
+
+class TestInMemoryExecution(unittest.TestCase):
+    def test_run_futs(self):
+        futs = [
+            make_fut("repo_a", "a.py", "f", {}),
+            make_fut("repo_a", "b.py", "g", {}),
+            make_fut("repo_a", "a.py", "h", {}),
+        ]
+        sessions = []
+
+        def run_session(group, port, local, image, reuse_port):
+            sessions.append([fut.execution_fut_data[0] for fut in group])
+            return [(True, "", fut) for fut in group]
+
+        args = ExecutionArgs.model_validate(
+            dict(execution_multiprocess=0, local=True, group_size=2)
+        )
+        with (
+            patch("r2e.execution.execute.run_futs_with_port", run_session),
+            patch("r2e.execution.execute.write_functions_under_test") as write,
+        ):
+            results = EquivalenceTestRunner.run_futs(futs, args)
+
+        self.assertEqual(sessions, [["f", "h"], ["g"]])
+        self.assertEqual(results, futs)
+        write.assert_not_called()
+
+    def test_sequential_resume(self):
+        futs = [
+            make_fut("repo_a", "a.py", "f", {}),
+            make_fut("repo_a", "b.py", "g", {}),
+        ]
+        sessions, interrupted = [], []
+
+        def run_session(group, port, local, image, reuse_port):
+            if group[0].execution_fut_data[0] == "g" and not interrupted:
+                interrupted.append(True)
+                raise KeyboardInterrupt
+            sessions.append([fut.execution_fut_data[0] for fut in group])
+            return [(True, "", fut) for fut in group]
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        args = ExecutionArgs.model_validate(
+            dict(execution_multiprocess=0, local=True, group_size=1)
+        )
+        with (
+            patch("r2e.execution.execute.EXECUTION_DIR", Path(tmpdir.name)),
+            patch("r2e.execution.execute.run_futs_with_port", run_session),
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                EquivalenceTestRunner.run_futs(futs, args)
+            results = EquivalenceTestRunner.run_futs(futs, args)
+
+        # "f" finished before the interrupt and is not run again
+        self.assertEqual(sessions, [["f"], ["g"]])
+        self.assertEqual([fut.id for fut in results], [fut.id for fut in futs])
+        self.assertEqual(list(Path(tmpdir.name).iterdir()), [])
+
+    def test_priority_and_stop_when(self):
+        futs = [
+            make_fut("repo_a", "a.py", "f", {}),
+            make_fut("repo_a", "b.py", "g", {}),
+            make_fut("repo_a", "c.py", "h", {}),
+        ]
+        sessions = []
+
+        def run_session(group, port, local, image, reuse_port):
+            sessions.append([fut.execution_fut_data[0] for fut in group])
+            return [(True, "", fut) for fut in group]
+
+        args = ExecutionArgs.model_validate(dict(execution_multiprocess=0, local=True))
+        with patch("r2e.execution.execute.run_futs_with_port", run_session):
+            results = EquivalenceTestRunner.run_futs(
+                futs,
+                args,
+                priority=lambda fut: fut.execution_fut_data[0] == "g",
+                stop_when=lambda fut: True,
+            )
+
+        # the rest of the run is cancelled; its FUTs are returned unrun
+        self.assertEqual(sessions, [["g"]])
+        self.assertEqual(results, futs)
+
+    def test_deadline_sequential(self):
+        futs = [
+            make_fut("repo_a", "a.py", "f", {}),
+            make_fut("repo_a", "b.py", "g", {}),
+        ]
+        args = ExecutionArgs.model_validate(dict(execution_multiprocess=0, local=True))
+        with patch("r2e.execution.execute.run_futs_with_port") as run_session:
+            results = EquivalenceTestRunner.run_futs(futs, args, deadline=0)
+
+        run_session.assert_not_called()
+        self.assertEqual(results, futs)
+
+
+if __name__ == "__main__":
+    unittest.main()
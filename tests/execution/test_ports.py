@@ -0,0 +1,44 @@
+import time
+import socket
+import threading
+import unittest
+
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+from r2e.execution.ports import backoff, connect_when_ready, free_port, server_alive
+
+
+class TestPorts(unittest.TestCase):
+    def test_free_ports_are_bindable(self):
+        ports = [free_port() for _ in range(50)]
+        # the OS may hand a port out again once released, but rarely
+        self.assertGreater(len(set(ports)), 40)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("localhost", ports[-1]))
+
+    def test_backoff(self):
+        start = time.monotonic()
+        polls = sum(1 for _ in backoff(0.5, initial_delay=0.01, max_delay=0.1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+        self.assertLess(polls, 15)
+
+    def test_connect_when_ready(self):
+        port = free_port()
+        server = ThreadedServer(rpyc.Service, hostname="localhost", port=port)
+        self.addCleanup(server.close)
+        self.assertFalse(server_alive(port))
+
+        # the server comes up while the probe is backing off
+        threading.Timer(0.3, server.start).start()
+        conn = connect_when_ready(port, timeout=10)
+        self.assertTrue(server_alive(port))
+        conn.close()
+
+    def test_connect_timeout(self):
+        with self.assertRaises(TimeoutError):
+            connect_when_ready(free_port(), timeout=0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+import unittest
+
+from r2e.execution.ports import server_alive
+from r2e.execution.service import ServiceManager
+
+
+class TestServiceManager(unittest.TestCase):
+    def test_local_servers_bind_their_own_ports(self):
+        self.addCleanup(ServiceManager.shutdown)
+        ports = [ServiceManager.start_local_server() for _ in range(2)]
+
+        self.assertEqual(len(set(ports)), 2)
+        self.assertEqual(ServiceManager.running_ports, set(ports))
+        for port in ports:
+            self.assertTrue(server_alive(port))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+
+from r2e.models.tests import Tests, TestHistory
+from r2e.generators.testgen.args import GenExecArgs
+from r2e.generators.testgen.genexec import R2EGenExec
+
+
+class FakeFut:
+    def __init__(self, id):
+        self.id = id
+        self.test_history = TestHistory(history=[Tests(tests={"test_0": "..."})])
+
+    @property
+    def tests(self):
+        return self.test_history.latest_tests
+
+    @property
+    def exec_stats(self):
+        return self.test_history.latest_exec_stats
+
+    @property
+    def coverage(self):
+        return self.test_history.latest_coverage
+
+    @property
+    def is_passing(self):
+        return self.test_history.is_passing
+
+    def update_history(self, tests):
+        self.test_history.add(tests)
+
+
+PASSING = {
+    "run_tests_logs": {"test_0": {"valid": True}},
+    "coverage_logs": [{"branch_coverage_percentage": 100}],
+}
+
+
+def run_first_fut(futs, args, deadline=None, priority=None, stop_when=None):
+    """Runs the first FUT only, as when the rest of the round is cancelled."""
+    futs[0].test_history.update_exec_stats(PASSING)
+    if stop_when is not None:
+        stop_when(futs[0])
+    return futs
+
+
+class TestCancelledRounds(unittest.TestCase):
+    def genexec(self, args):
+        functions = [FakeFut("f"), FakeFut("g")]
+        with (
+            patch(
+                "r2e.generators.testgen.genexec.R2ETestGenerator.prepare_tasks",
+                return_value=[object(), object()],
+            ),
+            patch.object(R2EGenExec, "generate", return_value=functions),
+            patch(
+                "r2e.generators.testgen.genexec.EquivalenceTestRunner.run_futs",
+                side_effect=run_first_fut,
+            ) as run_futs,
+            patch("r2e.generators.testgen.genexec.write_functions_under_test") as write,
+        ):
+            R2EGenExec._genexec(args, functions)
+
+        self.assertEqual(run_futs.call_count, 1)
+        results = write.call_args.args[0]
+        self.assertEqual([fut.id for fut in results], ["f", "g"])
+        self.assertTrue(results[0].is_passing)
+        self.assertIsNone(results[1].exec_stats)
+
+    def test_deadline_reached(self):
+        self.genexec(GenExecArgs.model_validate(dict(time_budget=0, min_valid=1.0)))
+
+    def test_min_valid_reached(self):
+        self.genexec(GenExecArgs.model_validate(dict(min_valid=0.5)))
+
+    def test_priority(self):
+        fut = FakeFut("f")
+        self.assertEqual(R2EGenExec._priority(fut), 0)
+        fut.test_history.update_exec_stats(PASSING)
+        fut.update_history(Tests(tests={"test_1": "..."}))
+        self.assertEqual(R2EGenExec._priority(fut), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
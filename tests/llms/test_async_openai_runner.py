@@ -0,0 +1,83 @@
+import os
+import time
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# the OpenAI runners create their client at import time
+os.environ.setdefault("OPENAI_KEY", "test-key")
+
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.language_model import LanguageModel, LanguageModelStyle
+from r2e.llms.async_openai_runner import AsyncOpenAIRunner
+
+
+class FakeAsyncOpenAI:
+    """Stands in for openai.AsyncOpenAI; each request takes 0.2 seconds."""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, **kwargs):
+        raw = SimpleNamespace(create=self.create_raw)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=raw))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def create(self, messages, **kwargs):
+        cls = FakeAsyncOpenAI
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        await asyncio.sleep(0.2)
+        cls.in_flight -= 1
+        if messages[0]["content"] == "fail":
+            raise ValueError("bad request")
+        message = SimpleNamespace(content=messages[0]["content"].upper())
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def create_raw(self, messages, **kwargs):
+        response = await self.create(messages, **kwargs)
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+@patch("r2e.llms.async_openai_runner.AsyncOpenAI", FakeAsyncOpenAI)
+class TestAsyncOpenAIRunner(unittest.TestCase):
+    def setUp(self):
+        args = LLMArgs.model_validate(
+            dict(model_name="gpt-4o", use_cache=False, max_concurrent_requests=100)
+        )
+        model = LanguageModel("gpt-4o", LanguageModelStyle.OpenAI)
+        self.runner = AsyncOpenAIRunner(args, model)
+
+    def test_requests_run_concurrently(self):
+        FakeAsyncOpenAI.max_in_flight = 0
+        payloads = [[{"role": "user", "content": f"p{i}"}] for i in range(300)]
+
+        start = time.time()
+        outputs = self.runner.run_main(payloads)
+
+        self.assertLess(time.time() - start, 3)
+        self.assertEqual(FakeAsyncOpenAI.max_in_flight, 100)
+        self.assertEqual(outputs, [[f"P{i}"] for i in range(300)])
+
+    def test_failed_request(self):
+        payloads = [
+            [{"role": "user", "content": "ok"}],
+            [{"role": "user", "content": "fail"}],
+        ]
+        self.assertEqual(self.runner.run_main(payloads), [["OK"], [""]])
+
+    def test_called_from_running_loop(self):
+        async def main():
+            return self.runner.run_main([[{"role": "user", "content": "ok"}]])
+
+        self.assertEqual(asyncio.run(main()), [["OK"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pydantic import ValidationError
+
+# the OpenAI runners create their client at import time
+os.environ.setdefault("OPENAI_KEY", "test-key")
+
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.language_model import LanguageModel, LanguageModelStyle
+from r2e.llms.batch_openai_runner import BatchOpenAIRunner
+
+
+class FakeBatchAPI(BaseHTTPRequestHandler):
+    """
+    Stands in for the files and batches endpoints of the OpenAI API. Batches
+    complete on the second status check; each request is answered with its
+    upper-cased prompt, and prompts saying "fail" get an error response.
+    """
+
+    files: dict[str, str] = {}
+    batches: dict[str, dict] = {}
+    log: list[str] = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.log.append(f"POST {self.path}")
+        if self.path == "/v1/files":
+            # the JSONL lines of the multipart upload
+            lines = [
+                line
+                for line in body.decode().splitlines()
+                if line.startswith('{"body"')
+            ]
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = "\n".join(lines)
+            self.send_json({"id": file_id, "object": "file", "purpose": "batch"})
+        elif self.path == "/v1/batches":
+            request = json.loads(body)
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "status": "validating",
+                "input_file_id": request["input_file_id"],
+                "output_file_id": None,
+            }
+            self.send_json(self.batches[batch_id])
+
+    def do_GET(self):
+        self.log.append(f"GET {self.path}")
+        if self.path.startswith("/v1/batches/"):
+            batch = self.batches[self.path.rsplit("/", 1)[1]]
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                batch["status"] = "completed"
+                batch["output_file_id"] = self.complete(batch["input_file_id"])
+            self.send_json(batch)
+        elif self.path.endswith("/content"):
+            data = self.files[self.path.split("/")[3]].encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    def complete(self, input_file_id: str) -> str:
+        results = []
+        for line in self.files[input_file_id].splitlines():
+            request = json.loads(line)
+            content = request["body"]["messages"][0]["content"]
+            if content == "fail":
+                response = {"status_code": 400, "body": {"error": "bad request"}}
+            else:
+                message = {"role": "assistant", "content": content.upper()}
+                choices = [{"index": 0, "message": message}]
+                response = {"status_code": 200, "body": {"choices": choices}}
+            results.append({"custom_id": request["custom_id"], "response": response})
+        output_file_id = f"file-{len(self.files)}"
+        self.files[output_file_id] = "\n".join(json.dumps(r) for r in results)
+        return output_file_id
+
+
+class TestBatchOpenAIRunner(unittest.TestCase):
+    def setUp(self):
+        FakeBatchAPI.files, FakeBatchAPI.batches, FakeBatchAPI.log = {}, {}, []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBatchAPI)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        for patcher in [
+            patch.dict(os.environ, {"OPENAI_BASE_URL": base_url}),
+            patch("r2e.llms.cache_object.CACHE_DIR", self.tmpdir.name),
+            patch("r2e.llms.batch_openai_runner.CACHE_DIR", self.tmpdir.name),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_runner(self, **kwargs):
+        args = LLMArgs(
+            model_name="gpt-4o", batch_mode=True, batch_poll_interval=0, **kwargs
+        )
+        model = LanguageModel("gpt-4o", LanguageModelStyle.OpenAI)
+        return BatchOpenAIRunner(args, model)
+
+    def payloads(self, *prompts):
+        return [[{"role": "user", "content": prompt}] for prompt in prompts]
+
+    def test_batch_results_are_cached(self):
+        outputs = self.make_runner().run_main(self.payloads("a", "fail", "b"))
+        self.assertEqual(outputs, [["A"], [""], ["B"]])
+        self.assertEqual(len(FakeBatchAPI.batches), 1)
+        self.assertEqual(list(Path(self.tmpdir.name, "batches").iterdir()), [])
+
+        # cached results are not submitted again; the failure was not cached
+        outputs = self.make_runner().run_main(self.payloads("a", "fail", "c"))
+        self.assertEqual(outputs, [["A"], [""], ["C"]])
+        last_input = FakeBatchAPI.files["file-2"].splitlines()
+        self.assertEqual(len(last_input), 2)
+
+    def test_resumes_submitted_batch(self):
+        payloads = self.payloads("a", "b")
+        with patch("r2e.llms.batch_openai_runner.time.sleep") as sleep:
+            sleep.side_effect = KeyboardInterrupt
+            with self.assertRaises(KeyboardInterrupt):
+                self.make_runner().run_main(payloads)
+
+        self.assertEqual(self.make_runner().run_main(payloads), [["A"], ["B"]])
+        self.assertEqual(FakeBatchAPI.log.count("POST /v1/batches"), 1)
+
+    def test_full_completions_are_cached_as_such(self):
+        self.make_runner(stream_until_codeblock=True).run_main(self.payloads("a"))
+        # a runner not cutting completions short reuses them
+        self.assertEqual(self.make_runner().run_main(self.payloads("a")), [["A"]])
+        self.assertEqual(FakeBatchAPI.log.count("POST /v1/batches"), 1)
+
+    def test_completion_window(self):
+        with self.assertRaises(ValidationError):
+            self.make_runner(batch_completion_window="1h")
+
+
+if __name__ == "__main__":
+    unittest.main()
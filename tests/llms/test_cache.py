@@ -0,0 +1,215 @@
+import json
+import time
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.base_runner import BaseRunner
+from r2e.llms.cache_object import Cache, cache_usage, migrate_cache, prune_cache
+from r2e.llms.language_model import LanguageModel, LanguageModelStyle
+
+
+class EchoRunner(BaseRunner):
+    """Answers each payload with its upper-cased text and records the calls."""
+
+    def __init__(self, args, model):
+        super().__init__(args, model)
+        self.calls = []
+
+    def config(self):
+        return {"model": self.args.model_name}
+
+    def _run_single(self, payload, n=None):
+        self.calls.append(payload)
+        if payload == "fail":
+            raise ValueError("bad payload")
+        return [payload.upper()]
+
+
+class SamplingRunner(EchoRunner):
+    """Labels each sample with the number of samples its request asked for."""
+
+    def config(self):
+        return {"model": self.args.model_name, "n": self.args.n}
+
+    def _run_single(self, payload, n=None):
+        self.calls.append((payload, n))
+        n = self.args.n if n is None else n
+        return [f"{payload}/{n}:{i}" for i in range(n)]
+
+
+class TestBatchedCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch("r2e.llms.cache_object.CACHE_DIR", self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def make_runner(self):
+        args = LLMArgs.model_validate(dict(model_name="gpt-4o", multiprocess=2))
+        model = LanguageModel("gpt-4o", LanguageModelStyle.OpenAI)
+        return EchoRunner(args, model)
+
+    def test_get_many_and_set_many(self):
+        cache = self.make_runner().cache
+        assert cache is not None
+        cache.set_many([("a", ["A"]), (["b"], ["B"])])
+        self.assertEqual(cache.get_many(["a", ["b"], "c"]), [["A"], ["B"], None])
+        self.assertEqual(cache.get_from_cache("a"), ["A"])
+
+    def test_only_misses_are_run(self):
+        runner = self.make_runner()
+        self.assertEqual(runner.run_batch(["x", "fail"]), [["X"], [""]])
+
+        runner = self.make_runner()
+        self.assertEqual(runner.run_batch(["x", "y", "fail"]), [["X"], ["Y"], [""]])
+        # "x" was cached; the failure was not
+        self.assertEqual(sorted(runner.calls), ["fail", "y"])
+
+
+class TestPartialSamples(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch("r2e.llms.cache_object.CACHE_DIR", self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def make_runner(self, n):
+        args = LLMArgs.model_validate(dict(model_name="gpt-4o", n=n))
+        model = LanguageModel("gpt-4o", LanguageModelStyle.OpenAI)
+        return SamplingRunner(args, model)
+
+    def test_only_missing_samples_are_requested(self):
+        self.assertEqual(self.make_runner(2).run_batch(["x"]), [["x/2:0", "x/2:1"]])
+
+        runner = self.make_runner(4)
+        self.assertEqual(
+            runner.run_batch(["x", "y"])[0], ["x/2:0", "x/2:1", "x/2:0", "x/2:1"]
+        )
+        self.assertEqual(runner.calls, [("x", 2), ("y", 4)])
+
+        # fewer samples than cached are served without any request
+        runner = self.make_runner(1)
+        self.assertEqual(runner.run_batch(["x", "y"]), [["x/2:0"], ["y/4:0"]])
+        self.assertEqual(runner.calls, [])
+
+    def test_legacy_entries_with_n_in_key(self):
+        runner = self.make_runner(2)
+        legacy_key = json.dumps(["x", runner.config()])
+        Cache().cache_dict.set(legacy_key, ["old0", "old1"])
+        # lookups do not fall back to old keys until the cache is migrated
+        self.assertEqual(runner.run_batch(["x"]), [["x/2:0", "x/2:1"]])
+
+        Cache().cache_dict.set(legacy_key, ["old0", "old1", "old2"])
+        self.assertEqual(migrate_cache(), 1)
+        runner = self.make_runner(3)
+        self.assertEqual(runner.run_batch(["x"]), [["old0", "old1", "old2"]])
+
+        runner = self.make_runner(4)
+        self.assertEqual(runner.run_batch(["x"]), [["old0", "old1", "old2", "x/1:0"]])
+        self.assertEqual(runner.calls, [("x", 1)])
+
+
+class TestHashedKeys(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch("r2e.llms.cache_object.CACHE_DIR", self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_canonical_key(self):
+        payload = [{"role": "user", "content": "x" * 10_000}, {"n": 1, "t": 0.2}]
+        reordered = [{"content": "x" * 10_000, "role": "user"}, {"t": 0.2, "n": 1}]
+        key = Cache.make_key(payload)
+        self.assertEqual(key, Cache.make_key(reordered))
+        self.assertLess(len(key), 80)
+
+    def test_prompt_side_table(self):
+        cache = Cache(keep_prompts=True)
+        cache.add_to_cache(["hello"], ["world"])
+        self.assertEqual(cache.get_prompt(Cache.make_key(["hello"])), '["hello"]')
+
+    def test_legacy_keys_are_migrated(self):
+        cache = Cache(namespace="m")
+        cache.cache_dict.set(json.dumps([["a"], {"t": 0}]), ["A"])
+        cache.cache_dict.set("raw prompt", ["B"])
+        cache.add_to_cache(["c"], ["C"])
+
+        self.assertIsNone(cache.get_from_cache([["a"], {"t": 0}]))
+        self.assertEqual(migrate_cache(), 2)
+        self.assertEqual(
+            cache.get_many([[["a"], {"t": 0}], "raw prompt", ["c"]]),
+            [["A"], ["B"], ["C"]],
+        )
+        keys = list(cache.cache_dict.iterkeys())
+        self.assertTrue(all(str(key).startswith("sha256:") for key in keys))
+        self.assertEqual(migrate_cache(), 0)
+
+
+class TestNamespacesAndPolicies(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch("r2e.llms.cache_object.CACHE_DIR", self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_namespaces_and_migration(self):
+        old = ["old", {"model": "org/model-a", "n": 1}]
+        Cache().cache_dict.set(json.dumps(old), ["OLD"])
+        Cache().cache_dict.set(json.dumps(["other", {}]), ["OTHER"])
+        cache = Cache(namespace="org/model-a")
+        cache.add_to_cache(["new"], ["NEW"])
+
+        self.assertIsNone(Cache(namespace="model-b").get_from_cache(["new"]))
+        self.assertIsNone(cache.get_from_cache(["old", {"model": "org/model-a"}]))
+
+        # entries from before namespaces move into their model's cache
+        self.assertEqual(migrate_cache(), 2)
+        self.assertEqual(
+            cache.get_from_cache(["old", {"model": "org/model-a"}]), ["OLD"]
+        )
+        self.assertEqual(Cache().get_from_cache(["other", {}]), ["OTHER"])
+        usage = {name: entries for name, entries, _ in cache_usage()}
+        self.assertEqual(usage, {"(shared)": 1, "org_model-a": 2, "model-b": 0})
+
+    def test_ttl_and_prune(self):
+        cache = Cache(namespace="m", eviction_policy="lru", ttl=0.1)
+        cache.set_many([(["a"], ["A"]), (["b"], ["B"])])
+        time.sleep(0.2)
+        self.assertIsNone(cache.get_from_cache(["a"]))
+        self.assertEqual(prune_cache("m"), 2)
+
+        Cache(namespace="m").add_to_cache(["c"], ["C"])
+        self.assertEqual(prune_cache("m", clear=True), 1)
+        self.assertEqual([name for name, _, _ in cache_usage()], ["(shared)"])
+
+    def test_prune_keeps_size_limit(self):
+        cache = Cache(namespace="m", size_limit=2**30)
+        cache.set_many([(["a"], ["A" * 1000]), (["b"], ["B" * 1000])])
+        self.assertEqual(prune_cache("m", size_limit=0), 2)
+        self.assertEqual(Cache(namespace="m").cache_dict.reset("size_limit"), 2**30)
+
+    def test_usage_includes_prompts(self):
+        Cache(namespace="m").add_to_cache(["a"], ["A"])
+        Cache(namespace="p", keep_prompts=True).add_to_cache(["a" * 10000], ["A"])
+        usage = {name: volume for name, _, volume in cache_usage()}
+        self.assertGreater(usage["p"], usage["m"])
+
+    def test_prune_rejects_paths_outside_model_caches(self):
+        Cache().add_to_cache(["shared"], ["S"])
+        Cache(namespace="m").add_to_cache(["a"], ["A"])
+        for namespace in ("..", ".", ""):
+            with self.assertRaises(ValueError):
+                prune_cache(namespace, clear=True)
+        self.assertEqual(prune_cache("../..", clear=True), 0)  ## ".._.."
+        self.assertEqual(Cache().get_from_cache(["shared"]), ["S"])
+        self.assertEqual(Cache(namespace="m").get_from_cache(["a"]), ["A"])
+
+
+if __name__ == "__main__":
+    unittest.main()
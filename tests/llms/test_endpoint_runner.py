@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# the OpenAI runners create their client at import time
+os.environ.setdefault("OPENAI_KEY", "test-key")
+
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.language_model import LanguageModel, LanguageModelStyle
+from r2e.llms.endpoint_runner import EndpointRunner
+
+
+class FakeReplica(BaseHTTPRequestHandler):
+    """An OpenAI-compatible chat endpoint answering with the upper-cased
+    prompt; records the client address of every request it serves."""
+
+    protocol_version = "HTTP/1.1"  ## keep connections alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.peers.append(self.client_address)  # type: ignore
+        content = request["messages"][0]["content"].upper()
+        choice = {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }
+        body = {
+            "id": "chatcmpl-0",
+            "object": "chat.completion",
+            "created": 0,
+            "model": request["model"],
+            "choices": [choice] * request.get("n", 1),
+        }
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestEndpointRunner(unittest.TestCase):
+    def setUp(self):
+        self.replicas = []
+        for _ in range(2):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), FakeReplica)
+            server.peers = []  # type: ignore
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            self.replicas.append(server)
+
+    def test_round_robin_over_pooled_connections(self):
+        args = LLMArgs.model_validate(
+            dict(
+                model_name="local-model",
+                use_cache=False,
+                base_urls=[
+                    f"http://127.0.0.1:{server.server_port}/v1"
+                    for server in self.replicas
+                ],
+                max_connections=2,
+            )
+        )
+        model = LanguageModel("local-model", LanguageModelStyle.OpenAI)
+        runner = EndpointRunner(args, model)
+
+        payloads = [[{"role": "user", "content": f"p{i}"}] for i in range(20)]
+        self.assertEqual(runner.run_main(payloads), [[f"P{i}"] for i in range(20)])
+
+        for server in self.replicas:
+            self.assertEqual(len(server.peers), 10)  # type: ignore
+            # requests reuse the pooled keep-alive connections
+            self.assertLessEqual(len(set(server.peers)), 2)  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import importlib
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import openai
+
+os.environ.setdefault("OPENAI_KEY", "test-key")
+
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.language_model import LanguageModel, LanguageModelStyle
+from r2e.llms.openai_runner import OpenAIRunner
+from r2e.llms.rate_limiter import RateLimiter, backoff_delay, retry_after
+
+# the HTTP library the installed SDK is built on (httpx, or httpx2 later)
+http = importlib.import_module(
+    type(openai.DEFAULT_CONNECTION_LIMITS).__module__.partition(".")[0]
+)
+
+
+def rate_limit_error():
+    request = http.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = http.Response(429, headers={"retry-after-ms": "10"}, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class FlakyCompletions:
+    """Fails with a 429 `failures` times, then answers."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.with_raw_response = self
+
+    def create(self, messages, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise rate_limit_error()
+        message = SimpleNamespace(content="ok")
+        response = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        headers = {"x-ratelimit-limit-requests": "500"}
+        return SimpleNamespace(headers=headers, parse=lambda: response)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_are_spaced_once_budget_is_used(self):
+        limiter = RateLimiter(requests_per_minute=60)
+        delays = [limiter.reserve() for _ in range(62)]
+        self.assertEqual(delays[:60], [0.0] * 60)
+        self.assertAlmostEqual(delays[60], 1.0, places=1)
+        self.assertAlmostEqual(delays[61], 2.0, places=1)
+
+    def test_token_budget_and_headers(self):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.reserve(10_000), 0.0)
+
+        limiter.update_from_headers(
+            {
+                "x-ratelimit-limit-requests": "120",
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-limit-tokens": "6000",
+                "x-ratelimit-remaining-tokens": "500",
+            }
+        )
+        # one request per 0.5 seconds; the 500 missing tokens take 5 seconds
+        self.assertAlmostEqual(limiter.reserve(1000), 5.0, places=1)
+
+    def test_backoff_and_retry_after(self):
+        for attempt in range(10):
+            self.assertLessEqual(backoff_delay(attempt, cap=8), 8)
+        self.assertEqual(retry_after({"retry-after": "3"}), 3)
+        self.assertEqual(retry_after({"retry-after-ms": "250"}), 0.25)
+        self.assertIsNone(retry_after({}))
+
+
+class TestOpenAIRunnerRetries(unittest.TestCase):
+    def make_runner(self, max_retries):
+        args = LLMArgs.model_validate(
+            dict(model_name="gpt-4o", use_cache=False, max_retries=max_retries)
+        )
+        model = LanguageModel("gpt-4o", LanguageModelStyle.OpenAI)
+        return OpenAIRunner(args, model)
+
+    def test_retries_until_success(self):
+        completions = FlakyCompletions(failures=2)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with patch.object(OpenAIRunner, "client", client):
+            output = self.make_runner(3)._run_single(
+                [{"role": "user", "content": "hi"}]
+            )
+        self.assertEqual(output, ["ok"])
+        self.assertEqual(completions.calls, 3)
+
+    def test_retries_are_bounded(self):
+        completions = FlakyCompletions(failures=10)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with patch.object(OpenAIRunner, "client", client):
+            with self.assertRaises(openai.RateLimitError):
+                self.make_runner(2)._run_single([{"role": "user", "content": "hi"}])
+        self.assertEqual(completions.calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from itertools import zip_longest
+from types import SimpleNamespace
+
+from r2e.generators.testgen.utils import extract_codeblock
+from r2e.llms.streaming import (
+    CodeblockStop,
+    collect_until_codeblock,
+    collect_until_codeblock_async,
+)
+
+COMPLETION = "Here are the tests:\n```python\ndef test_f():\n    assert f()\n```\nThese tests check that f works as expected."
+
+
+def make_chunk(index, content):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(index=index, delta=delta)])
+
+
+class FakeChunks:
+    """The chunks of a stream of each completion's pieces in turn, recording
+    how far the stream got."""
+
+    def __init__(self, pieces_per_choice):
+        self.chunks = [
+            make_chunk(index, piece)
+            for pieces in zip_longest(*pieces_per_choice, fillvalue="")
+            for index, piece in enumerate(pieces)
+        ]
+        self.sent = 0
+        self.closed = False
+
+
+class FakeStream(FakeChunks):
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeChunks):
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+def pieces(text, size=3):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class TestCodeblockStop(unittest.TestCase):
+    def test_stops_at_closing_fence(self):
+        stop = CodeblockStop()
+        for piece in pieces(COMPLETION):
+            if stop.feed(piece):
+                break
+        self.assertLess(len(stop.text), len(COMPLETION))
+        self.assertEqual(extract_codeblock(stop.text), extract_codeblock(COMPLETION))
+
+    def test_no_closing_fence(self):
+        stop = CodeblockStop()
+        self.assertFalse(stop.feed("```python\nx = 1\n"))
+        self.assertFalse(stop.feed("y = 2"))
+        self.assertEqual(stop.text, "```python\nx = 1\ny = 2")
+
+    def test_waits_for_every_completion(self):
+        other = "```python\n" + "x = 1\n" * 30 + "```\nmore"
+        stream = FakeStream([pieces(COMPLETION), pieces(other)])
+        texts = collect_until_codeblock(stream, n=2)
+
+        self.assertTrue(stream.closed)
+        self.assertLess(stream.sent, len(stream.chunks))
+        self.assertEqual(extract_codeblock(texts[0]), extract_codeblock(COMPLETION))
+        self.assertEqual(extract_codeblock(texts[1]), extract_codeblock(other))
+
+    def test_async(self):
+        stream = FakeAsyncStream([pieces(COMPLETION)])
+        texts = asyncio.run(collect_until_codeblock_async(stream))
+        self.assertTrue(stream.closed)
+        self.assertEqual(extract_codeblock(texts[0]), extract_codeblock(COMPLETION))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import sys
+import unittest
+from types import ModuleType
+from unittest.mock import patch
+
+from r2e.llms.llm_args import LLMArgs
+from r2e.llms.language_model import LanguageModel, LanguageModelStyle
+
+
+class FakeLLM:
+    """Stands in for vllm.LLM; counts the engines built."""
+
+    built = 0
+
+    def __init__(self, **engine_args):
+        FakeLLM.built += 1
+
+    def get_tokenizer(self):
+        return None
+
+
+def fake_vllm():
+    module = ModuleType("vllm")
+    module.LLM = FakeLLM  # type: ignore
+    module.SamplingParams = dict  # type: ignore
+    return module
+
+
+class TestVLLMRunner(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict(sys.modules, {"vllm": fake_vllm()})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sys.modules.pop("r2e.llms.vllm_runner", None)
+        self.addCleanup(sys.modules.pop, "r2e.llms.vllm_runner", None)
+        FakeLLM.built = 0
+
+    def make_runner(self, **kwargs):
+        from r2e.llms.vllm_runner import VLLMRunner
+
+        args = LLMArgs.model_validate(
+            dict(model_name="local", local_model_path="/models/local", **kwargs)
+        )
+        return VLLMRunner(args, LanguageModel("local", LanguageModelStyle.VLLM))
+
+    def test_engine_is_reused(self):
+        first = self.make_runner(temperature=0.2)
+        # sampling arguments do not need a new engine
+        second = self.make_runner(temperature=0.8, n=4)
+        self.assertIs(first.llm, second.llm)
+        self.assertEqual(FakeLLM.built, 1)
+
+        self.make_runner(tensor_parallel_size=2)
+        self.assertEqual(FakeLLM.built, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
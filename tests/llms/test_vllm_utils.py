@@ -0,0 +1,43 @@
+import unittest
+
+from r2e.llms.vllm_utils import (
+    render_prompt,
+    prefix_sorted_order,
+    shared_prefix_fraction,
+)
+
+
+class FakeTokenizer:
+    def apply_chat_template(self, messages, tokenize, add_generation_prompt):
+        assert not tokenize and add_generation_prompt
+        turns = [f"<{m['role']}>{m['content']}" for m in messages]
+        return "".join(turns) + "<assistant>"
+
+
+class TestVLLMUtils(unittest.TestCase):
+    def test_render_prompt(self):
+        messages = [
+            {"role": "system", "content": "sys"},
+            {"role": "user", "content": "hi"},
+        ]
+        tokenizer = FakeTokenizer()
+        self.assertEqual(
+            render_prompt(messages, tokenizer), "<system>sys<user>hi<assistant>"
+        )
+        self.assertEqual(render_prompt("raw", tokenizer), "raw")
+
+    def test_prefix_sorted_order(self):
+        prompts = ["sys repo_b f1", "sys repo_a f2", "sys repo_b f3", "sys repo_a f1"]
+        order = prefix_sorted_order(prompts)
+        self.assertEqual(order, [3, 1, 0, 2])
+
+        sorted_prompts = [prompts[i] for i in order]
+        self.assertGreater(
+            shared_prefix_fraction(sorted_prompts), shared_prefix_fraction(prompts)
+        )
+        self.assertEqual(shared_prefix_fraction(["ab", "ab"]), 0.5)
+        self.assertEqual(shared_prefix_fraction([]), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
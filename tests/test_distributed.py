@@ -0,0 +1,103 @@
+import time
+import threading
+import unittest
+import warnings
+import multiprocessing as mp
+from multiprocessing.connection import Listener
+
+from r2e.distributed import Coordinator, run_worker
+from r2e.multiprocess import run_tasks_in_parallel, run_tasks_as_completed_iter
+
+AUTHKEY = b"r2e-test"
+
+
+def square(x):
+    return x * x
+
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = Coordinator(authkey=AUTHKEY, heartbeat_timeout=3)
+        ctx = mp.get_context("spawn")
+        self.workers = [
+            ctx.Process(target=run_worker, args=(self.coordinator.address, AUTHKEY, 2))
+            for _ in range(2)
+        ]
+        for worker in self.workers:
+            worker.start()
+        self.assertTrue(self.coordinator.wait_for_workers(2, timeout=30))
+
+    def tearDown(self):
+        self.coordinator.close()
+        for worker in self.workers:
+            worker.join(timeout=30)
+            if worker.is_alive():
+                worker.kill()
+
+    def test_results_and_timeouts(self):
+        self.assertEqual(self.coordinator.num_workers, 4)
+        with self.coordinator.activate():
+            results = run_tasks_in_parallel(square, list(range(20)))
+            self.assertEqual([r.result for r in results], [x * x for x in range(20)])
+
+            results = run_tasks_in_parallel(sleep_for, [0, 5], timeout_per_task=1)
+            self.assertEqual([r.is_timeout() for r in results], [False, True])
+
+            # workers set their own max_mem; that is not worth a warning
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                run_tasks_in_parallel(square, [1], max_mem=2**31)
+
+    def test_tasks_of_lost_worker_are_requeued(self):
+        with self.coordinator.activate():
+            outputs = run_tasks_as_completed_iter(sleep_for, [1] * 8)
+            next(outputs)
+            self.workers[0].kill()
+            results = list(outputs)
+
+        self.assertEqual(len(results), 7)
+        self.assertTrue(all(result.result == 1 for _, result in results))
+        self.assertEqual(self.coordinator.num_workers, 2)
+
+    def test_deadline_stops_remote_tasks(self):
+        start = time.time()
+        with self.coordinator.activate():
+            results = run_tasks_in_parallel(
+                sleep_for, [60] * 4, deadline=time.time() + 1
+            )
+            self.assertTrue(all(result.is_cancelled() for result in results))
+
+            # the workers were freed instead of sleeping on
+            results = run_tasks_in_parallel(square, list(range(4)))
+            self.assertEqual([r.result for r in results], [0, 1, 4, 9])
+        self.assertLess(time.time() - start, 30)
+
+
+class TestWorkerSafety(unittest.TestCase):
+    def test_authkey_is_required(self):
+        with self.assertRaises(ValueError):
+            Coordinator(authkey=b"")
+        with self.assertRaises(ValueError):
+            run_worker(("127.0.0.1", 1), b"")
+
+    def test_worker_leaves_silent_coordinator(self):
+        with Listener(("127.0.0.1", 0), authkey=AUTHKEY) as listener:
+            worker = threading.Thread(
+                target=run_worker, args=(listener.address, AUTHKEY, 1), daemon=True
+            )
+            worker.start()
+            with listener.accept() as conn:
+                conn.recv()
+                conn.send(("welcome", 0.2))
+                # no heartbeats follow
+                worker.join(timeout=30)
+                self.assertFalse(worker.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
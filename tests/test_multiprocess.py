@@ -0,0 +1,326 @@
+import os
+import asyncio
+import sys
+import time
+import unittest
+import warnings
+import tempfile
+from pathlib import Path
+from typing import Generator, cast
+
+from r2e.multiprocess import (
+    CancelHandle,
+    TaskJournal,
+    WorkerPool,
+    get_active_pool,
+    run_tasks_in_parallel,
+    run_tasks_in_parallel_iter,
+    run_tasks_as_completed_iter,
+)
+
+
+def square(x):
+    return x * x
+
+
+def fail_on_three(x):
+    if x == 3:
+        raise ValueError("three")
+    return x
+
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def start_time(_):
+    return time.time()
+
+
+async def async_sleep_for(seconds):
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+async def async_time_out(_):
+    raise TimeoutError("read timed out")
+
+
+def allocate(num_bytes):
+    return len(bytearray(num_bytes))
+
+
+def worker_state(module_name):
+    return os.getpid(), module_name in sys.modules
+
+
+class TestRunTasksInParallel(unittest.TestCase):
+    def test_results_in_task_order(self):
+        results = run_tasks_in_parallel(square, list(range(10)), num_workers=2)
+        self.assertTrue(all(r.is_success() for r in results))
+        self.assertEqual([r.result for r in results], [x * x for x in range(10)])
+
+    def test_exception_and_timeout(self):
+        results = run_tasks_in_parallel(fail_on_three, [1, 3, 5], num_workers=2)
+        self.assertEqual([r.is_exception() for r in results], [False, True, False])
+        self.assertIn("ValueError", results[1].exception_tb or "")
+
+        results = run_tasks_in_parallel(
+            sleep_for, [0, 5], num_workers=2, timeout_per_task=1
+        )
+        self.assertTrue(results[0].is_success())
+        self.assertTrue(results[1].is_timeout())
+
+
+class TestStreamingSubmission(unittest.TestCase):
+    def test_generator_with_bounded_window(self):
+        consumed = []
+
+        def tasks():
+            for x in range(20):
+                consumed.append(x)
+                yield x
+
+        results = run_tasks_in_parallel_iter(
+            square, tasks(), num_workers=2, max_in_flight=3
+        )
+
+        first = next(results)
+        self.assertEqual(first.result, 0)
+        # only a bounded window of the generator has been pulled so far
+        self.assertLessEqual(len(consumed), 4)
+
+        rest = [r.result for r in results]
+        self.assertEqual(rest, [x * x for x in range(1, 20)])
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            list(run_tasks_in_parallel_iter(square, [1], max_in_flight=0))
+
+
+class TestAsCompleted(unittest.TestCase):
+    def test_straggler_does_not_block(self):
+        outputs = list(
+            run_tasks_as_completed_iter(sleep_for, [2, 0, 0, 0], num_workers=2)
+        )
+        indices = [index for index, _ in outputs]
+        self.assertEqual(sorted(indices), [0, 1, 2, 3])
+        self.assertEqual(indices[-1], 0)
+        for index, result in outputs:
+            self.assertEqual(result.result, [2, 0, 0, 0][index])
+
+
+@unittest.skipUnless(sys.platform == "linux", "RLIMIT_AS is only enforced on Linux")
+class TestMemoryLimit(unittest.TestCase):
+    def test_memory_limit_and_usage(self):
+        mib = 1024 * 1024
+        results = run_tasks_in_parallel(
+            allocate, [mib, 4096 * mib], num_workers=1, max_mem=1024 * mib
+        )
+        self.assertTrue(results[0].is_success())
+        self.assertTrue(results[1].is_memory_limit())
+
+        usage = results[0]
+        assert usage.wall_time is not None and usage.cpu_time is not None
+        assert usage.peak_rss is not None
+        self.assertGreaterEqual(usage.wall_time, 0)
+        self.assertGreaterEqual(usage.cpu_time, 0)
+        self.assertGreater(usage.peak_rss, mib)
+
+
+class TestCostScheduling(unittest.TestCase):
+    def test_largest_first_keeps_task_order(self):
+        durations = [0.1, 0.1, 1.5, 0.1, 1.5]
+        results = run_tasks_in_parallel(
+            sleep_for, durations, num_workers=2, costs=durations
+        )
+        self.assertEqual([r.result for r in results], durations)
+
+    def test_largest_first_submission(self):
+        costs = [1, 5, 3, 4, 2]
+        # a single worker runs the tasks one by one in submission order
+        results = run_tasks_in_parallel(
+            start_time, [0, 1, 2, 3, 4], num_workers=1, costs=lambda x: costs[x]
+        )
+        started = sorted(range(5), key=lambda index: results[index].result or 0)
+        self.assertEqual(started, [1, 3, 2, 4, 0])
+
+    def test_cost_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            list(run_tasks_in_parallel_iter(square, [1, 2], costs=[1]))
+
+
+class TestPrioritiesAndCancellation(unittest.TestCase):
+    def test_priorities_before_costs(self):
+        priorities = [0, 0, 1, 0, 1]
+        costs = [1, 5, 3, 4, 2]
+        results = run_tasks_in_parallel(
+            start_time,
+            [0, 1, 2, 3, 4],
+            num_workers=1,
+            costs=costs,
+            priorities=lambda x: priorities[x],
+        )
+        started = sorted(range(5), key=lambda index: results[index].result or 0)
+        self.assertEqual(started, [2, 4, 1, 3, 0])
+
+    def test_cancel_handle(self):
+        cancel = CancelHandle()
+        cancel.cancel(1)
+        start = time.time()
+        outputs = run_tasks_as_completed_iter(
+            sleep_for, [0, 0, 10, 10], num_workers=2, cancel=cancel
+        )
+        results = {}
+        for index, result in outputs:
+            results[index] = result
+            if index == 0:
+                cancel.cancel()
+
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(results[0].is_success())
+        self.assertTrue(all(results[i].is_cancelled() for i in [1, 2, 3]))
+
+    def test_deadline(self):
+        start = time.time()
+        results = run_tasks_in_parallel(
+            sleep_for, [0, 10, 10], num_workers=2, deadline=start + 1
+        )
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(
+            [r.status.name for r in results], ["SUCCESS", "CANCELLED", "CANCELLED"]
+        )
+
+
+class TestBackends(unittest.TestCase):
+    def test_thread_backend(self):
+        results = run_tasks_in_parallel(
+            fail_on_three, [1, 3], num_workers=2, backend="thread"
+        )
+        self.assertTrue(results[0].is_success())
+        self.assertTrue(results[1].is_exception())
+        self.assertIsNone(results[0].peak_rss)
+
+        results = run_tasks_in_parallel(
+            sleep_for, [0, 2], num_workers=2, timeout_per_task=0.5, backend="thread"
+        )
+        self.assertEqual([r.is_timeout() for r in results], [False, True])
+
+    def test_asyncio_backend(self):
+        start = time.time()
+        results = run_tasks_in_parallel(
+            async_sleep_for, [0.5] * 100, num_workers=100, backend="asyncio"
+        )
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(all(r.result == 0.5 for r in results))
+
+        results = run_tasks_in_parallel(
+            async_sleep_for, [0, 5], timeout_per_task=0.5, backend="asyncio"
+        )
+        self.assertEqual([r.is_timeout() for r in results], [False, True])
+
+        # only running out of timeout_per_task counts as a timeout
+        results = run_tasks_in_parallel(
+            async_time_out, [0], timeout_per_task=5, backend="asyncio"
+        )
+        self.assertTrue(results[0].is_exception())
+
+        results = run_tasks_in_parallel(square, [3], backend="asyncio")
+        self.assertEqual(results[0].result, 9)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            run_tasks_in_parallel(square, [1], backend="gpu")
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "tasks.journal"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_interrupted_run_resumes(self):
+        results = cast(
+            Generator,
+            run_tasks_in_parallel_iter(
+                square,
+                list(range(6)),
+                num_workers=1,
+                max_in_flight=1,
+                journal=self.path,
+            ),
+        )
+        self.assertEqual([next(results).result for _ in range(2)], [0, 1])
+        results.close()
+
+        with TaskJournal(self.path) as journal:
+            self.assertIn("0", journal)
+            self.assertIn("1", journal)
+
+        # journaled tasks are replayed instead of being run again
+        results = run_tasks_in_parallel(
+            fail_on_three,
+            list(range(6)),
+            num_workers=1,
+            journal=self.path,
+            task_key=str,
+        )
+        self.assertEqual(results[1].result, 1)
+        self.assertTrue(results[3].is_exception())
+        self.assertEqual([r.result for r in results[4:]], [4, 5])
+
+    def test_failures_are_not_journaled(self):
+        results = run_tasks_in_parallel(
+            fail_on_three, [1, 3], num_workers=1, journal=self.path, task_key=str
+        )
+        self.assertTrue(results[1].is_exception())
+        with TaskJournal(self.path) as journal:
+            self.assertEqual(list(journal.entries), ["1"])
+
+        # the failed task is run again
+        results = run_tasks_in_parallel(
+            square, [1, 3], num_workers=1, journal=self.path, task_key=str
+        )
+        self.assertEqual([r.result for r in results], [1, 9])
+
+    def test_truncated_record_is_dropped(self):
+        run_tasks_in_parallel(square, [1, 2], num_workers=1, journal=self.path)
+        with open(self.path, "ab") as f:
+            f.write(b"\x80\x04partial")
+
+        with TaskJournal(self.path) as journal:
+            self.assertEqual(len(journal), 2)
+            self.assertEqual(journal.entries["1"].result, 4)
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_max_mem_of_active_pool(self):
+        with WorkerPool(num_workers=1, max_mem=2**30) as pool, pool.activate():
+            with self.assertWarns(RuntimeWarning):
+                run_tasks_in_parallel(square, [1], max_mem=2**29)
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                results = run_tasks_in_parallel(square, [1], max_mem=2**31)
+            self.assertEqual(results[0].result, 1)
+
+    def test_shared_pool_is_reused_and_warm(self):
+        with WorkerPool(num_workers=1, preload_modules=["json.tool"]) as pool:
+            pool.warmup()
+            with pool.activate():
+                self.assertIs(get_active_pool(), pool)
+                first = run_tasks_in_parallel(worker_state, ["json.tool"])
+                second = run_tasks_in_parallel(worker_state, ["json.tool"])
+            self.assertIsNone(get_active_pool())
+
+        assert first[0].result is not None and second[0].result is not None
+        first_pid, preloaded = first[0].result
+        second_pid, _ = second[0].result
+        self.assertTrue(preloaded)
+        self.assertEqual(first_pid, second_pid)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from r2e.multiprocess import run_tasks_in_parallel
+from r2e.utils.snapshot import (
+    RepoSnapshot,
+    get_snapshot,
+    read_source,
+    shared_snapshot,
+)
+
+
+def snapshot_read(file_path):
+    snapshot = get_snapshot()
+    return snapshot is not None and file_path in snapshot, read_source(file_path)
+
+
+class TestRepoSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.tmpdir.name) / "repo"
+        (self.repo / "pkg").mkdir(parents=True)
+        (self.repo / "pkg" / "a.py").write_text("x = 1\n")
+        (self.repo / "pkg" / "b.py").write_bytes("s = 'é'\r\n".encode())
+        (self.repo / "README.md").write_text("not python")
+        self.snapshot_path = Path(self.tmpdir.name) / "sources.snapshot"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read(self):
+        snapshot = RepoSnapshot.build([str(self.repo)], self.snapshot_path)
+        a_path = str(self.repo / "pkg" / "a.py")
+        b_path = str(self.repo / "pkg" / "b.py")
+
+        self.assertEqual(len(snapshot), 2)
+        self.assertNotIn(str(self.repo / "README.md"), snapshot)
+        self.assertEqual(snapshot.read(a_path), "x = 1\n")
+        with open(b_path, "r") as f:
+            self.assertEqual(snapshot.read(b_path), f.read())
+
+        # modified files are no longer served from the snapshot, once this
+        # process has dropped their decoded text
+        stat = os.stat(a_path)
+        os.utime(a_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(snapshot.read(a_path), "x = 1\n")
+        snapshot.close()
+        snapshot = RepoSnapshot(self.snapshot_path)
+        self.assertIsNone(snapshot.read(a_path))
+        snapshot.close()
+
+    def test_shared_with_workers(self):
+        a_path = str(self.repo / "pkg" / "a.py")
+        snapshot_dir = Path(self.tmpdir.name) / "sources"
+        with shared_snapshot([str(self.repo)], snapshot_dir) as store:
+            # repos are only snapshotted once read
+            self.assertEqual(list(snapshot_dir.glob("*.snapshot")), [])
+            results = run_tasks_in_parallel(
+                snapshot_read, [a_path, a_path], num_workers=2
+            )
+            self.assertEqual(len(list(snapshot_dir.glob("*.snapshot"))), 1)
+            self.assertIsNone(store.read(str(self.repo.parent / "other.py")))
+        self.assertEqual([r.result for r in results], [(True, "x = 1\n")] * 2)
+
+        self.assertFalse(snapshot_dir.exists())
+        self.assertIsNone(get_snapshot())
+        self.assertEqual(read_source(a_path), "x = 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()